@@ -0,0 +1,423 @@
+# analytics.py
+
+"""
+Curva de patrimônio (equity) marcada a mercado tick a tick e métricas de risco
+do resultado de um backtest.
+
+Os ticks são percorridos em lotes (tick_store.scan_ticks) junto com a lista de
+operações: em cada tick o patrimônio é o saldo inicial, mais o PnL das
+operações já fechadas, mais o PnL em aberto da posição, marcado pelo bid
+(compras) ou pelo ask (vendas). Pico, drawdown, tempo abaixo do pico e os
+retornos diários são acumulados lote a lote, então a memória usada não cresce
+com a quantidade de ticks. A curva é gravada reduzida (OHLC do patrimônio por
+período, que preserva as máximas e mínimas) em vez de um ponto por tick.
+"""
+
+import json
+import math
+import os
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+import backtester
+import metrics
+import pipeline
+import resampler
+
+_DAY_NS = 86_400 * 1_000_000_000
+_HOUR_NS = 3_600 * 1_000_000_000
+
+
+def _times_ns(values):
+    return pd.to_datetime(pd.Series(values)).to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+class _ReturnStats:
+    """
+    Média e variância dos retornos diários (algoritmo de Welford) e a janela
+    dos últimos `window` retornos para o Sharpe móvel.
+    """
+
+    def __init__(self, window):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.downside = 0.0
+        self.best = -math.inf
+        self.worst = math.inf
+        self.recent = deque(maxlen=window)
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.downside += min(value, 0.0) ** 2
+        self.best = max(self.best, value)
+        self.worst = min(self.worst, value)
+        self.recent.append(value)
+
+    @staticmethod
+    def _ratio(mean, deviation, periods_per_year):
+        if deviation == 0 or math.isnan(deviation):
+            return None
+        return mean / deviation * math.sqrt(periods_per_year)
+
+    def sharpe(self, periods_per_year):
+        if self.count < 2:
+            return None
+        return self._ratio(self.mean, math.sqrt(self.m2 / (self.count - 1)), periods_per_year)
+
+    def sortino(self, periods_per_year):
+        if self.count < 2:
+            return None
+        return self._ratio(self.mean, math.sqrt(self.downside / self.count), periods_per_year)
+
+    def rolling_sharpe(self, periods_per_year):
+        if len(self.recent) < self.recent.maxlen:
+            return None
+        recent = np.fromiter(self.recent, dtype=np.float64)
+        return self._ratio(recent.mean(), recent.std(ddof=1), periods_per_year)
+
+
+class EquityAnalyzer:
+    """
+    Acumula a curva de patrimônio e as métricas de risco a partir de lotes de
+    ticks em ordem cronológica.
+
+    Uma operação está aberta nos ticks depois de entry_time e antes de
+    exit_time; a partir do tick de exit_time o PnL dela (pnl_usd) é realizado.
+    """
+
+    def __init__(self, results_df, trade_volume_lots, initial_balance=10_000.0, rolling_days=30,
+                 periods_per_year=252):
+        trades = results_df.sort_values('entry_time', kind='stable')
+        self.entry_ns = _times_ns(trades['entry_time'])
+        self.exit_ns = _times_ns(trades['exit_time'])
+        self.entry_price = trades['entry_price'].to_numpy(np.float64)
+        self.is_buy = (trades['type'] == 'buy').to_numpy()
+        self.usd_per_price = backtester.PIP_VALUE_PER_LOT * trade_volume_lots / backtester.PIP_SIZE
+        # Se houver posições simultâneas, uma operação longa pode ficar aberta depois de outras começarem
+        self.max_exit_ns = np.maximum.accumulate(self.exit_ns) if len(self.exit_ns) else self.exit_ns
+
+        # PnL realizado acumulado, na ordem de saída
+        exit_order = np.argsort(self.exit_ns, kind='stable')
+        self.sorted_exit_ns = self.exit_ns[exit_order]
+        self.realized = np.r_[0.0, np.cumsum(trades['pnl_usd'].to_numpy(np.float64)[exit_order])]
+
+        self.initial_balance = float(initial_balance)
+        self.periods_per_year = periods_per_year
+        self.returns = _ReturnStats(rolling_days)
+        self.next_trade = 0
+
+        self.ticks = 0
+        self.first_ns = None
+        self.last_ns = None
+        self.last_equity = None
+        self.peak = self.initial_balance
+        self.peak_ns = None
+        self.max_drawdown = 0.0
+        self.max_drawdown_pct = 0.0
+        self.max_drawdown_peak_ns = None
+        self.max_drawdown_trough_ns = None
+        self.underwater_ns = 0
+        self.longest_underwater_ns = 0
+        self.longest_underwater_start = None
+        self.worst_open_pnl = 0.0
+
+        self.day = None
+        self.day_close = None
+        self.previous_day_close = self.initial_balance
+        self.daily = []                 # (dia, patrimônio no fechamento, Sharpe móvel), um por dia com ticks
+
+    def _open_pnl(self, times, bid, ask):
+        """
+        PnL em aberto de cada tick do lote (zero onde não há posição).
+        """
+        open_pnl = np.zeros(len(times))
+        first_ns, last_ns = times[0], times[-1]
+
+        # Operações que terminaram antes do lote não voltam a ser consideradas
+        while self.next_trade < len(self.entry_ns) and self.max_exit_ns[self.next_trade] <= first_ns:
+            self.next_trade += 1
+
+        for k in range(self.next_trade, len(self.entry_ns)):
+            if self.entry_ns[k] >= last_ns:
+                break
+            start = np.searchsorted(times, self.entry_ns[k], side='right')
+            end = np.searchsorted(times, self.exit_ns[k], side='left')
+            if end <= start:
+                continue
+            if self.is_buy[k]:
+                pnl = (bid[start:end] - self.entry_price[k]) * self.usd_per_price
+            else:
+                pnl = (self.entry_price[k] - ask[start:end]) * self.usd_per_price
+            open_pnl[start:end] += pnl
+            self.worst_open_pnl = min(self.worst_open_pnl, float(pnl.min()))
+
+        return open_pnl
+
+    def _update_drawdown(self, times, equity):
+        peaks = np.maximum(np.maximum.accumulate(equity), self.peak)
+        drawdown = peaks - equity
+
+        worst = int(drawdown.argmax())
+        if drawdown[worst] > self.max_drawdown:
+            self.max_drawdown = float(drawdown[worst])
+            self.max_drawdown_trough_ns = int(times[worst])
+            at_peak = np.flatnonzero(equity[:worst + 1] >= peaks[worst])
+            self.max_drawdown_peak_ns = int(times[at_peak[-1]]) if len(at_peak) else self.peak_ns
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drawdown_pct = np.where(peaks > 0, drawdown / peaks, 0.0)
+        self.max_drawdown_pct = max(self.max_drawdown_pct, float(drawdown_pct.max()))
+
+        # Tempo abaixo do pico: cada tick abaixo dele conta até o tick seguinte
+        underwater = drawdown > 0
+        previous_underwater = self.last_equity is not None and self.last_equity < self.peak
+        all_times = np.r_[self.last_ns, times] if self.last_ns is not None else times
+        all_underwater = np.r_[previous_underwater, underwater] if self.last_ns is not None else underwater
+        self.underwater_ns += int(np.diff(all_times)[all_underwater[:-1]].sum())
+
+        # Períodos abaixo do pico vão do último tick no pico até o tick que o recupera
+        peak_times = times[~underwater]
+        if self.peak_ns is None and len(peak_times) == 0:
+            self.peak_ns = int(times[0])
+        spell_starts = np.r_[self.peak_ns if self.peak_ns is not None else peak_times[0], peak_times[:-1]]
+        if len(peak_times):
+            spells = peak_times - spell_starts
+            longest = int(spells.argmax())
+            if spells[longest] > self.longest_underwater_ns:
+                self.longest_underwater_ns = int(spells[longest])
+                self.longest_underwater_start = int(spell_starts[longest])
+            self.peak_ns = int(peak_times[-1])
+
+        self.peak = float(peaks[-1])
+        return drawdown
+
+    def _close_day(self):
+        daily_return = self.day_close / self.previous_day_close - 1 if self.previous_day_close else 0.0
+        self.returns.add(daily_return)
+        self.daily.append((self.day, self.day_close, self.returns.rolling_sharpe(self.periods_per_year)))
+        self.previous_day_close = self.day_close
+
+    def _update_days(self, times, equity):
+        days = times // _DAY_NS
+        # Último tick de cada dia do lote
+        ends = np.flatnonzero(np.r_[days[1:] != days[:-1], True])
+        for end in ends:
+            if self.day is not None and days[end] != self.day:
+                self._close_day()
+            self.day = int(days[end])
+            self.day_close = float(equity[end])
+
+    def update(self, times, bid, ask):
+        """
+        Processa um lote de ticks (tempo em ns int64, bid e ask em float64).
+
+        Returns:
+            tuple: (patrimônio, drawdown) de cada tick do lote.
+        """
+        valid = ~(np.isnan(bid) | np.isnan(ask))
+        if not valid.all():
+            times, bid, ask = times[valid], bid[valid], ask[valid]
+        if len(times) == 0:
+            return np.empty(0), np.empty(0)
+
+        closed = np.searchsorted(self.sorted_exit_ns, times, side='right')
+        equity = self.initial_balance + self.realized[closed] + self._open_pnl(times, bid, ask)
+        drawdown = self._update_drawdown(times, equity)
+        self._update_days(times, equity)
+
+        if self.first_ns is None:
+            self.first_ns = int(times[0])
+        self.ticks += len(times)
+        self.last_ns = int(times[-1])
+        self.last_equity = float(equity[-1])
+        return equity, drawdown
+
+    def summary(self):
+        """
+        Returns:
+            dict: As métricas de risco, prontas para JSON.
+        """
+        if self.day is not None:
+            self._close_day()
+            self.day = None
+
+        # Um período abaixo do pico que chega ao fim dos ticks também conta
+        if self.last_equity is not None and self.last_equity < self.peak and self.peak_ns is not None:
+            if self.last_ns - self.peak_ns > self.longest_underwater_ns:
+                self.longest_underwater_ns = self.last_ns - self.peak_ns
+                self.longest_underwater_start = self.peak_ns
+
+        timestamp = lambda ns: None if ns is None else str(pd.Timestamp(ns))
+        span_ns = (self.last_ns - self.first_ns) if self.ticks else 0
+        final_equity = self.last_equity if self.last_equity is not None else self.initial_balance
+
+        return {
+            'ticks': self.ticks,
+            'first_tick': timestamp(self.first_ns),
+            'last_tick': timestamp(self.last_ns),
+            'initial_balance': self.initial_balance,
+            'final_equity': final_equity,
+            'total_return': final_equity / self.initial_balance - 1,
+            'realized_pnl_usd': float(self.realized[-1]),
+            'max_drawdown_usd': self.max_drawdown,
+            'max_drawdown_pct': self.max_drawdown_pct,
+            'max_drawdown_peak': timestamp(self.max_drawdown_peak_ns),
+            'max_drawdown_trough': timestamp(self.max_drawdown_trough_ns),
+            'time_under_water_hours': self.underwater_ns / _HOUR_NS,
+            'time_under_water_fraction': self.underwater_ns / span_ns if span_ns else 0.0,
+            'longest_under_water_hours': self.longest_underwater_ns / _HOUR_NS,
+            'longest_under_water_start': timestamp(self.longest_underwater_start),
+            'worst_open_pnl_usd': self.worst_open_pnl,
+            'trading_days': self.returns.count,
+            'daily_return_mean': self.returns.mean if self.returns.count else None,
+            'daily_return_std': math.sqrt(self.returns.m2 / (self.returns.count - 1)) if self.returns.count > 1 else None,
+            'best_day_return': self.returns.best if self.returns.count else None,
+            'worst_day_return': self.returns.worst if self.returns.count else None,
+            'sharpe': self.returns.sharpe(self.periods_per_year),
+            'sortino': self.returns.sortino(self.periods_per_year),
+            'rolling_sharpe_days': self.returns.recent.maxlen,
+            'rolling_sharpe_last': self.daily[-1][2] if self.daily else None,
+        }
+
+
+def _reduce_periods(labels, open_, high, low, close, ticks, drawdown_max):
+    # Junta as linhas consecutivas de cada período (first/max/min/last/sum/max); os rótulos vêm ordenados
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    ends = np.r_[starts[1:], len(labels)] - 1
+    return (labels[starts], open_[starts], np.maximum.reduceat(high, starts), np.minimum.reduceat(low, starts),
+            close[ends], np.add.reduceat(ticks, starts), np.maximum.reduceat(drawdown_max, starts))
+
+
+class _EquityCurve:
+    """
+    Reduz o patrimônio e o drawdown tick a tick em um ponto por período
+    (OHLC do patrimônio, ticks e drawdown máximo), com os mesmos limites de
+    período do resampler. O último período fica pendente entre os lotes.
+    """
+
+    def __init__(self, timeframe):
+        self.timeframe = timeframe
+        self.origin_ns = None
+        self.pending = None
+        self.closed = []
+
+    def push(self, times, equity, drawdown):
+        if len(times) == 0:
+            return
+        if self.origin_ns is None:
+            self.origin_ns = times[0] // _DAY_NS * _DAY_NS
+
+        labels = resampler._bucket_labels(times, self.timeframe, self.origin_ns)
+        periods = _reduce_periods(labels, equity, equity, equity, equity, np.ones(len(times), dtype=np.int64),
+                                  drawdown)
+        if self.pending is not None:
+            periods = _reduce_periods(*(np.concatenate([a, b]) for a, b in zip(self.pending, periods)))
+
+        self.pending = tuple(column[-1:] for column in periods)
+        if len(periods[0]) > 1:
+            self.closed.append(tuple(column[:-1] for column in periods))
+
+    def frame(self):
+        """
+        Returns:
+            pd.DataFrame | None: Um ponto por período com ticks, indexado por 'time' (None sem ticks).
+        """
+        parts = self.closed + ([self.pending] if self.pending is not None else [])
+        if not parts:
+            return None
+        labels, open_, high, low, close, ticks, drawdown_max = (np.concatenate(column) for column in zip(*parts))
+        index = pd.DatetimeIndex(labels.view('datetime64[ns]'), name='time')
+        return pd.DataFrame({'equity_open': open_, 'equity_high': high, 'equity_low': low, 'equity_close': close,
+                             'ticks': ticks, 'drawdown_max': drawdown_max}, index=index)
+
+
+def _scan_equity(analyzer, curve, tick_batches):
+    for batch in tick_batches:
+        if batch.num_rows == 0:
+            continue
+        times = batch.column('time').to_numpy(zero_copy_only=False).astype('datetime64[ns]').view(np.int64)
+        bid = batch.column('bid').to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+        ask = batch.column('ask').to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+
+        with metrics.stage('analytics'):
+            equity, drawdown = analyzer.update(times, bid, ask)
+            if len(equity):
+                curve.push(times[~(np.isnan(bid) | np.isnan(ask))], equity, drawdown)
+
+
+def analyze_equity(results_df, tick_batches, trade_volume_lots, timeframe='1h', initial_balance=10_000.0,
+                   rolling_days=30, periods_per_year=252):
+    """
+    Percorre os ticks uma vez e calcula a curva de patrimônio e as métricas de risco.
+
+    Args:
+        results_df (pd.DataFrame): Operações de backtester.run_backtest.
+        tick_batches (Iterable[pa.RecordBatch]): Ticks com 'time', 'bid' e 'ask' (ex: tick_store.scan_ticks).
+        trade_volume_lots (float): Volume de cada operação em lotes (o mesmo do backtest).
+        timeframe (str): Período de cada ponto da curva gravada (frequência do pandas).
+        initial_balance (float): Saldo inicial da conta, em USD.
+        rolling_days (int): Dias de negociação da janela do Sharpe móvel.
+        periods_per_year (int): Dias de negociação por ano, para anualizar Sharpe e Sortino.
+
+    Returns:
+        tuple: (curva reduzida com equity_open/high/low/close, drawdown_max, ticks e
+            rolling_sharpe por período; dicionário de métricas).
+    """
+    analyzer = EquityAnalyzer(results_df, trade_volume_lots, initial_balance, rolling_days, periods_per_year)
+    equity_curve = _EquityCurve(timeframe)
+
+    _scan_equity(analyzer, equity_curve, tick_batches)
+    summary = analyzer.summary()
+    curve = equity_curve.frame()
+    if curve is None:
+        return None, summary
+
+    # Sharpe móvel do último dia fechado antes do fim de cada período
+    daily = pd.DataFrame(analyzer.daily, columns=['day', 'equity', 'rolling_sharpe'])
+    daily['available'] = pd.to_datetime((daily['day'] + 1) * _DAY_NS)
+    curve['period_end'] = curve.index + pd.tseries.frequencies.to_offset(timeframe)
+    curve = pd.merge_asof(curve.reset_index().sort_values('period_end'),
+                          daily[['available', 'rolling_sharpe']].astype({'available': 'datetime64[ns]'}),
+                          left_on='period_end', right_on='available', direction='backward')
+    curve = curve.drop(columns=['period_end', 'available']).set_index('time')
+    return curve, summary
+
+
+def run_analytics(results_df, tick_batches, output_prefix, trade_volume_lots=None, timeframe=None):
+    """
+    Calcula as métricas com os parâmetros do .env (o volume, se não informado,
+    vem de pipeline.result_settings, como no backtest) e grava a curva
+    ({output_prefix}-equity.parquet) e o resumo ({output_prefix}-analytics.json).
+
+    Configuração: ANALYTICS_TIMEFRAME (padrão '1h'), ANALYTICS_INITIAL_BALANCE
+    (padrão 10000), ANALYTICS_ROLLING_DAYS (padrão 30) e
+    ANALYTICS_PERIODS_PER_YEAR (padrão 252).
+
+    Returns:
+        tuple: (dicionário de métricas, caminho da curva ou None, caminho do resumo).
+    """
+    if trade_volume_lots is None:
+        trade_volume_lots = pipeline.result_settings()['TRADE_VOLUME_LOTS']
+    timeframe = timeframe or os.getenv("ANALYTICS_TIMEFRAME", "1h")
+
+    curve, summary = analyze_equity(
+        results_df, tick_batches, trade_volume_lots, timeframe,
+        initial_balance=float(os.getenv("ANALYTICS_INITIAL_BALANCE", 10_000)),
+        rolling_days=int(os.getenv("ANALYTICS_ROLLING_DAYS", 30)),
+        periods_per_year=int(os.getenv("ANALYTICS_PERIODS_PER_YEAR", 252)),
+    )
+
+    curve_path = None
+    if curve is not None:
+        curve_path = f"{output_prefix}-equity.parquet"
+        curve.to_parquet(curve_path)
+
+    summary_path = f"{output_prefix}-analytics.json"
+    with open(summary_path, 'w') as f:
+        json.dump({'timeframe': timeframe, 'trades': len(results_df), **summary}, f, indent=2)
+    return summary, curve_path, summary_path
@@ -1,17 +1,380 @@
+import heapq
+import json
 import os
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from dotenv import load_dotenv
 
+import tick_store
+
+_SECOND_NS = 1_000_000_000
+_HOUR_NS = 3600 * _SECOND_NS
+_DAY_NS = 24 * _HOUR_NS
+# Spreads acima disso (em pontos) caem todos no último balde do histograma
+_MAX_SPREAD_POINTS = 100_000
+# Ticks por hora ficam em baldes logarítmicos (32 por dobra, ~2% de largura): a mediana é aproximada
+_HOURLY_BINS_PER_OCTAVE = 32
+_HOURLY_BINS = 48 * _HOURLY_BINS_PER_OCTAVE
+
+# 'time' do MT5 tem resolução de segundos: duplicatas e ordem são medidas no time_msc
+QUALITY_COLUMNS = ['time_msc', 'bid', 'ask']
+
+
+def _saturdays_between(first_day, last_day):
+    # Quantos sábados há entre os dias (contados desde 1970-01-01, uma quinta-feira) first_day e last_day
+    return (last_day - 2) // 7 - (first_day - 3) // 7
+
+
+class TickQualityStats:
+    """
+    Estatísticas de qualidade dos ticks, acumuladas lote a lote com memória constante.
+
+    Os ticks precisam chegar em ordem de armazenamento; a ligação entre o fim de
+    um lote e o início do seguinte é considerada nos intervalos e duplicatas.
+    Os ticks por hora guardam só a hora em andamento: as horas encerradas vão
+    para mínimo, máximo e um histograma logarítmico (mediana aproximada).
+    """
+
+    def __init__(self, gap_threshold_seconds=60, price_digits=5, top_gaps=10):
+        self.gap_threshold_ns = int(gap_threshold_seconds * _SECOND_NS)
+        self.point_scale = 10 ** price_digits
+        self.top_gaps = top_gaps
+
+        self.ticks = 0
+        self.first_time = None
+        self.last_time = None
+        self.last_row = None            # (time, bid, ask) do último tick do lote anterior
+        self.duplicate_times = 0
+        self.duplicate_rows = 0
+        self.out_of_order = 0
+        self.missing_prices = 0
+        self.weekend_ticks = 0
+        self.gaps = 0
+        self.gap_seconds = 0.0
+        self.market_closed_gaps = 0
+        self.largest_gaps = []          # heap (duração, início, fim)
+        self.spread_histogram = np.zeros(_MAX_SPREAD_POINTS + 1, dtype=np.int64)
+        self.negative_spreads = 0
+        self.zero_spreads = 0
+        self.min_spread = np.inf
+        self.max_spread = -np.inf
+        self.hour_of_day = np.zeros(24, dtype=np.int64)
+        self.current_hour = None        # hora (ns // 1h) em andamento e os ticks dela até agora
+        self.current_hour_ticks = 0
+        self.active_hours = 0
+        self.min_hourly = None
+        self.max_hourly = None
+        self.hourly_histogram = np.zeros(_HOURLY_BINS, dtype=np.int64)
+
+    def update(self, batch):
+        """
+        Acumula as estatísticas de um lote (pa.RecordBatch com 'time_msc', 'bid' e 'ask';
+        sem 'time_msc', usa 'time').
+        """
+        if batch.num_rows == 0:
+            return
+
+        if 'time_msc' in batch.schema.names:
+            times = batch.column('time_msc').to_numpy(zero_copy_only=False).astype(np.int64) * 1_000_000
+        else:
+            times = batch.column('time').cast(pa.timestamp('ns')).to_numpy().view(np.int64)
+        bid = batch.column('bid').to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+        ask = batch.column('ask').to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+
+        if self.first_time is None:
+            self.first_time = int(times[0])
+        self.ticks += len(times)
+
+        # Diferenças entre ticks consecutivos, incluindo o último tick do lote anterior
+        if self.last_row is not None:
+            prev_time, prev_bid, prev_ask = self.last_row
+            all_times = np.concatenate([[prev_time], times])
+            same_prices = np.concatenate([[prev_bid == bid[0] and prev_ask == ask[0]],
+                                          (bid[1:] == bid[:-1]) & (ask[1:] == ask[:-1])])
+        else:
+            all_times = times
+            same_prices = (bid[1:] == bid[:-1]) & (ask[1:] == ask[:-1])
+        deltas = np.diff(all_times)
+
+        same_time = deltas == 0
+        self.duplicate_times += int(same_time.sum())
+        self.duplicate_rows += int((same_time & same_prices).sum())
+        self.out_of_order += int((deltas < 0).sum())
+        self._update_gaps(all_times, deltas)
+
+        # Preços ausentes e spreads
+        valid = ~(np.isnan(bid) | np.isnan(ask))
+        self.missing_prices += int(len(valid) - valid.sum())
+        spread = np.round((ask[valid] - bid[valid]) * self.point_scale).astype(np.int64)
+        if len(spread):
+            self.negative_spreads += int((spread < 0).sum())
+            self.zero_spreads += int((spread == 0).sum())
+            self.min_spread = min(self.min_spread, int(spread.min()))
+            self.max_spread = max(self.max_spread, int(spread.max()))
+            self.spread_histogram += np.bincount(np.clip(spread, 0, _MAX_SPREAD_POINTS),
+                                                 minlength=_MAX_SPREAD_POINTS + 1)
+
+        # Fim de semana (segunda = 0; 1970-01-01 foi uma quinta-feira) e distribuição por hora
+        days = times // _DAY_NS
+        self.weekend_ticks += int(((days + 3) % 7 >= 5).sum())
+        self.hour_of_day += np.bincount((times % _DAY_NS) // _HOUR_NS, minlength=24)
+
+        self._update_hours(times // _HOUR_NS)
+
+        self.last_time = int(times[-1]) if self.last_time is None else max(self.last_time, int(times[-1]))
+        self.last_row = (int(times[-1]), float(bid[-1]), float(ask[-1]))
+
+    def _update_hours(self, hours):
+        # Sequências de ticks na mesma hora; só a última fica em aberto para o próximo lote
+        starts = np.flatnonzero(np.r_[True, hours[1:] != hours[:-1]])
+        counts = np.diff(np.r_[starts, len(hours)])
+        if hours[0] == self.current_hour:
+            counts[0] += self.current_hour_ticks
+        elif self.current_hour is not None:
+            counts = np.r_[self.current_hour_ticks, counts]
+        self._finish_hours(counts[:-1])
+        self.current_hour = int(hours[-1])
+        self.current_hour_ticks = int(counts[-1])
+
+    def _finish_hours(self, counts):
+        if len(counts) == 0:
+            return
+        self.active_hours += len(counts)
+        low, high = int(counts.min()), int(counts.max())
+        self.min_hourly = low if self.min_hourly is None else min(self.min_hourly, low)
+        self.max_hourly = high if self.max_hourly is None else max(self.max_hourly, high)
+        bins = np.minimum(np.log2(counts) * _HOURLY_BINS_PER_OCTAVE, _HOURLY_BINS - 1).astype(np.int64)
+        self.hourly_histogram += np.bincount(bins, minlength=_HOURLY_BINS)
+
+    def _hourly_median(self):
+        cumulative = np.cumsum(self.hourly_histogram)
+        if cumulative[-1] == 0:
+            return 0.0
+        median_bin = int(np.searchsorted(cumulative, 0.5 * cumulative[-1], side='left'))
+        # Centro geométrico do balde, limitado aos extremos exatos
+        median = 2 ** ((median_bin + 0.5) / _HOURLY_BINS_PER_OCTAVE)
+        return float(min(max(median, self.min_hourly), self.max_hourly))
+
+    def _update_gaps(self, all_times, deltas):
+        above = np.flatnonzero(deltas > self.gap_threshold_ns)
+        if len(above) == 0:
+            return
+
+        starts, ends = all_times[above], all_times[above + 1]
+        # Intervalos que atravessam um sábado são o mercado fechado, não falhas nos dados
+        closed = _saturdays_between(starts // _DAY_NS, ends // _DAY_NS) > 0
+        self.market_closed_gaps += int(closed.sum())
+
+        starts, ends, durations = starts[~closed], ends[~closed], deltas[above][~closed]
+        self.gaps += len(durations)
+        self.gap_seconds += float(durations.sum()) / _SECOND_NS
+
+        # Só os maiores do lote podem entrar entre os maiores do total
+        if len(durations) > self.top_gaps:
+            keep = np.argpartition(durations, -self.top_gaps)[-self.top_gaps:]
+            starts, ends, durations = starts[keep], ends[keep], durations[keep]
+        for item in zip(durations.tolist(), starts.tolist(), ends.tolist()):
+            if len(self.largest_gaps) < self.top_gaps:
+                heapq.heappush(self.largest_gaps, item)
+            else:
+                heapq.heappushpop(self.largest_gaps, item)
+
+    def _spread_percentile(self, fraction):
+        cumulative = np.cumsum(self.spread_histogram)
+        if cumulative[-1] == 0:
+            return None
+        return int(np.searchsorted(cumulative, fraction * cumulative[-1], side='left'))
+
+    def result(self, spread_outlier_factor=10):
+        """
+        Returns:
+            dict: O relatório de qualidade, pronto para JSON.
+        """
+        median_spread = self._spread_percentile(0.5)
+        outliers = 0
+        if median_spread is not None:
+            limit = int(max(median_spread, 1) * spread_outlier_factor)
+            outliers = int(self.spread_histogram[limit + 1:].sum()) if limit < _MAX_SPREAD_POINTS else 0
+
+        # A hora em andamento entra no resultado sem ser encerrada (update pode continuar depois)
+        finished = (self.active_hours, self.min_hourly, self.max_hourly, self.hourly_histogram.copy())
+        if self.current_hour is not None:
+            self._finish_hours(np.array([self.current_hour_ticks]))
+        hourly = {
+            'active_hours': self.active_hours,
+            'min': self.min_hourly or 0,
+            'median': self._hourly_median(),
+            'max': self.max_hourly or 0,
+            'by_hour_of_day': self.hour_of_day.tolist(),
+        }
+        self.active_hours, self.min_hourly, self.max_hourly, self.hourly_histogram = finished
+        timestamp = lambda ns: None if ns is None else str(pd.Timestamp(ns))
+
+        return {
+            'ticks': self.ticks,
+            'first_tick': timestamp(self.first_time),
+            'last_tick': timestamp(self.last_time),
+            'duplicate_timestamps': self.duplicate_times,
+            'duplicate_rows': self.duplicate_rows,
+            'out_of_order': self.out_of_order,
+            'missing_prices': self.missing_prices,
+            'weekend_ticks': self.weekend_ticks,
+            'gaps': {
+                'threshold_seconds': self.gap_threshold_ns / _SECOND_NS,
+                'count': self.gaps,
+                'total_hours': self.gap_seconds / 3600,
+                'market_closed': self.market_closed_gaps,
+                'largest': [{'start': timestamp(start), 'end': timestamp(end), 'seconds': duration / _SECOND_NS}
+                            for duration, start, end in sorted(self.largest_gaps, reverse=True)],
+            },
+            'spread_points': {
+                'min': None if self.min_spread == np.inf else self.min_spread,
+                'median': median_spread,
+                'p99': self._spread_percentile(0.99),
+                'max': None if self.max_spread == -np.inf else self.max_spread,
+                'negative': self.negative_spreads,
+                'zero': self.zero_spreads,
+                'outlier_factor': spread_outlier_factor,
+                'outliers': outliers,
+            },
+            'ticks_per_hour': hourly,
+        }
+
+
+def analyze_ticks(batches, gap_threshold_seconds=60, price_digits=5, spread_outlier_factor=10, top_gaps=10):
+    """
+    Calcula o relatório de qualidade em uma única passada sobre os lotes de ticks.
+
+    Args:
+        batches (Iterable[pa.RecordBatch]): Ticks com QUALITY_COLUMNS (ex: tick_store.scan_ticks).
+
+    Returns:
+        dict: Veja TickQualityStats.result.
+    """
+    stats = TickQualityStats(gap_threshold_seconds, price_digits, top_gaps)
+    for batch in batches:
+        stats.update(batch)
+    return stats.result(spread_outlier_factor)
+
+
+def _time_statistics(metadata):
+    # Menor e maior 'time' das estatísticas dos row groups, quando o gravador as incluiu
+    # (nas partições 'encoded' sem a coluna 'time', o time_msc em milissegundos)
+    names = metadata.schema.names
+    if 'time' in names:
+        index, unit = names.index('time'), None
+    elif 'time_msc' in names:
+        index, unit = names.index('time_msc'), 'ms'
+    else:
+        return None, None
+    lows, highs = [], []
+    for i in range(metadata.num_row_groups):
+        statistics = metadata.row_group(i).column(index).statistics
+        if statistics is None or not statistics.has_min_max:
+            return None, None
+        lows.append(statistics.min)
+        highs.append(statistics.max)
+    if not lows:
+        return None, None
+    if unit is not None:
+        return pd.Timestamp(min(lows), unit=unit), pd.Timestamp(max(highs), unit=unit)
+    return pd.Timestamp(min(lows)), pd.Timestamp(max(highs))
+
+
+def storage_summary(asset, start_date, end_date, data_dir='data'):
+    """
+    Resume as partições de ticks do período só pelos metadados do Parquet (sem
+    ler os dados): row groups, linhas, tamanho em disco, período baixado e o
+    intervalo de 'time' das estatísticas dos row groups.
+
+    As contagens são das partições inteiras, que podem ir além do período pedido.
+
+    Returns:
+        dict | None: O resumo, ou None se não houver partições do período.
+    """
+    paths = [tick_store.partition_path(asset, year, month, data_dir)
+             for year, month, _, _ in tick_store.month_periods(start_date, end_date)]
+    paths = [path for path in paths if os.path.exists(path)]
+    if not paths:
+        return None
+
+    summary = {'files': 0, 'row_groups': 0, 'rows': 0, 'compressed_mb': 0.0, 'uncompressed_mb': 0.0,
+               'partitions': []}
+
+    for path in paths:
+        metadata = pq.ParquetFile(path).metadata
+        summary['files'] += 1
+        summary['row_groups'] += metadata.num_row_groups
+        summary['rows'] += metadata.num_rows
+        summary['compressed_mb'] += os.path.getsize(path) / 2 ** 20
+        summary['uncompressed_mb'] += sum(metadata.row_group(i).total_byte_size
+                                          for i in range(metadata.num_row_groups)) / 2 ** 20
+
+        period = tick_store.read_partition_period(path)
+        first_tick, last_tick = _time_statistics(metadata)
+        summary['partitions'].append({
+            'path': os.path.relpath(path, tick_store.asset_dir(asset, data_dir)),
+            'rows': metadata.num_rows,
+            'period_start': None if period is None else str(period[0]),
+            'period_end': None if period is None else str(period[1]),
+            'first_tick': None if first_tick is None else str(first_tick),
+            'last_tick': None if last_tick is None else str(last_tick),
+        })
+
+    return summary
+
+
+def _print_report(report, storage):
+    if storage is not None:
+        print("\n--- Storage (from Parquet metadata) ---")
+        print(f"Files: {storage['files']}, row groups: {storage['row_groups']}, rows: {storage['rows']:,}")
+        print(f"Size on disk: {storage['compressed_mb']:.1f} MB ({storage['uncompressed_mb']:.1f} MB uncompressed)")
+        for partition in storage['partitions']:
+            print(f"  {partition['path']}: {partition['rows']:,} rows, "
+                  f"ticks {partition['first_tick']} -> {partition['last_tick']}")
+
+    print("\n--- Ticks ---")
+    print(f"Ticks: {report['ticks']:,} from {report['first_tick']} to {report['last_tick']}")
+    print(f"Duplicate timestamps: {report['duplicate_timestamps']:,} (identical rows: {report['duplicate_rows']:,})")
+    print(f"Out-of-order ticks: {report['out_of_order']:,}")
+    print(f"Ticks without bid/ask: {report['missing_prices']:,}")
+    print(f"Weekend ticks: {report['weekend_ticks']:,}")
+
+    gaps = report['gaps']
+    print(f"\n--- Gaps above {gaps['threshold_seconds']:.0f}s (weekends excluded) ---")
+    print(f"Gaps: {gaps['count']:,} totalling {gaps['total_hours']:.1f} hours "
+          f"({gaps['market_closed']} market-closed weekend gaps ignored)")
+    for gap in gaps['largest']:
+        print(f"  {gap['start']} -> {gap['end']} ({gap['seconds'] / 60:.1f} min)")
+
+    spread = report['spread_points']
+    print("\n--- Spread (points) ---")
+    print(f"Min: {spread['min']}, median: {spread['median']}, p99: {spread['p99']}, max: {spread['max']}")
+    print(f"Negative: {spread['negative']:,}, zero: {spread['zero']:,}, "
+          f"outliers (> {spread['outlier_factor']}x median): {spread['outliers']:,}")
+
+    hourly = report['ticks_per_hour']
+    print("\n--- Ticks per Hour ---")
+    print(f"Active hours: {hourly['active_hours']:,}, min: {hourly['min']:,}, "
+          f"median: {hourly['median']:,.0f}, max: {hourly['max']:,}")
+    print("By hour of day (server time): " + ", ".join(
+        f"{hour:02d}h={count:,}" for hour, count in enumerate(hourly['by_hour_of_day']) if count))
+
+
 def analyze_data():
     """
-    Carrega o arquivo Parquet gerado pelo script de download,
-    usando as configurações do arquivo .env para encontrar o arquivo correto,
-    e exibe uma análise inicial dos dados.
+    Gera o relatório de qualidade dos ticks do ativo e do período do .env, em
+    uma única passada em streaming (memória constante), e o grava em JSON.
+
+    Limites configuráveis no .env: GAP_THRESHOLD_SECONDS (padrão 60),
+    SPREAD_OUTLIER_FACTOR (padrão 10) e PRICE_DIGITS (padrão 5).
     """
     # Carrega as variáveis do arquivo .env para o ambiente atual
     load_dotenv()
 
-    # Pega as configurações do ambiente para montar o nome do arquivo
     asset = os.getenv("ASSET")
     start_date = os.getenv("START_DATE")
     end_date = os.getenv("END_DATE")
@@ -21,36 +384,34 @@ def analyze_data():
         print("Error: ASSET, START_DATE, or END_DATE variables not found in the .env file.")
         return
 
-    # 1. Monta o nome do arquivo dinamicamente
-    filename = f"{asset}-{start_date}-{end_date}.parquet"
-    
-    # 2. Cria o caminho completo para o arquivo de forma segura
-    file_path = os.path.join('data', filename)
-
-    print(f"Attempting to load file: {file_path}")
-
-    # 3. Verifica se o arquivo realmente existe antes de tentar carregá-lo
-    if not os.path.exists(file_path):
-        print("\nERROR: File not found!")
-        print("Please run the download script first:")
-        print("python main.py download")
-        return
+    print(f"Analyzing ticks for {asset} from {start_date} to {end_date}...")
 
     try:
-        # 4. Carrega o arquivo Parquet para um DataFrame do pandas
-        df_ticks = pd.read_parquet(file_path)
+        tick_batches = tick_store.scan_ticks(asset, start_date, end_date, columns=QUALITY_COLUMNS)
+        if tick_batches is None:
+            print("\nERROR: No ticks found for this period!")
+            print("Please run the download script first:")
+            print("python main.py download")
+            return
 
-        print("\nFile loaded successfully!")
-        
-        # 5. Exibe informações e amostras dos dados
-        print("\n--- General DataFrame Information ---")
-        df_ticks.info()
+        report = analyze_ticks(
+            tick_batches,
+            gap_threshold_seconds=float(os.getenv("GAP_THRESHOLD_SECONDS", 60)),
+            price_digits=int(os.getenv("PRICE_DIGITS", 5)),
+            spread_outlier_factor=float(os.getenv("SPREAD_OUTLIER_FACTOR", 10)),
+        )
+        if report['ticks'] == 0:
+            print("\nERROR: No ticks found for this period!")
+            return
 
-        print("\n--- Data Sample (First 5 Rows) ---")
-        print(df_ticks.head())
+        storage = storage_summary(asset, start_date, end_date)
+        _print_report(report, storage)
 
-        print("\n--- Data Sample (Last 5 Rows) ---")
-        print(df_ticks.tail())
+        report_filepath = os.path.join('data', f"quality-{asset}-{start_date}-{end_date}.json")
+        with open(report_filepath, 'w') as f:
+            json.dump({'asset': asset, 'start_date': start_date, 'end_date': end_date,
+                       'storage': storage, **report}, f, indent=2)
+        print(f"\nQuality report saved to {report_filepath}")
 
     except Exception as e:
-        print(f"\nAn error occurred while reading the Parquet file: {e}")
\ No newline at end of file
+        print(f"\nAn error occurred while analyzing the ticks: {e}")
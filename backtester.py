@@ -1,99 +1,410 @@
 import pandas as pd
+import numpy as np
 import os
+import pyarrow as pa
+from collections import namedtuple
 from tqdm import tqdm  # 1. Importa a biblioteca
 
-# A função run_trade_simulation permanece a mesma
-def run_trade_simulation(ticks_df, entry_time, exit_time, entry_price, stop_loss, take_profit, trade_type='buy'):
-    # ... (código inalterado)
-    trade_ticks = ticks_df[(ticks_df['time'] > entry_time) & (ticks_df['time'] <= exit_time)]
+import metrics
+import tick_store
+
+# Arrays de ticks já ordenados por tempo, prontos para buscas por posição.
+# 'time' é int64 em nanossegundos; 'bid' e 'ask' são float64.
+TickArrays = namedtuple('TickArrays', ['time', 'bid', 'ask'])
+
+# Extremos dos preços de cada janela de ticks das velas (ver window_extremes)
+WindowExtremes = namedtuple('WindowExtremes', ['bid_high', 'bid_low', 'ask_high', 'ask_low', 'exact'])
+
+PIP_SIZE = 0.0001
+PIP_VALUE_PER_LOT = 10
+
+
+def _to_ns(values):
+    """
+    Converte datas (Series, Index, array ou escalar) para inteiros em nanossegundos.
+    """
+    if np.isscalar(values) or isinstance(values, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(values).as_unit('ns').value
+    return np.asarray(pd.to_datetime(values), dtype='datetime64[ns]').view(np.int64)
+
+
+def _arrow_column(table, name):
+    # Coluna com um único bloco vira um array numpy sem cópia (ex: cache IPC mapeado em memória)
+    column = table.column(name)
+    if name == 'time':
+        column = column.cast(pa.timestamp('ns'))
+    if column.num_chunks == 1:
+        return column.chunk(0).to_numpy(zero_copy_only=False)
+    return column.to_numpy()
+
+
+def prepare_ticks(ticks_df):
+    """
+    Ordena os ticks por tempo uma única vez e extrai os arrays usados na simulação.
+
+    Args:
+        ticks_df (pd.DataFrame | pa.Table | TickArrays): Ticks com as colunas 'time', 'bid' e 'ask'
+            (em float64, float32 ou pontos inteiros com df.attrs['price_scale']).
+
+    Returns:
+        TickArrays: Arrays contíguos ordenados por tempo (ordenação estável).
+    """
+    if isinstance(ticks_df, TickArrays):
+        return ticks_df
+
+    if isinstance(ticks_df, pa.Table):
+        # Tabela de tick_store.load_ticks(as_arrow=True): float64 em um bloco não é copiado
+        times = _arrow_column(ticks_df, 'time').view(np.int64)
+        bid = _arrow_column(ticks_df, 'bid')
+        ask = _arrow_column(ticks_df, 'ask')
+        price_scale = float((ticks_df.schema.metadata or {}).get(tick_store.PRICE_SCALE_KEY, 0))
+    else:
+        times = _to_ns(ticks_df['time'])
+        bid = ticks_df['bid'].to_numpy()
+        ask = ticks_df['ask'].to_numpy()
+        price_scale = ticks_df.attrs.get('price_scale')
+
+    # Preços em pontos inteiros (tick_store.load_ticks com compact='int') voltam para o preço real;
+    # com preços ausentes, os pontos chegam como float com NaN
+    if price_scale:
+        bid = bid / price_scale
+        ask = ask / price_scale
+    bid = bid.astype(np.float64, copy=False)
+    ask = ask.astype(np.float64, copy=False)
+
+    # Só reordena se necessário: os arquivos baixados já vêm em ordem cronológica
+    if len(times) > 1 and (np.diff(times) < 0).any():
+        order = np.argsort(times, kind='stable')
+        times, bid, ask = times[order], bid[order], ask[order]
+
+    return TickArrays(np.ascontiguousarray(times), np.ascontiguousarray(bid), np.ascontiguousarray(ask))
+
+
+def build_candle_offsets(ticks, candle_times):
+    """
+    Calcula, para cada vela, a posição do primeiro tick posterior à sua abertura.
+
+    Os ticks da janela (vela[i-1], vela[i]] ficam em offsets[i-1]:offsets[i].
+
+    Args:
+        ticks (TickArrays): Ticks preparados por prepare_ticks.
+        candle_times: Horários de abertura das velas (ordenados).
 
-    if trade_ticks.empty:
+    Returns:
+        np.ndarray: Um offset (int64) por vela.
+    """
+    return np.searchsorted(ticks.time, _to_ns(candle_times), side='right')
+
+
+def _boundary_extremes(prices, lo, hi, empty):
+    # Máxima e mínima de prices[lo:hi] para cada vela (empty onde o trecho é vazio), sem laço por vela
+    highs = np.full(len(lo), -empty)
+    lows = np.full(len(lo), empty)
+    lengths = hi - lo
+    has_ticks = lengths > 0
+    if has_ticks.any():
+        lengths = lengths[has_ticks]
+        segments = np.r_[0, np.cumsum(lengths)[:-1]]
+        positions = np.repeat(lo[has_ticks] - segments, lengths) + np.arange(lengths.sum())
+        highs[has_ticks] = np.maximum.reduceat(prices[positions], segments)
+        lows[has_ticks] = np.minimum.reduceat(prices[positions], segments)
+    return highs, lows
+
+
+def window_extremes(ohlc_df, ticks, offsets):
+    """
+    Calcula, a partir das máximas e mínimas das velas (bid e ask), os extremos
+    dos preços em cada janela de ticks usada na simulação, para descartar sem
+    ler os ticks as janelas em que o SL/TP não pode ter sido atingido.
+
+    A janela da vela i são os ticks em (vela[i-1], vela[i]]: os da vela i-1,
+    menos os que caem exatamente na sua abertura, mais os que caem exatamente
+    na abertura da vela i. Os extremos da vela i-1 são combinados com os
+    desses últimos ticks, então a checagem nunca descarta um toque real.
+
+    Isso só vale se a vela i-1 for exatamente os ticks entre a sua abertura e
+    a da vela i, o que é conferido pela contagem ('volume'), pela abertura e
+    pelo fechamento de cada vela. Onde não bate (velas geradas de outros ticks
+    ou com outra precisão, ticks sem preço, velas rotuladas pelo fim como as
+    semanais) ou algum extremo é NaN, 'exact' é False e a janela é sempre lida
+    tick a tick.
+
+    Args:
+        ohlc_df (pd.DataFrame): Velas com 'open', 'high', 'low', 'close', 'ask_high', 'ask_low' e 'volume'.
+        ticks (TickArrays): Ticks preparados por prepare_ticks.
+        offsets (np.ndarray): build_candle_offsets(ticks, ohlc_df.index).
+
+    Returns:
+        WindowExtremes | None: Um valor por vela (o índice 0 não é usado), ou None
+            se as velas não tiverem as colunas do ask (arquivos gerados antes delas).
+    """
+    if not {'open', 'high', 'low', 'close', 'ask_high', 'ask_low', 'volume'}.issubset(ohlc_df.columns):
+        return None
+    if len(ticks.time) == 0:
+        return None
+
+    # Ticks exatamente na abertura de cada vela: ticks.time[lo:offsets]
+    lo = np.searchsorted(ticks.time, _to_ns(ohlc_df.index), side='left')
+    bid_high, bid_low = _boundary_extremes(ticks.bid, lo, offsets, np.inf)
+    ask_high, ask_low = _boundary_extremes(ticks.ask, lo, offsets, np.inf)
+
+    # A janela i combina a vela i-1 com os ticks na abertura da vela i
+    extremes = [
+        np.r_[np.nan, np.maximum(ohlc_df['high'].to_numpy(np.float64)[:-1], bid_high[1:])],
+        np.r_[np.nan, np.minimum(ohlc_df['low'].to_numpy(np.float64)[:-1], bid_low[1:])],
+        np.r_[np.nan, np.maximum(ohlc_df['ask_high'].to_numpy(np.float64)[:-1], ask_high[1:])],
+        np.r_[np.nan, np.minimum(ohlc_df['ask_low'].to_numpy(np.float64)[:-1], ask_low[1:])],
+    ]
+
+    # A vela i-1 precisa ser exatamente ticks[lo[i-1]:lo[i]]
+    first, last = lo[:-1], lo[1:] - 1
+    in_range = (last >= first) & (last < len(ticks.time))
+    first, last = np.minimum(first, len(ticks.time) - 1), np.clip(last, 0, len(ticks.time) - 1)
+    exact = np.r_[False, in_range
+                  & (ohlc_df['volume'].to_numpy()[:-1] == lo[1:] - lo[:-1])
+                  & (ohlc_df['open'].to_numpy(np.float64)[:-1] == ticks.bid[first])
+                  & (ohlc_df['close'].to_numpy(np.float64)[:-1] == ticks.bid[last])]
+    for values in extremes:
+        exact &= ~np.isnan(values)
+
+    return WindowExtremes(*extremes, exact)
+
+
+def _may_exit(extremes, i, stop_loss, take_profit, trade_type):
+    """
+    Indica se algum tick da janela i pode ter atingido o SL ou o TP.
+    """
+    if not extremes.exact[i]:
+        return True
+    if trade_type == 'buy':
+        return extremes.bid_low[i] <= stop_loss or extremes.bid_high[i] >= take_profit
+    if trade_type == 'sell':
+        return extremes.ask_high[i] >= stop_loss or extremes.ask_low[i] <= take_profit
+    return False
+
+
+def _resolve_exit(ticks, start, end, stop_loss, take_profit, trade_type='buy'):
+    """
+    Encontra o primeiro tick em ticks[start:end] que atinge o SL ou o TP,
+    de forma vetorizada (sem laço Python por tick).
+    """
+    if end <= start:
         return {'status': 'NO_TICKS', 'exit_price': None, 'exit_time': None}
 
-    for index, tick in trade_ticks.iterrows():
-        price_to_check = tick['bid'] if trade_type == 'buy' else tick['ask']
-
-        if trade_type == 'buy':
-            if price_to_check <= stop_loss:
-                return {'status': 'STOP_LOSS', 'exit_price': stop_loss, 'exit_time': tick['time']}
-            if price_to_check >= take_profit:
-                return {'status': 'TAKE_PROFIT', 'exit_price': take_profit, 'exit_time': tick['time']}
-        elif trade_type == 'sell':
-            if price_to_check >= stop_loss:
-                return {'status': 'STOP_LOSS', 'exit_price': stop_loss, 'exit_time': tick['time']}
-            if price_to_check <= take_profit:
-                return {'status': 'TAKE_PROFIT', 'exit_price': take_profit, 'exit_time': tick['time']}
-            
-    last_tick_price = trade_ticks.iloc[-1]['bid'] if trade_type == 'buy' else trade_ticks.iloc[-1]['ask']
-    return {'status': 'TIME_LIMIT', 'exit_price': last_tick_price, 'exit_time': trade_ticks.iloc[-1]['time']}
-
-
-def run_backtest(ohlc_df, ticks_df, strategy_func):
-    print("Starting backtest...")
-    
-    stop_loss_pips = int(os.getenv("STOP_LOSS_PIPS", 200))
-    take_profit_pips = int(os.getenv("TAKE_PROFIT_PIPS", 400))
-    trade_volume_lots = float(os.getenv("TRADE_VOLUME_LOTS", 0.1))
-
-    pip_value_per_lot = 10 
-    pip_value_monetary = pip_value_per_lot * trade_volume_lots
-    
-    ohlc_with_signals = strategy_func(ohlc_df.copy())
-    
+    prices = ticks.bid[start:end] if trade_type == 'buy' else ticks.ask[start:end]
+
+    if trade_type == 'buy':
+        sl_hits = prices <= stop_loss
+        tp_hits = prices >= take_profit
+    elif trade_type == 'sell':
+        sl_hits = prices >= stop_loss
+        tp_hits = prices <= take_profit
+    else:
+        sl_hits = tp_hits = np.zeros(len(prices), dtype=bool)
+
+    hits = sl_hits | tp_hits
+    first = int(hits.argmax())
+
+    if hits[first]:
+        exit_time = pd.Timestamp(ticks.time[start + first])
+        # O SL é verificado antes do TP no mesmo tick, como na versão original
+        if sl_hits[first]:
+            return {'status': 'STOP_LOSS', 'exit_price': stop_loss, 'exit_time': exit_time}
+        return {'status': 'TAKE_PROFIT', 'exit_price': take_profit, 'exit_time': exit_time}
+
+    return {'status': 'TIME_LIMIT', 'exit_price': float(prices[-1]), 'exit_time': pd.Timestamp(ticks.time[end - 1])}
+
+
+_NO_EXIT = {'status': 'TIME_LIMIT', 'exit_price': None, 'exit_time': None}
+
+
+def run_trade_simulation(ticks_df, entry_time, exit_time, entry_price, stop_loss, take_profit, trade_type='buy'):
+    """
+    Simula uma operação tick a tick entre entry_time (exclusivo) e exit_time (inclusivo).
+
+    Aceita tanto um DataFrame de ticks quanto um TickArrays já preparado; para
+    chamadas repetidas, prepare os ticks uma única vez com prepare_ticks.
+    """
+    ticks = prepare_ticks(ticks_df)
+    start = int(np.searchsorted(ticks.time, _to_ns(entry_time), side='right'))
+    end = int(np.searchsorted(ticks.time, _to_ns(exit_time), side='right'))
+    return _resolve_exit(ticks, start, end, stop_loss, take_profit, trade_type)
+
+
+def run_backtest(ohlc_df, ticks_df, strategy_func, stop_loss_pips=None, take_profit_pips=None,
+                 trade_volume_lots=None, verbose=True):
+    """
+    Executa a estratégia sobre as velas e simula cada operação nos ticks.
+
+    Os parâmetros de risco não informados são lidos do ambiente (.env).
+    Com verbose=False não há mensagens nem barra de progresso (uso em lote).
+    """
+    if verbose:
+        print("Starting backtest...")
+
+    # As estratégias devolvem um novo DataFrame sem alterar as velas recebidas
+    ohlc_with_signals = strategy_func(ohlc_df)
+
+    return simulate_signals(ohlc_with_signals, ticks_df, stop_loss_pips, take_profit_pips,
+                            trade_volume_lots, verbose=verbose)
+
+
+def simulate_signals(ohlc_with_signals, ticks_df, stop_loss_pips=None, take_profit_pips=None,
+                     trade_volume_lots=None, offsets=None, verbose=True):
+    """
+    Simula as operações a partir de velas que já têm a coluna 'signal'.
+
+    Se as velas tiverem 'ask_high' e 'ask_low' (resampler com a coluna 'ask'),
+    a saída é resolvida em dois níveis: as máximas e mínimas da vela dizem se o
+    SL/TP pode ter sido tocado, e só então os ticks da janela são lidos para
+    achar o tick exato. Sem essas colunas, toda janela é lida tick a tick.
+
+    Permite reaproveitar os sinais (e os offsets das velas nos ticks) de uma
+    série completa em vários trechos dela, como na análise walk-forward.
+
+    Args:
+        ohlc_with_signals (pd.DataFrame): Velas com as colunas 'open' e 'signal'.
+        ticks_df (pd.DataFrame | TickArrays): Os ticks.
+        offsets (np.ndarray | None): build_candle_offsets(ticks, ohlc_with_signals.index),
+            se já tiver sido calculado.
+
+    Returns:
+        pd.DataFrame | None: As operações fechadas, ou None se não houver nenhuma.
+    """
+    if stop_loss_pips is None:
+        stop_loss_pips = int(os.getenv("STOP_LOSS_PIPS", 200))
+    if take_profit_pips is None:
+        take_profit_pips = int(os.getenv("TAKE_PROFIT_PIPS", 400))
+    if trade_volume_lots is None:
+        trade_volume_lots = float(os.getenv("TRADE_VOLUME_LOTS", 0.1))
+
+    # Ordena os ticks uma vez e indexa a posição de cada vela no array de ticks
+    with metrics.stage('tick_index'):
+        ticks = prepare_ticks(ticks_df)
+        candle_times = ohlc_with_signals.index
+        if offsets is None:
+            offsets = build_candle_offsets(ticks, candle_times)
+        extremes = window_extremes(ohlc_with_signals, ticks, offsets)
+    signals = ohlc_with_signals['signal'].to_numpy()
+    opens = ohlc_with_signals['open'].to_numpy()
+
     trades = []
-    pip_value_points = 0.0001
+    pip_value_points = PIP_SIZE
     position = None
+    # Ticks varridos pela posição aberta (só vão para o relatório com as métricas ativas)
+    scanned = 0
+    skipped_windows = 0
+
+    with metrics.stage('tick_simulation'):
+        # 2. "Envelopa" o range do loop com tqdm para criar a barra de progresso
+        for i in tqdm(range(1, len(ohlc_with_signals)), desc="Backtesting Progress", disable=not verbose):
+            signal = signals[i]
+
+            if position is not None:
+                if extremes is None or _may_exit(extremes, i, position['stop_loss'], position['take_profit'],
+                                                 position['type']):
+                    trade_result = _resolve_exit(
+                        ticks, offsets[i-1], offsets[i],
+                        position['stop_loss'], position['take_profit'], position['type']
+                    )
+                    scanned += offsets[i] - offsets[i-1]
+                else:
+                    # A vela não alcança o SL nem o TP: nenhum tick da janela precisa ser lido
+                    trade_result = _NO_EXIT
+                    skipped_windows += 1
+                if trade_result['status'] in ['STOP_LOSS', 'TAKE_PROFIT']:
+                    position.update(trade_result)
+                    trades.append(position)
+                    position = None
+                    metrics.observe('ticks_scanned_per_trade', scanned)
+                    scanned = 0
+                elif (position['type'] == 'buy' and signal == -1) or \
+                     (position['type'] == 'sell' and signal == 1):
+                    position['exit_price'] = opens[i]
+                    position['exit_time'] = candle_times[i]
+                    position['status'] = 'SIGNAL_EXIT'
+                    trades.append(position)
+                    position = None
+                    metrics.observe('ticks_scanned_per_trade', scanned)
+                    scanned = 0
+
+            if position is None:
+                if signal == 1 or signal == -1:
+                    entry_price = opens[i]
+                    trade_type = 'buy' if signal == 1 else 'sell'
+
+                    if trade_type == 'buy':
+                        stop_loss = entry_price - (stop_loss_pips * pip_value_points)
+                        take_profit = entry_price + (take_profit_pips * pip_value_points)
+                    else: # Venda
+                        stop_loss = entry_price + (stop_loss_pips * pip_value_points)
+                        take_profit = entry_price - (take_profit_pips * pip_value_points)
+
+                    position = {
+                        'entry_price': entry_price, 'entry_time': candle_times[i],
+                        'stop_loss': stop_loss, 'take_profit': take_profit, 'type': trade_type
+                    }
+
+    metrics.count('windows_skipped', skipped_windows)
 
-    # 2. "Envelopa" o range do loop com tqdm para criar a barra de progresso
-    for i in tqdm(range(1, len(ohlc_with_signals)), desc="Backtesting Progress"):
-        current_candle = ohlc_with_signals.iloc[i]
-        signal = current_candle['signal']
-        
-        if position is not None:
-            trade_result = run_trade_simulation(
-                ticks_df, ohlc_with_signals.iloc[i-1].name, current_candle.name,
-                position['entry_price'], position['stop_loss'], position['take_profit'], position['type']
-            )
-            if trade_result['status'] in ['STOP_LOSS', 'TAKE_PROFIT']:
-                position.update(trade_result)
-                trades.append(position)
-                position = None
-            elif (position['type'] == 'buy' and signal == -1) or \
-                 (position['type'] == 'sell' and signal == 1):
-                position['exit_price'] = current_candle['open']
-                position['exit_time'] = current_candle.name
-                position['status'] = 'SIGNAL_EXIT'
-                trades.append(position)
-                position = None
-
-        if position is None:
-            if signal == 1 or signal == -1:
-                entry_price = current_candle['open']
-                trade_type = 'buy' if signal == 1 else 'sell'
-                
-                if trade_type == 'buy':
-                    stop_loss = entry_price - (stop_loss_pips * pip_value_points)
-                    take_profit = entry_price + (take_profit_pips * pip_value_points)
-                else: # Venda
-                    stop_loss = entry_price + (stop_loss_pips * pip_value_points)
-                    take_profit = entry_price - (take_profit_pips * pip_value_points)
-                
-                position = {
-                    'entry_price': entry_price, 'entry_time': current_candle.name,
-                    'stop_loss': stop_loss, 'take_profit': take_profit, 'type': trade_type
-                }
-    
     if not trades:
-        print("Backtest finished. No trades were executed.")
+        if verbose:
+            print("Backtest finished. No trades were executed.")
         return None
 
+    with metrics.stage('aggregation'):
+        results_df = trades_to_frame(trades, trade_volume_lots)
+
+    if metrics.enabled():
+        metrics.count('trades', len(results_df))
+        for status, exits in results_df['status'].value_counts().items():
+            metrics.count(f'exits.{status}', int(exits))
+
+    if verbose:
+        print("\nBacktest finished.") # Adicionei uma quebra de linha para separar da barra de progresso
+    return results_df
+
+
+def trades_to_frame(trades, trade_volume_lots):
+    """
+    Monta o DataFrame de resultados a partir das operações fechadas, com o PnL
+    em pontos (pips) e em USD.
+
+    Args:
+        trades (list[dict]): Operações com entry_price, exit_price e type ('buy' ou 'sell').
+        trade_volume_lots (float): Volume de cada operação em lotes.
+    """
     results_df = pd.DataFrame(trades)
-    
-    buy_pnl = (results_df['exit_price'] - results_df['entry_price']) / pip_value_points
-    sell_pnl = (results_df['entry_price'] - results_df['exit_price']) / pip_value_points
+
+    buy_pnl = (results_df['exit_price'] - results_df['entry_price']) / PIP_SIZE
+    sell_pnl = (results_df['entry_price'] - results_df['exit_price']) / PIP_SIZE
     results_df['pnl_points'] = buy_pnl.where(results_df['type'] == 'buy', sell_pnl)
-    
-    results_df['pnl_usd'] = results_df['pnl_points'] * pip_value_monetary
 
-    print("\nBacktest finished.") # Adicionei uma quebra de linha para separar da barra de progresso
-    return results_df
\ No newline at end of file
+    results_df['pnl_usd'] = results_df['pnl_points'] * (PIP_VALUE_PER_LOT * trade_volume_lots)
+    return results_df
+
+
+def summarize_results(results_df):
+    """
+    Resume o resultado de um backtest em métricas simples.
+
+    Args:
+        results_df (pd.DataFrame | None): Operações retornadas por run_backtest.
+
+    Returns:
+        dict: Total de operações, taxa de acerto, PnL e drawdown máximo (em USD).
+    """
+    if results_df is None or results_df.empty:
+        return {'trades': 0, 'win_rate': 0.0, 'pnl_points': 0.0, 'pnl_usd': 0.0, 'max_drawdown_usd': 0.0}
+
+    # Drawdown sobre a curva de PnL acumulado das operações fechadas, partindo de zero
+    equity = np.r_[0.0, results_df['pnl_usd'].cumsum().to_numpy()]
+    drawdown = np.maximum.accumulate(equity) - equity
+
+    return {
+        'trades': len(results_df),
+        'win_rate': float((results_df['pnl_points'] > 0).mean()),
+        'pnl_points': float(results_df['pnl_points'].sum()),
+        'pnl_usd': float(results_df['pnl_usd'].sum()),
+        'max_drawdown_usd': float(drawdown.max()),
+    }
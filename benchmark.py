@@ -0,0 +1,462 @@
+# benchmark.py
+
+"""
+Benchmarks dos caminhos críticos: leitura dos ticks, resample, geração de sinais,
+backtest completo e o motor ao vivo (live.LiveEngine, tick a tick), sobre ticks sintéticos determinísticos (fake_mt5), no
+mesmo formato que o download grava.
+
+Uso:
+    python benchmark.py --ticks 1000000
+    python benchmark.py --ticks 50000000 --save-baseline
+    python benchmark.py --ticks 50000000 --baseline benchmarks/baseline.json
+    python benchmark.py --ticks 50000000 --storage encoded --baseline benchmarks/baseline.json
+    python benchmark.py --startup
+
+Cada etapa roda em um processo próprio, então o pico de memória (RSS) medido
+é o da etapa. Os resultados são gravados em JSON e, com --baseline, comparados
+com uma execução anterior; uma etapa mais lenta que o limite é uma regressão.
+Com --storage encoded, os mesmos ticks são convertidos para o formato compacto
+do tick_store, e o relatório traz o tamanho em disco de cada formato.
+Com --startup, mede em vez disso o tempo de inicialização de cada comando do
+main.py (interpretador mais as importações do comando) contra a importação de
+todos os módulos de uma vez, como o main.py fazia antes do registro de comandos.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import backtester
+import fake_mt5
+import indicators
+import live
+import resampler
+import strategies
+import tick_store
+
+BENCH_ASSET = 'BENCHUSD'
+DAY_MS = 86_400_000
+STAGES = ['load', 'resample', 'signals', 'backtest', 'live']
+
+# O que o main.py importava ao iniciar, qualquer que fosse o comando
+EAGER_IMPORTS = ['pandas', 'dotenv', 'mt5_connector', 'download', 'tick_store', 'analyzer', 'resampler', 'mplfinance',
+                 'visualizer', 'backtester', 'optimizer', 'portfolio', 'walkforward', 'metrics', 'pipeline', 'live',
+                 'analytics']
+
+
+def _peak_rss_mb():
+    # VmHWM é zerado no exec, então mede só o processo da etapa (ru_maxrss herda o pico do pai)
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2 ** 10
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 2 ** 20
+        except (ImportError, AttributeError):
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def generate_dataset(total_ticks, data_dir, start_date='2020-01-01'):
+    """
+    Gera (uma única vez) `total_ticks` ticks sintéticos no armazenamento particionado.
+
+    Os ticks são gerados e gravados um dia por vez, então a memória usada não
+    depende do tamanho do conjunto.
+
+    Returns:
+        tuple: (data inicial, data final) no formato do .env.
+    """
+    marker = os.path.join(tick_store.asset_dir(BENCH_ASSET, data_dir), f'.complete-{total_ticks}')
+    start = pd.Timestamp(start_date)
+
+    if os.path.exists(marker):
+        with open(marker) as f:
+            return start.strftime('%Y-%m-%d'), f.read().strip()
+
+    root = tick_store.asset_dir(BENCH_ASSET, data_dir)
+    if os.path.isdir(root):
+        for dirpath, _, filenames in os.walk(root, topdown=False):
+            for name in filenames:
+                os.remove(os.path.join(dirpath, name))
+            os.rmdir(dirpath)
+
+    written = 0
+    writer = None
+    current_month = None
+    day = start
+    print(f"Generating {total_ticks:,} synthetic ticks...")
+
+    try:
+        while written < total_ticks:
+            day_ms = int(day.value // 1_000_000)
+            ticks = fake_mt5.generate_ticks(BENCH_ASSET, day_ms, day_ms + DAY_MS - 1)[:total_ticks - written]
+            if len(ticks):
+                if (day.year, day.month) != current_month:
+                    if writer is not None:
+                        writer.close()
+                    current_month = (day.year, day.month)
+                    path = tick_store.partition_path(BENCH_ASSET, day.year, day.month, data_dir)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    writer = None
+
+                df = pd.DataFrame(ticks)
+                df['time'] = pd.to_datetime(df['time'], unit='s')
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                written += len(ticks)
+            day += pd.Timedelta(days=1)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    end_date = day.strftime('%Y-%m-%d')
+    with open(marker, 'w') as f:
+        f.write(end_date)
+    return start.strftime('%Y-%m-%d'), end_date
+
+
+def encode_dataset(total_ticks, data_dir):
+    """
+    Copia (uma única vez) os ticks gerados por generate_dataset para
+    {data_dir}/encoded, no formato 'encoded' do tick_store.
+
+    Returns:
+        str: O diretório de dados com a cópia codificada.
+    """
+    encoded_dir = os.path.join(data_dir, 'encoded')
+    source_root = tick_store.asset_dir(BENCH_ASSET, data_dir)
+    target_root = tick_store.asset_dir(BENCH_ASSET, encoded_dir)
+    marker = os.path.join(target_root, f'.complete-{total_ticks}')
+    if os.path.exists(marker):
+        return encoded_dir
+
+    shutil.rmtree(target_root, ignore_errors=True)
+    print("Encoding the synthetic ticks...")
+    for dirpath, _, filenames in os.walk(source_root):
+        for name in filenames:
+            source = os.path.join(dirpath, name)
+            target = os.path.join(target_root, os.path.relpath(source, source_root))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source, target)
+            if name == tick_store.PARTITION_FILENAME:
+                tick_store.convert_partition(target, 'encoded')
+    return encoded_dir
+
+
+def storage_mb(data_dir):
+    """
+    Tamanho em disco das partições de ticks do ativo do benchmark, em MB.
+    """
+    total = 0
+    for dirpath, _, filenames in os.walk(tick_store.asset_dir(BENCH_ASSET, data_dir)):
+        total += sum(os.path.getsize(os.path.join(dirpath, name))
+                     for name in filenames if name == tick_store.PARTITION_FILENAME)
+    return total / 2 ** 20
+
+
+def _run_stage(stage, data_dir, start_date, end_date, timeframe, ohlc_path, repeat=1):
+    """
+    Executa uma etapa e devolve suas medidas (roda em um processo separado).
+    """
+    timeframe_pd = resampler.TIMEFRAMES[timeframe]
+    best = None
+    for _ in range(repeat):
+        result = _measure_stage(stage, data_dir, start_date, end_date, timeframe_pd, ohlc_path)
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+
+    if best.get('ticks'):
+        best['ticks_per_s'] = best['ticks'] / best['seconds']
+    if best.get('candles'):
+        best['candles_per_s'] = best['candles'] / best['seconds']
+    best['peak_rss_mb'] = _peak_rss_mb()
+    return best
+
+
+def _measure_stage(stage, data_dir, start_date, end_date, timeframe_pd, ohlc_path):
+    result = {}
+
+    if stage == 'load':
+        started = time.perf_counter()
+        df_ticks = tick_store.load_ticks(BENCH_ASSET, start_date, end_date, data_dir=data_dir,
+                                         columns=tick_store.PRICE_COLUMNS)
+        result['seconds'] = time.perf_counter() - started
+        result['ticks'] = len(df_ticks)
+
+    elif stage == 'resample':
+        batches = tick_store.scan_ticks(BENCH_ASSET, start_date, end_date, data_dir=data_dir,
+                                        columns=tick_store.PRICE_COLUMNS)
+        started = time.perf_counter()
+        ticks = 0
+
+        def counted(batches):
+            nonlocal ticks
+            for batch in batches:
+                ticks += batch.num_rows
+                yield batch
+
+        result['candles'] = resampler.resample_parquet_to_ohlc(counted(batches), ohlc_path, timeframe_pd)
+        result['seconds'] = time.perf_counter() - started
+        result['ticks'] = ticks
+
+    elif stage == 'signals':
+        df_ohlc = pd.read_parquet(ohlc_path)
+        started = time.perf_counter()
+        # Cache vazio: mede o cálculo dos indicadores, não o acerto no cache
+        strategies.moving_average_crossover(df_ohlc, verbose=False, cache=indicators.IndicatorCache())
+        result['seconds'] = time.perf_counter() - started
+        result['candles'] = len(df_ohlc)
+
+    elif stage == 'backtest':
+        df_ohlc = pd.read_parquet(ohlc_path)
+        df_ticks = tick_store.load_ticks(BENCH_ASSET, start_date, end_date, data_dir=data_dir,
+                                         columns=tick_store.PRICE_COLUMNS)
+        cache = indicators.IndicatorCache()
+        started = time.perf_counter()
+        results = backtester.run_backtest(
+            df_ohlc, df_ticks, lambda df: strategies.moving_average_crossover(df, verbose=False, cache=cache),
+            verbose=False
+        )
+        result['seconds'] = time.perf_counter() - started
+        result['ticks'] = len(df_ticks)
+        result['candles'] = len(df_ohlc)
+        result['trades'] = 0 if results is None else len(results)
+
+    elif stage == 'live':
+        batches = tick_store.scan_ticks(BENCH_ASSET, start_date, end_date, data_dir=data_dir,
+                                        columns=tick_store.PRICE_COLUMNS)
+        engine = live.LiveEngine(timeframe_pd)
+        # Os ticks chegam em lotes durante a medida, como no replay do comando live
+        started = time.perf_counter()
+        engine.replay(batches)
+        engine.finish()
+        result['seconds'] = time.perf_counter() - started
+        result['ticks'] = engine.ticks
+        result['candles'] = len(engine.signals)
+        result['trades'] = len(engine.trades)
+
+    return result
+
+
+def run_benchmarks(total_ticks, data_dir, timeframe='M5', stages=None, repeat=3, storage='raw'):
+    """
+    Gera os dados (se preciso) e mede cada etapa em um processo novo, ficando
+    com o menor dos `repeat` tempos (o menos afetado por ruído da máquina).
+
+    Args:
+        storage (str): Formato das partições lidas pelas etapas ('raw' ou 'encoded').
+
+    Returns:
+        dict: Metadados da execução e as medidas de cada etapa.
+    """
+    stages = stages or STAGES
+    start_date, end_date = generate_dataset(total_ticks, data_dir)
+    storage_sizes = {'raw': storage_mb(data_dir)}
+    if storage == 'encoded':
+        data_dir = encode_dataset(total_ticks, data_dir)
+        storage_sizes['encoded'] = storage_mb(data_dir)
+    ohlc_path = os.path.join(data_dir, f"{BENCH_ASSET}-{total_ticks}-{timeframe}.parquet")
+
+    report = {
+        'meta': {
+            'ticks': total_ticks, 'timeframe': timeframe, 'repeat': repeat,
+            'start_date': start_date, 'end_date': end_date,
+            'storage': storage, 'storage_mb': storage_sizes,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'pandas': pd.__version__, 'pyarrow': pa.__version__,
+        },
+        'stages': {},
+    }
+
+    def in_fresh_process(stage):
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            return executor.submit(_run_stage, stage, data_dir, start_date, end_date, timeframe, ohlc_path,
+                                   repeat).result()
+
+    for stage in stages:
+        # As etapas que leem velas dependem do arquivo gerado pelo resample
+        if stage in ('signals', 'backtest') and not os.path.exists(ohlc_path):
+            in_fresh_process('resample')
+
+        print(f"Running stage '{stage}'...")
+        report['stages'][stage] = in_fresh_process(stage)
+
+    return report
+
+
+def _startup_seconds(code, repeat):
+    # Processo novo a cada medida: nada fica em cache do sys.modules entre as execuções
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=repo_dir, check=True, stdout=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_startup_benchmark(repeat=5):
+    """
+    Mede a inicialização de cada comando do main.py em um processo novo: o
+    interpretador mais as importações declaradas no registro de comandos.
+
+    Returns:
+        dict: Metadados, o tempo do interpretador vazio, o da importação de tudo
+            (o main.py antigo) e o de cada comando.
+    """
+    import main
+
+    print("Measuring interpreter and eager import startup...")
+    report = {
+        'meta': {
+            'repeat': repeat, 'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'platform': platform.platform(),
+        },
+        'interpreter_seconds': _startup_seconds("pass", repeat),
+        'eager_seconds': _startup_seconds(f"import {', '.join(EAGER_IMPORTS)}", repeat),
+        'commands': {},
+    }
+    for name in main.COMMANDS:
+        print(f"Measuring command '{name}'...")
+        seconds = _startup_seconds(f"import main; main.import_command({name!r})", repeat)
+        report['commands'][name] = {'seconds': seconds, 'speedup': report['eager_seconds'] / seconds}
+    return report
+
+
+def print_startup_report(report):
+    print(f"\n--- Startup time (best of {report['meta']['repeat']}) ---")
+    print(f"Interpreter only: {report['interpreter_seconds']:.3f}s")
+    print(f"Eager imports (previous main.py): {report['eager_seconds']:.3f}s")
+    print(f"{'command':<12} {'seconds':>10} {'speedup':>9}")
+    for name, result in report['commands'].items():
+        print(f"{name:<12} {result['seconds']:>10.3f} {result['speedup']:>8.1f}x")
+
+
+def compare(report, baseline, threshold=0.10):
+    """
+    Compara o tempo de cada etapa com o baseline.
+
+    Returns:
+        list[str]: As etapas que ficaram mais lentas que o limite.
+    """
+    regressions = []
+    print(f"\n{'stage':<10} {'baseline s':>12} {'current s':>12} {'change':>9}")
+    for stage, current in report['stages'].items():
+        previous = baseline.get('stages', {}).get(stage)
+        if previous is None:
+            print(f"{stage:<10} {'-':>12} {current['seconds']:>12.3f} {'new':>9}")
+            continue
+        change = current['seconds'] / previous['seconds'] - 1
+        flag = '  REGRESSION' if change > threshold else ''
+        print(f"{stage:<10} {previous['seconds']:>12.3f} {current['seconds']:>12.3f} {change:>+9.1%}{flag}")
+        if change > threshold:
+            regressions.append(stage)
+
+    sizes = baseline['meta'].get('storage_mb', {})
+    previous_storage = baseline['meta'].get('storage', 'raw')
+    current_storage = report['meta']['storage']
+    if previous_storage in sizes and current_storage != previous_storage:
+        current_mb = report['meta']['storage_mb'][current_storage]
+        print(f"\nTick storage: {sizes[previous_storage]:.1f} MB ({previous_storage}) -> "
+              f"{current_mb:.1f} MB ({current_storage}), {sizes[previous_storage] / current_mb:.1f}x smaller")
+    return regressions
+
+
+def print_report(report):
+    meta = report['meta']
+    print(f"\n--- Benchmark ({meta['ticks']:,} ticks, {meta['timeframe']}, {meta['storage']} storage) ---")
+    print("Tick storage: " + ", ".join(f"{name} {size:.1f} MB" for name, size in meta['storage_mb'].items()))
+    print(f"{'stage':<10} {'seconds':>10} {'ticks/s':>14} {'candles/s':>14} {'peak RSS MB':>12}")
+    for stage, result in report['stages'].items():
+        ticks_per_s = f"{result['ticks_per_s']:,.0f}" if 'ticks_per_s' in result else '-'
+        candles_per_s = f"{result['candles_per_s']:,.0f}" if 'candles_per_s' in result else '-'
+        rss = f"{result['peak_rss_mb']:.0f}" if result.get('peak_rss_mb') is not None else '-'
+        print(f"{stage:<10} {result['seconds']:>10.3f} {ticks_per_s:>14} {candles_per_s:>14} {rss:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the load, resample, signal, backtest and live hot paths.")
+    parser.add_argument('--ticks', type=int, default=1_000_000, help="number of synthetic ticks (1M to 500M)")
+    parser.add_argument('--timeframe', default='M5', help="MT5 timeframe used for resample and backtest")
+    parser.add_argument('--stages', default=','.join(STAGES), help="comma-separated stages to run")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per stage; the fastest one is kept")
+    parser.add_argument('--storage', choices=tick_store.STORAGE_FORMATS, default='raw',
+                        help="tick partition format read by the stages")
+    parser.add_argument('--data-dir', default=os.path.join('benchmarks', 'data'))
+    parser.add_argument('--output', help="JSON results file (default: benchmarks/results/<ticks>-<timestamp>.json)")
+    parser.add_argument('--baseline', help="baseline JSON to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="also save the results as the baseline")
+    parser.add_argument('--threshold', type=float, default=0.10, help="allowed slowdown before flagging (0.10 = 10%%)")
+    parser.add_argument('--startup', action='store_true',
+                        help="measure the startup time of each main.py command instead of the hot paths")
+    args = parser.parse_args()
+
+    if args.startup:
+        report = run_startup_benchmark(max(args.repeat, 1))
+        print_startup_report(report)
+        output = args.output or os.path.join('benchmarks', 'results', f"startup-{datetime.now():%Y%m%d-%H%M%S}.json")
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to {output}")
+        return
+
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+    report = run_benchmarks(args.ticks, args.data_dir, args.timeframe, stages, args.repeat, args.storage)
+    print_report(report)
+
+    output = args.output or os.path.join('benchmarks', 'results', f"{args.ticks}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    baseline_path = args.baseline or os.path.join('benchmarks', 'baseline.json')
+    if args.save_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+    elif args.baseline:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if baseline['meta']['ticks'] != report['meta']['ticks']:
+            print(f"WARNING: baseline was run with {baseline['meta']['ticks']:,} ticks.")
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions detected in: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,71 +1,197 @@
 # download.py
 
-import MetaTrader5 as mt5
-import pandas as pd
 import os
-from datetime import datetime
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import mt5_connector
+import tick_store
+
+
+class RateLimiter:
+    """
+    Limita as chamadas ao terminal a no máximo `rate` por segundo, entre todas as threads.
+    Com rate <= 0 não há limite.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.interval == 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def plan_downloads(assets, start_date, end_date):
+    """
+    Lista os lotes mensais que ainda precisam ser baixados para cada ativo.
+
+    Meses já cobertos pelo armazenamento são pulados; se a partição cobre só parte
+    do mês, o lote passa a ser a união dos dois períodos.
+
+    Returns:
+        tuple: (lista de lotes (ativo, ano, mês, início, fim), quantidade de lotes pulados).
+    """
+    tasks = []
+    skipped = 0
+
+    for asset in assets:
+        for year, month, start_period, end_period in tick_store.month_periods(start_date, end_date):
+            if tick_store.partition_covers(asset, year, month, start_period, end_period):
+                skipped += 1
+                continue
+
+            stored_period = tick_store.read_partition_period(tick_store.partition_path(asset, year, month))
+            if stored_period is not None:
+                start_period = min(start_period, stored_period[0])
+                end_period = max(end_period, stored_period[1])
+
+            tasks.append((asset, year, month, start_period, end_period))
+
+    return tasks, skipped
+
+
+def download_assets(assets, start_date, end_date, fetch_workers=None, write_workers=None, rate_limit=None):
+    """
+    Baixa os ticks de vários ativos em um pipeline concorrente.
+
+    Um pool limitado de threads chama mt5.copy_ticks_range (respeitando o limite
+    de requisições por segundo) enquanto outras threads convertem e gravam as
+    partições já recebidas, de modo que a espera pelo terminal e a escrita em
+    disco se sobrepõem. Cada ativo é sempre gravado pela mesma thread, para que
+    a remoção das duplicatas de fronteira entre meses vizinhos não concorra.
+
+    Args:
+        assets (list[str]): Os ativos.
+        start_date, end_date: O período total.
+        fetch_workers (int | None): Threads de download (padrão: DOWNLOAD_FETCH_WORKERS ou 4).
+        write_workers (int | None): Threads de escrita (padrão: DOWNLOAD_WRITE_WORKERS ou 2).
+        rate_limit (float | None): Requisições por segundo ao terminal
+            (padrão: DOWNLOAD_RATE_LIMIT ou 1; 0 desativa o limite).
+
+    Returns:
+        dict: Estatísticas do download (lotes, ticks, erros, duração).
+    """
+    mt5 = mt5_connector.get_mt5()
+    fetch_workers = fetch_workers or int(os.getenv("DOWNLOAD_FETCH_WORKERS", 4))
+    write_workers = write_workers or int(os.getenv("DOWNLOAD_WRITE_WORKERS", 2))
+    if rate_limit is None:
+        rate_limit = float(os.getenv("DOWNLOAD_RATE_LIMIT", 1))
+
+    tasks, skipped = plan_downloads(assets, start_date, end_date)
+    stats = {'batches': len(tasks), 'skipped': skipped, 'ticks': 0, 'errors': 0, 'seconds': 0.0}
+    if not tasks:
+        return stats
+
+    limiter = RateLimiter(rate_limit)
+    # Filas limitadas: os downloads esperam se a escrita ficar para trás, mantendo a memória sob controle
+    write_queues = [queue.Queue(maxsize=fetch_workers * 2) for _ in range(write_workers)]
+    asset_queue = {asset: write_queues[i % write_workers] for i, asset in enumerate(assets)}
+    stats_lock = threading.Lock()
+    started = time.perf_counter()
+
+    def fetch(task):
+        asset, year, month, start_period, end_period = task
+        limiter.acquire()
+        try:
+            ticks = mt5.copy_ticks_range(asset, start_period.to_pydatetime(), end_period.to_pydatetime(), mt5.COPY_TICKS_ALL)
+        except Exception as e:
+            ticks = None
+            print(f"     [{asset}] Erro ao baixar {start_period:%Y-%m-%d} a {end_period:%Y-%m-%d}: {e}")
+            with stats_lock:
+                stats['errors'] += 1
+        else:
+            if ticks is None or len(ticks) == 0:
+                print(f"     [{asset}] Nenhum tick encontrado de {start_period:%Y-%m-%d} a {end_period:%Y-%m-%d}. Erro MT5: {mt5.last_error()}")
+                ticks = None
+            else:
+                print(f"  -> [{asset}] {len(ticks)} ticks recebidos de {start_period:%Y-%m-%d} a {end_period:%Y-%m-%d}")
+        if ticks is not None:
+            asset_queue[asset].put((task, ticks))
+
+    def write(write_queue):
+        while True:
+            item = write_queue.get()
+            if item is None:
+                return
+            (asset, year, month, start_period, end_period), ticks = item
+            try:
+                month_df = pd.DataFrame(ticks)
+                month_df['time'] = pd.to_datetime(month_df['time'], unit='s')
+
+                # Um mês ainda em andamento só é considerado baixado até agora
+                covered_end = min(end_period, pd.Timestamp.now().floor('s'))
+                written = tick_store.write_partition(asset, year, month, month_df, start_period, covered_end)
+                with stats_lock:
+                    stats['ticks'] += written
+                print(f"     [{asset}] {written} ticks salvos em {tick_store.partition_path(asset, year, month)}")
+            except Exception as e:
+                print(f"     [{asset}] Erro ao gravar {year:04d}-{month:02d}: {e}")
+                with stats_lock:
+                    stats['errors'] += 1
+
+    writers = [threading.Thread(target=write, args=(q,), daemon=True) for q in write_queues]
+    for writer in writers:
+        writer.start()
+
+    try:
+        with ThreadPoolExecutor(max_workers=fetch_workers) as executor:
+            list(executor.map(fetch, tasks))
+    finally:
+        for write_queue in write_queues:
+            write_queue.put(None)
+        for writer in writers:
+            writer.join()
+
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
 
 def download_ticks():
     """
-    Baixa os ticks de um ativo em um determinado período em lotes (mês a mês) 
-    e os salva em um único arquivo Parquet.
+    Baixa os ticks dos ativos configurados no .env (ASSETS, separados por vírgula,
+    ou ASSET) em lotes mensais, gravando cada mês como uma partição assim que
+    ele chega.
+
+    Meses já presentes no armazenamento são pulados, então estender o período
+    baixa apenas os meses que faltam.
     """
-    asset = os.getenv("ASSET")
+    assets_str = os.getenv("ASSETS") or os.getenv("ASSET") or ""
+    assets = [asset.strip() for asset in assets_str.split(",") if asset.strip()]
     start_date_str = os.getenv("START_DATE")
     end_date_str = os.getenv("END_DATE")
-    
-    print(f"\nIniciando download de ticks para o ativo {asset}...")
+
+    print(f"\nIniciando download de ticks para {', '.join(assets)}...")
     print(f"Período total: de {start_date_str} a {end_date_str}")
-    
+
     try:
-        # Gera um range de datas, um mês de cada vez
-        date_range = pd.date_range(start=start_date_str, end=end_date_str, freq='MS') # MS = Month Start
-        all_ticks_df = []
-
-        for i in range(len(date_range)):
-            start_period = date_range[i]
-            # O fim do período é o início do próximo mês, ou a data final do request
-            if i + 1 < len(date_range):
-                end_period = date_range[i+1]
-            else:
-                end_period = datetime.strptime(end_date_str, "%Y-%m-%d")
+        stats = download_assets(assets, start_date_str, end_date_str)
 
-            print(f"  -> Baixando lote: {start_period.strftime('%Y-%m-%d')} a {end_period.strftime('%Y-%m-%d')}")
-            
-            # Faz a requisição dos ticks ao MT5 para o período menor
-            ticks = mt5.copy_ticks_range(asset, start_period, end_period, mt5.COPY_TICKS_ALL)
-            
-            if ticks is None or len(ticks) == 0:
-                print(f"     Nenhum tick encontrado para este lote. Erro MT5: {mt5.last_error()}")
-            else:
-                print(f"     {len(ticks)} ticks recebidos.")
-                all_ticks_df.append(pd.DataFrame(ticks))
-            
-            # Pequena pausa para não sobrecarregar o terminal
-            time.sleep(1) 
-
-        if not all_ticks_df:
-            print("Nenhum dado foi baixado no período total especificado.")
+        if stats['skipped']:
+            print(f"{stats['skipped']} lote(s) já existiam e foram pulados.")
+
+        if stats['ticks'] == 0:
+            print("Nenhum dado novo foi baixado no período total especificado.")
             return
 
-        print("\nJuntando todos os lotes de dados...")
-        final_df = pd.concat(all_ticks_df, ignore_index=True)
-        
-        print("Convertendo coluna de tempo e removendo duplicatas...")
-        final_df['time'] = pd.to_datetime(final_df['time'], unit='s')
-        final_df.drop_duplicates(inplace=True)
-        
-        if not os.path.exists('data'):
-            os.makedirs('data')
-            
-        output_filename = f"{asset}-{start_date_str}-{end_date_str}.parquet"
-        output_path = os.path.join('data', output_filename)
-        
-        print(f"Salvando {len(final_df)} ticks em {output_path}...")
-        final_df.to_parquet(output_path, index=False)
-        
-        print("\nDownload e armazenamento concluídos com sucesso!")
-        
+        rate = stats['ticks'] / stats['seconds'] if stats['seconds'] else 0
+        print(f"\n{stats['ticks']} ticks salvos em {stats['seconds']:.1f}s ({rate:,.0f} ticks/s).")
+        if stats['errors']:
+            print(f"{stats['errors']} lote(s) falharam; rode o download novamente para completá-los.")
+        else:
+            print("\nDownload e armazenamento concluídos com sucesso!")
+
     except Exception as e:
-        print(f"Ocorreu um erro durante o processo de download: {e}")
\ No newline at end of file
+        print(f"Ocorreu um erro durante o processo de download: {e}")
@@ -0,0 +1,130 @@
+# fake_mt5.py
+
+"""
+Substituto local do pacote MetaTrader5 para rodar e testar o pipeline sem o terminal
+(por exemplo no Linux, onde o MetaTrader5 não pode ser instalado).
+
+Implementa a parte da API usada pelo projeto (initialize, login, shutdown,
+last_error, copy_ticks_range) e gera ticks sintéticos determinísticos: cada
+tick depende apenas do ativo e do seu instante, então pedidos com intervalos
+diferentes devolvem exatamente os mesmos ticks nos trechos em comum.
+
+Ative com MT5_BACKEND=fake no .env. FAKE_MT5_LATENCY (segundos) simula o
+tempo de resposta do terminal a cada chamada de copy_ticks_range.
+"""
+
+import os
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+COPY_TICKS_ALL = -1
+COPY_TICKS_INFO = 1
+COPY_TICKS_TRADE = 2
+
+# Mesmo layout do array estruturado devolvido pelo MetaTrader5.copy_ticks_range
+TICK_DTYPE = np.dtype([
+    ('time', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'),
+    ('volume', '<u8'), ('time_msc', '<i8'), ('flags', '<u4'), ('volume_real', '<f8'),
+])
+
+TICK_INTERVAL_MS = 250   # em média, 4 ticks por segundo
+PRICE_DIGITS = 5
+
+_state = {'initialized': False, 'last_error': (1, 'Success')}
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _splitmix64(values):
+    # Hash inteiro vetorizado (os estouros de uint64 são intencionais)
+    with np.errstate(over='ignore'):
+        z = values + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return (z ^ (z >> np.uint64(31))) & _MASK64
+
+
+def _to_msc(value):
+    if isinstance(value, datetime):
+        return int(value.timestamp() * 1000) if value.tzinfo else int((value - datetime(1970, 1, 1)).total_seconds() * 1000)
+    return int(value) * 1000
+
+
+def generate_ticks(symbol, start_msc, end_msc, interval_ms=TICK_INTERVAL_MS):
+    """
+    Gera os ticks sintéticos de um ativo no intervalo [start_msc, end_msc] (em ms).
+
+    Os ticks caem em uma grade de `interval_ms` com um deslocamento pseudoaleatório,
+    sem negociação aos sábados e domingos. O preço oscila em ciclos diários e
+    mensais com ruído, para que estratégias de médias móveis gerem sinais.
+
+    Returns:
+        np.ndarray: Array estruturado com TICK_DTYPE, em ordem cronológica.
+    """
+    seed = np.uint64(zlib.crc32(symbol.encode()))
+    slots = np.arange(start_msc // interval_ms, end_msc // interval_ms + 1, dtype=np.int64)
+
+    hashed = _splitmix64(slots.astype(np.uint64) ^ (seed << np.uint64(32)))
+    time_msc = slots * interval_ms + (hashed % np.uint64(interval_ms)).astype(np.int64)
+
+    # Dia da semana com segunda = 0 (1970-01-01 foi uma quinta-feira)
+    day_of_week = (time_msc // 86_400_000 + 3) % 7
+    keep = (time_msc >= start_msc) & (time_msc <= end_msc) & (day_of_week < 5)
+    time_msc, hashed = time_msc[keep], hashed[keep]
+
+    base = 0.5 + (int(seed) % 1500) / 1000
+    days = time_msc / 86_400_000
+    noise = ((hashed >> np.uint64(11)).astype(np.float64) / 2 ** 53) - 0.5
+    mid = base * (1 + 0.02 * np.sin(2 * np.pi * days / 30) + 0.002 * np.sin(2 * np.pi * days)) + noise * 2e-4
+
+    scale = 10 ** PRICE_DIGITS
+    spread = 1 + (hashed >> np.uint64(60)).astype(np.int64) % 3
+    bid = np.round(mid * scale)
+
+    ticks = np.zeros(len(time_msc), dtype=TICK_DTYPE)
+    ticks['time_msc'] = time_msc
+    ticks['time'] = time_msc // 1000
+    ticks['bid'] = bid / scale
+    ticks['ask'] = (bid + spread) / scale
+    ticks['flags'] = 6  # TICK_FLAG_BID | TICK_FLAG_ASK
+    return ticks
+
+
+def initialize(*args, **kwargs):
+    _state['initialized'] = True
+    _state['last_error'] = (1, 'Success')
+    return True
+
+
+def login(login, password=None, server=None, timeout=None):
+    if not _state['initialized']:
+        _state['last_error'] = (-10004, 'No IPC connection')
+        return False
+    return True
+
+
+def shutdown():
+    _state['initialized'] = False
+    return True
+
+
+def last_error():
+    return _state['last_error']
+
+
+def copy_ticks_range(symbol, date_from, date_to, flags):
+    """
+    Equivalente a MetaTrader5.copy_ticks_range: ticks entre date_from e date_to (inclusivos).
+    """
+    if not _state['initialized']:
+        _state['last_error'] = (-10004, 'No IPC connection')
+        return None
+
+    latency = float(os.getenv("FAKE_MT5_LATENCY", 0))
+    if latency > 0:
+        time.sleep(latency)
+
+    _state['last_error'] = (1, 'Success')
+    return generate_ticks(symbol, _to_msc(date_from), _to_msc(date_to))
@@ -0,0 +1,235 @@
+# indicators.py
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def sma(series, length):
+    """
+    Média móvel simples, com o mesmo resultado de pandas_ta.sma (sem talib).
+    """
+    return series.rolling(length, min_periods=length).mean()
+
+
+# Indicadores disponíveis: nome -> (função de cálculo, nº de velas anteriores de que cada valor depende)
+INDICATORS = {
+    'sma': (sma, lambda length: length - 1),
+}
+
+OHLC_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# Os indicadores são calculados em blocos de BLOCK_ROWS velas alinhados ao início da série, cada
+# bloco com as velas anteriores de que a janela precisa. O rolling().mean() do pandas carrega a soma
+# de uma janela para a seguinte, então o valor de uma vela depende de onde o cálculo começou; em
+# blocos fixos ele depende só do bloco, e estender a série recalculando a partir do último bloco
+# dá exatamente os mesmos valores que recalcular tudo (live.RollingMean reinicia nos mesmos pontos).
+BLOCK_ROWS = 65_536
+
+
+def fingerprint(df, rows=None):
+    """
+    Calcula uma impressão digital do conteúdo de um DataFrame OHLC.
+
+    Args:
+        df (pd.DataFrame): Velas indexadas por tempo.
+        rows (int | None): Considera apenas as primeiras `rows` velas.
+
+    Returns:
+        str: Hash hexadecimal do índice e das colunas OHLC.
+    """
+    if rows is not None:
+        df = df.iloc[:rows]
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(df.index.to_numpy()).view(np.uint8))
+    for column in OHLC_COLUMNS:
+        if column in df.columns:
+            digest.update(column.encode())
+            digest.update(np.ascontiguousarray(df[column].to_numpy()).view(np.uint8))
+    return digest.hexdigest()
+
+
+def compute_blocks(compute, series, lookback, first_block=0, **params):
+    """
+    Calcula um indicador bloco a bloco (ver BLOCK_ROWS).
+
+    Args:
+        compute (callable): Função do indicador em INDICATORS.
+        series (pd.Series): Série de entrada completa.
+        lookback (int): Nº de valores anteriores de que cada valor depende.
+        first_block (int): Primeiro bloco calculado (os anteriores são omitidos do resultado).
+        **params: Parâmetros do indicador.
+
+    Returns:
+        np.ndarray: Valores a partir da posição first_block * BLOCK_ROWS.
+    """
+    blocks = []
+    for start in range(first_block * BLOCK_ROWS, len(series), BLOCK_ROWS):
+        begin = max(0, start - lookback)
+        values = compute(series.iloc[begin:start + BLOCK_ROWS], **params).to_numpy(np.float64)
+        blocks.append(values[start - begin:])
+    return np.concatenate(blocks) if blocks else np.empty(0)
+
+
+class IndicatorCache:
+    """
+    Cache de indicadores chaveado por (impressão digital das velas, indicador, parâmetros).
+
+    Mantém em memória as entradas usadas mais recentemente (LRU) e, opcionalmente,
+    grava cada série calculada em disco. Quando as velas recebem novos candles no
+    final, os indicadores em cache são estendidos só com as velas novas.
+    """
+
+    def __init__(self, max_entries=128, disk_dir=None):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # chave -> array de valores
+        self._disk_index = None  # indicador -> [(fingerprint, repr dos parâmetros, velas, caminho)], lido uma vez
+        self.hits = 0
+        self.misses = 0
+        self.extensions = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, df, name, source='close', data_fingerprint=None, **params):
+        """
+        Retorna o indicador `name` calculado sobre a coluna `source` de df.
+
+        Args:
+            df (pd.DataFrame): Velas OHLC indexadas por tempo (não são modificadas).
+            name (str): Nome do indicador em INDICATORS (ex: 'sma').
+            source (str): Coluna de entrada.
+            data_fingerprint (str | None): fingerprint(df), se já tiver sido calculada.
+            **params: Parâmetros do indicador (ex: length=50).
+
+        Returns:
+            pd.Series: O indicador, alinhado ao índice de df.
+        """
+        compute, lookback = INDICATORS[name]
+        # np.int64(20) e 20 dão a mesma série, mas repr diferente nas chaves e nos nomes em disco
+        params = {param: value.item() if isinstance(value, np.generic) else value for param, value in params.items()}
+        params_key = (source,) + tuple(sorted(params.items()))
+        key = (data_fingerprint or fingerprint(df), name, params_key)
+
+        values = self._lookup(key)
+        if values is None:
+            values = self._extend(df, name, params_key, compute, lookback(**params), source, params)
+        if values is None:
+            self.misses += 1
+            values = compute_blocks(compute, df[source], lookback(**params), **params)
+        else:
+            self.hits += 1
+
+        self._store(key, values)
+        return pd.Series(values, index=df.index, name=f'{name.upper()}_{"_".join(str(v) for v in params.values())}')
+
+    def _lookup(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            if os.path.exists(path):
+                os.utime(path)  # marca o uso, para a remoção por idade/tamanho do cache de artefatos
+                return np.load(path)
+        return None
+
+    def _prefixes(self, name, params_key):
+        # Séries do mesmo indicador na memória e, depois, na camada em disco (índice ao lado de cada .npy)
+        for (fp, cached_name, cached_params), values in reversed(self._entries.items()):
+            if cached_name == name and cached_params == params_key:
+                yield fp, len(values), lambda values=values: values
+
+        if self.disk_dir:
+            for fp, params_repr, rows, path in self._disk_entries(name):
+                if params_repr == repr(params_key):
+                    yield fp, rows, lambda path=path: np.load(path)
+
+    def _disk_entries(self, name):
+        # Os índices em disco são lidos na primeira busca e depois mantidos por _store
+        if self._disk_index is None:
+            self._disk_index = {}
+            for entry in os.scandir(self.disk_dir):
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    with open(entry.path) as f:
+                        index = json.load(f)
+                    cached = (index['fingerprint'], index['params'], int(index['rows']))
+                except (OSError, ValueError, KeyError, TypeError):
+                    continue
+                self._disk_index.setdefault(entry.name.rsplit('-', 1)[0], []).append(
+                    cached + (entry.path[:-len('.json')] + '.npy',))
+        return self._disk_index.get(name, [])
+
+    def _extend(self, df, name, params_key, compute, lookback, source, params):
+        # Procura o mesmo indicador calculado sobre um prefixo destas velas
+        checked = set()
+        for fp, rows, load in self._prefixes(name, params_key):
+            if rows >= len(df) or (fp, rows) in checked:
+                continue
+            checked.add((fp, rows))
+            if fingerprint(df, rows) != fp:
+                continue
+            try:
+                values = load()
+            except (OSError, ValueError):
+                continue
+
+            # Recalcula só a partir do bloco em que o prefixo termina (ver BLOCK_ROWS)
+            first_block = rows // BLOCK_ROWS
+            tail = compute_blocks(compute, df[source], lookback, first_block, **params)
+            self.extensions += 1
+            return np.concatenate([values[:first_block * BLOCK_ROWS], tail])
+        return None
+
+    def _store(self, key, values):
+        # As séries são compartilhadas entre chamadas, então ninguém pode alterá-las
+        values.setflags(write=False)
+        is_new = key not in self._entries
+        self._entries[key] = values
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+        if is_new and self.disk_dir:
+            path = self._disk_path(key)
+            if not os.path.exists(path):
+                tmp_path = path + '.tmp.npy'
+                np.save(tmp_path, values)
+                os.replace(tmp_path, path)
+                # Índice para reaproveitar a série como prefixo de velas estendidas
+                index_path = path[:-len('.npy')] + '.json'
+                with open(index_path + '.tmp', 'w') as f:
+                    json.dump({'fingerprint': key[0], 'params': repr(key[2]), 'rows': len(values)}, f)
+                os.replace(index_path + '.tmp', index_path)
+                if self._disk_index is not None:
+                    self._disk_index.setdefault(key[1], []).append((key[0], repr(key[2]), len(values), path))
+
+    def _disk_path(self, key):
+        name = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.disk_dir, f'{key[1]}-{name}.npy')
+
+
+_default_cache = None
+
+
+def get_default_cache():
+    """
+    Retorna o cache compartilhado pelo processo, criado no primeiro uso a partir
+    do .env (INDICATOR_CACHE_SIZE e, para ativar a camada em disco, INDICATOR_CACHE_DIR).
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = IndicatorCache(
+            max_entries=int(os.getenv("INDICATOR_CACHE_SIZE", 128)),
+            disk_dir=os.getenv("INDICATOR_CACHE_DIR") or None,
+        )
+    return _default_cache
@@ -0,0 +1,383 @@
+# live.py
+
+"""
+Motor incremental para operar (ou simular) em tempo real a partir de um fluxo de ticks.
+
+A cada tick a vela aberta de cada timeframe é atualizada em O(1); quando uma
+vela fecha, as médias móveis andam uma posição e a lógica de
+strategies.moving_average_crossover é avaliada só para essa vela. O SL e o TP
+da posição aberta são conferidos em todo tick.
+
+Os sinais são os mesmos do caminho em lote (resample + moving_average_crossover):
+as velas seguem os limites de DataFrame.resample e as médias usam a mesma
+aritmética do rolling().mean() do pandas, então as comparações dão o mesmo resultado.
+
+A diferença está na execução: no lote a entrada é no open da própria vela do
+sinal, que só se conhece no fechamento dela (o filtro de tendência usa o
+close); aqui a entrada (e a saída por sinal contrário) acontece no primeiro
+tick depois do fechamento.
+"""
+
+import math
+import os
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pandas.tseries.frequencies import to_offset
+
+import backtester
+import indicators
+import resampler
+
+_DAY_NS = resampler._DAY_NS
+
+
+def _bucket_bounds(time_ns, timeframe, origin_ns):
+    """
+    Intervalo [início, fim) da vela que contém `time_ns`, e o rótulo dela.
+
+    Args:
+        origin_ns (int): Meia-noite do primeiro tick, como no resample (origin='start_day').
+
+    Returns:
+        tuple: (rótulo, início, fim) em nanossegundos.
+    """
+    label = int(resampler._bucket_labels(np.array([time_ns], dtype=np.int64), timeframe, origin_ns)[0])
+    offset = to_offset(timeframe)
+
+    if isinstance(offset, pd.offsets.Week):
+        # O rótulo é o último dia da semana (fechada à direita, em dias inteiros)
+        return label, label - 6 * _DAY_NS, label + _DAY_NS
+    if isinstance(offset, pd.offsets.MonthBegin):
+        return label, label, (pd.Timestamp(label) + offset).value
+    return label, label, label + resampler._fixed_step_ns(timeframe)
+
+
+class CandleBuilder:
+    """
+    Mantém a vela aberta de um timeframe a partir dos ticks (preço bid).
+
+    Os limites das velas são os mesmos do resample em lote; períodos sem ticks
+    não geram velas. Os ticks precisam chegar em ordem cronológica.
+    """
+
+    __slots__ = ('timeframe', 'origin_ns', 'label', 'end', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, timeframe):
+        _bucket_bounds(0, timeframe, 0)  # timeframes sem suporte falham já na criação
+        self.timeframe = timeframe
+        self.origin_ns = None
+        self.label = None
+        self.end = -2 ** 63  # o primeiro tick sempre abre uma vela
+        self.open = self.high = self.low = self.close = math.nan
+        self.volume = 0
+
+    def update(self, time_ns, price):
+        """
+        Adiciona um tick à vela aberta.
+
+        Returns:
+            tuple | None: A vela que fechou com este tick (rótulo em ns, open, high, low, close, volume), ou None.
+        """
+        if time_ns < self.end:
+            if price > self.high:
+                self.high = price
+            elif price < self.low:
+                self.low = price
+            self.close = price
+            self.volume += 1
+            return None
+
+        closed = self.candle()
+        if self.origin_ns is None:
+            self.origin_ns = time_ns // _DAY_NS * _DAY_NS
+        self.label, _, self.end = _bucket_bounds(time_ns, self.timeframe, self.origin_ns)
+        self.open = self.high = self.low = self.close = price
+        self.volume = 1
+        return closed
+
+    def candle(self):
+        """
+        Returns:
+            tuple | None: A vela aberta no momento, ou None se ainda não houve ticks.
+        """
+        if self.label is None:
+            return None
+        return self.label, self.open, self.high, self.low, self.close, self.volume
+
+
+class RollingMean:
+    """
+    Média móvel simples incremental, com a mesma aritmética de
+    Series.rolling(length, min_periods=length).mean() do pandas (soma com
+    compensação de Kahan para entradas e saídas da janela), para que os valores
+    sejam idênticos aos do cálculo em lote.
+
+    Como o cálculo em lote (indicators.compute_blocks), a soma recomeça do zero
+    a cada indicators.BLOCK_ROWS valores, a partir da janela anterior.
+    """
+
+    __slots__ = ('length', 'window', 'count', 'sum', 'add_compensation', 'remove_compensation',
+                 'negative', 'same_count', 'previous')
+
+    def __init__(self, length):
+        self.length = length
+        self.window = deque()
+        self.count = 0
+        self._reset()
+
+    def _reset(self):
+        self.sum = 0.0
+        self.add_compensation = 0.0
+        self.remove_compensation = 0.0
+        self.negative = 0
+        self.same_count = 0
+        self.previous = None
+
+    def _add(self, value):
+        y = value - self.add_compensation
+        t = self.sum + y
+        self.add_compensation = t - self.sum - y
+        self.sum = t
+        if math.copysign(1.0, value) < 0:
+            self.negative += 1
+        self.same_count = self.same_count + 1 if value == self.previous else 1
+        self.previous = value
+
+    def _remove(self, removed):
+        y = -removed - self.remove_compensation
+        t = self.sum + y
+        self.remove_compensation = t - self.sum - y
+        self.sum = t
+        if math.copysign(1.0, removed) < 0:
+            self.negative -= 1
+
+    def update(self, value):
+        """
+        Inclui um novo valor e devolve a média atual (NaN até completar a janela).
+        """
+        if self.count and self.count % indicators.BLOCK_ROWS == 0:
+            # Início de um bloco: o lote recomeça a soma com os length - 1 valores anteriores
+            previous = list(self.window)[1:] if len(self.window) == self.length else list(self.window)
+            self.window = deque(previous)
+            self._reset()
+            for old in previous:
+                self._add(old)
+        elif len(self.window) == self.length:
+            self._remove(self.window.popleft())
+
+        self.window.append(value)
+        self._add(value)
+        self.count += 1
+
+        count = len(self.window)
+        if count < self.length:
+            return math.nan
+        mean = self.sum / count
+        # Mesmos ajustes do pandas para janelas constantes ou de um único sinal
+        if self.same_count >= count:
+            return value
+        if self.negative == 0 and mean < 0:
+            return 0.0
+        if self.negative == count and mean > 0:
+            return 0.0
+        return mean
+
+
+class MovingAverageCrossover:
+    """
+    Versão incremental de strategies.moving_average_crossover: recebe as velas
+    fechadas uma a uma e devolve o sinal de cada uma (1, -1 ou 0).
+    """
+
+    def __init__(self, fast_period=None, slow_period=None, trend_filter_period=None):
+        if fast_period is None:
+            fast_period = int(os.getenv("FAST_SMA_PERIOD", 20))
+        if slow_period is None:
+            slow_period = int(os.getenv("SLOW_SMA_PERIOD", 50))
+        if trend_filter_period is None:
+            trend_filter_period = int(os.getenv("TREND_FILTER_PERIOD", 200))
+
+        self.fast = RollingMean(fast_period)
+        self.slow = RollingMean(slow_period)
+        self.trend = RollingMean(trend_filter_period)
+        # Valores (rápida, lenta) das duas velas anteriores já com as três médias definidas
+        self.history = deque(maxlen=2)
+
+    def on_candle(self, close):
+        fast = self.fast.update(close)
+        slow = self.slow.update(close)
+        trend = self.trend.update(close)
+        # No lote, as velas sem as três médias são descartadas antes dos shift(1)/shift(2)
+        if math.isnan(fast) or math.isnan(slow) or math.isnan(trend):
+            return 0
+
+        signal = 0
+        if len(self.history) == 2:
+            (fast_2, slow_2), (fast_1, slow_1) = self.history
+            if fast_1 > slow_1 and fast_2 < slow_2 and close > trend:
+                signal = 1
+            elif fast_1 < slow_1 and fast_2 > slow_2 and close < trend:
+                signal = -1
+
+        self.history.append((fast, slow))
+        return signal
+
+
+class LiveEngine:
+    """
+    Processa ticks um a um: constrói as velas, avalia a estratégia no
+    fechamento de cada vela do timeframe principal e administra uma posição
+    com SL/TP conferidos em todo tick.
+
+    Args:
+        timeframe (str): Timeframe do pandas usado pela estratégia (ex: '5min').
+        extra_timeframes (Iterable[str]): Outros timeframes cujas velas também são mantidas.
+        strategy (MovingAverageCrossover | None): Períodos lidos do .env por padrão.
+        stop_loss_pips, take_profit_pips, trade_volume_lots: Parâmetros de risco (padrão: .env).
+    """
+
+    def __init__(self, timeframe, extra_timeframes=(), strategy=None, stop_loss_pips=None, take_profit_pips=None,
+                 trade_volume_lots=None):
+        if stop_loss_pips is None:
+            stop_loss_pips = int(os.getenv("STOP_LOSS_PIPS", 200))
+        if take_profit_pips is None:
+            take_profit_pips = int(os.getenv("TAKE_PROFIT_PIPS", 400))
+        if trade_volume_lots is None:
+            trade_volume_lots = float(os.getenv("TRADE_VOLUME_LOTS", 0.1))
+
+        self.builder = CandleBuilder(timeframe)
+        self.extra_builders = [CandleBuilder(tf) for tf in extra_timeframes if tf != timeframe]
+        self.strategy = strategy or MovingAverageCrossover()
+        self.stop_loss_distance = stop_loss_pips * backtester.PIP_SIZE
+        self.take_profit_distance = take_profit_pips * backtester.PIP_SIZE
+        self.trade_volume_lots = trade_volume_lots
+
+        self.candles = {tf: [] for tf in [timeframe, *(b.timeframe for b in self.extra_builders)]}
+        self.signals = []       # (rótulo da vela em ns, sinal) para toda vela fechada do timeframe principal
+        self.trades = []
+        self.position = None
+        self.ticks = 0
+
+    def on_tick(self, time_ns, bid, ask):
+        """
+        Processa um tick (tempo em ns, bid, ask).
+        """
+        self.ticks += 1
+
+        # O tick que fecha a vela é o primeiro depois do fechamento: o sinal executa no bid dele,
+        # a abertura da vela seguinte, como o backtest em lote faz em open[i + 1]
+        if bid == bid:  # tick sem bid não entra nas velas
+            for builder in self.extra_builders:
+                closed = builder.update(time_ns, bid)
+                if closed is not None:
+                    self.candles[builder.timeframe].append(closed)
+
+            closed = self.builder.update(time_ns, bid)
+            if closed is not None:
+                signal = self._on_close(closed)
+                if signal:
+                    self._execute(signal, time_ns, bid)
+
+        # SL/TP em todo tick (inclusive no de entrada), com o SL verificado antes do TP como no backtest
+        position = self.position
+        if position is not None:
+            price = bid if position['type'] == 'buy' else ask
+            if position['type'] == 'buy':
+                hit_sl, hit_tp = price <= position['stop_loss'], price >= position['take_profit']
+            else:
+                hit_sl, hit_tp = price >= position['stop_loss'], price <= position['take_profit']
+            if hit_sl or hit_tp:
+                self._close(time_ns, 'STOP_LOSS' if hit_sl else 'TAKE_PROFIT',
+                            position['stop_loss'] if hit_sl else position['take_profit'])
+
+    def _on_close(self, candle):
+        self.candles[self.builder.timeframe].append(candle)
+        signal = self.strategy.on_candle(candle[4])
+        self.signals.append((candle[0], signal))
+        return signal
+
+    def _execute(self, signal, time_ns, price):
+        position = self.position
+        if position is not None and ((position['type'] == 'buy' and signal == -1) or
+                                     (position['type'] == 'sell' and signal == 1)):
+            self._close(time_ns, 'SIGNAL_EXIT', price)
+            position = None
+
+        if position is None:
+            trade_type = 'buy' if signal == 1 else 'sell'
+            direction = 1 if signal == 1 else -1
+            self.position = {
+                'entry_price': price, 'entry_time': pd.Timestamp(time_ns),
+                'stop_loss': price - direction * self.stop_loss_distance,
+                'take_profit': price + direction * self.take_profit_distance, 'type': trade_type,
+            }
+
+    def _close(self, time_ns, status, price):
+        self.position.update({'status': status, 'exit_price': price, 'exit_time': pd.Timestamp(time_ns)})
+        self.trades.append(self.position)
+        self.position = None
+
+    def process(self, times_ns, bids, asks):
+        """
+        Processa um lote de ticks em ordem (arrays de tempo em ns, bid e ask).
+        """
+        on_tick = self.on_tick
+        for time_ns, bid, ask in zip(times_ns.tolist(), bids.tolist(), asks.tolist()):
+            on_tick(time_ns, bid, ask)
+
+    def replay(self, batches):
+        """
+        Reproduz ticks gravados como se chegassem ao vivo (ex: tick_store.scan_ticks).
+
+        Args:
+            batches (Iterable[pa.RecordBatch | pd.DataFrame]): Lotes com 'time', 'bid' e 'ask'.
+        """
+        for batch in batches:
+            if isinstance(batch, pd.DataFrame):
+                batch = pa.RecordBatch.from_pandas(batch[['time', 'bid', 'ask']], preserve_index=False)
+            times = batch.column('time').cast(pa.timestamp('ns')).to_numpy().view(np.int64)
+            bids = batch.column('bid').to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+            asks = batch.column('ask').to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+            self.process(times, bids, asks)
+
+    def finish(self):
+        """
+        Encerra o fluxo: fecha a última vela (como no fim do histórico do lote).
+        """
+        for builder in self.extra_builders:
+            candle = builder.candle()
+            if candle is not None:
+                self.candles[builder.timeframe].append(candle)
+        candle = self.builder.candle()
+        if candle is not None:
+            self._on_close(candle)
+
+    def candles_frame(self, timeframe=None):
+        """
+        Returns:
+            pd.DataFrame: As velas fechadas do timeframe, no formato do resampler.
+        """
+        rows = self.candles[timeframe or self.builder.timeframe]
+        df = pd.DataFrame(rows, columns=['time', 'open', 'high', 'low', 'close', 'volume'])
+        df['time'] = pd.to_datetime(df['time'])
+        return df.set_index('time')
+
+    def signals_frame(self):
+        """
+        Returns:
+            pd.Series: O sinal de cada vela fechada do timeframe principal.
+        """
+        times, signals = zip(*self.signals) if self.signals else ((), ())
+        return pd.Series(signals, index=pd.to_datetime(list(times)).rename('time'), name='signal', dtype=np.int64)
+
+    def results(self):
+        """
+        Returns:
+            pd.DataFrame | None: As operações fechadas, no formato do backtester.
+        """
+        if not self.trades:
+            return None
+        return backtester.trades_to_frame(self.trades, self.trade_volume_lots)
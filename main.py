@@ -1,150 +1,738 @@
-import sys
+import argparse
+import importlib
 import os
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime
+
 from dotenv import load_dotenv
-import pandas as pd
 
-import mt5_connector
-import download
-import analyzer
-import resampler
-import visualizer
-import backtester   # Novo import
-import strategies   # Novo import
+import metrics
 
-def main():
+# Cada comando importa as próprias dependências só quando é executado: 'analyze' não carrega
+# matplotlib, 'convert' não carrega o backtester, e nenhum comando além do 'download' precisa do MetaTrader5.
+# `modules` lista o que o comando importa, para verificar as dependências antes de rodá-lo
+# (e para o benchmark de inicialização); `options` são as opções próprias do comando.
+Command = namedtuple('Command', ['handler', 'modules', 'options', 'help'])
+
+# Opção de linha de comando que sobrescreve uma variável do .env (`const` para opções sem valor)
+Option = namedtuple('Option', ['flag', 'env', 'help', 'const'], defaults=[None])
+
+COMMON_OPTIONS = [
+    Option('--asset', 'ASSET', "asset symbol"),
+    Option('--start', 'START_DATE', "first day of the period (YYYY-MM-DD)"),
+    Option('--end', 'END_DATE', "last day of the period (YYYY-MM-DD)"),
+    Option('--timeframe', 'TIMEFRAME', "MT5 timeframe, e.g. M5 or H1"),
+    Option('--metrics', 'METRICS', "record per-stage timings and memory in data/metrics-*.json", const='1'),
+    Option('--profile', 'PROFILE', "also save a cProfile dump in data/profile-*.prof", const='1'),
+]
+
+
+def _download():
     """
-    Ponto de entrada principal do script.
-    Verifica os argumentos da linha de comando e executa a tarefa correspondente.
+    Baixa os ticks do período do MetaTrader 5 para o tick_store.
     """
-    load_dotenv() # Garante que as variáveis de ambiente estão disponíveis
+    import mt5_connector
+    import download
 
-    if len(sys.argv) < 2:
-        print("Command not specified. Usage: python main.py <command>")
-        print("Available commands: download, analyze, resample, plot, backtest") # Atualizado
-        return
-        
-    command = sys.argv[1].lower()
-    
-    if command == "download":
-        connection_successful = False
-        try:
-            connection_successful = mt5_connector.connect()
-            if connection_successful:
-                download.download_ticks()
-        finally:
-            if connection_successful:
-                mt5_connector.disconnect()
-                
-    elif command == "analyze":
-        analyzer.analyze_data()
-        
-    elif command == "resample":
-        # Mapeamento de timeframes do padrão MT5 para o padrão Pandas
-        timeframe_mapping = {
-            'M1': '1min', 'M5': '5min', 'M15': '15min', 'M30': '30min',
-            'H1': '1h', 'H4': '4h', 'D1': '1d', 'W1': '1w', 'MN': 'MS'
-        }
-        # Carrega as configurações do .env
-        asset = os.getenv("ASSET")
-        start_date = os.getenv("START_DATE")
-        end_date = os.getenv("END_DATE")
-        timeframe_mt5 = os.getenv("TIMEFRAME")
-
-        # Valida o timeframe informado no .env
-        if timeframe_mt5 not in timeframe_mapping:
-            print(f"ERROR: Timeframe '{timeframe_mt5}' in .env file is not valid.")
+    connection_successful = False
+    try:
+        connection_successful = mt5_connector.connect()
+        if connection_successful:
+            download.download_ticks()
+    finally:
+        if connection_successful:
+            mt5_connector.disconnect()
+
+
+def _analyze():
+    """
+    Gera o relatório de qualidade dos ticks do período.
+    """
+    import analyzer
+
+    analyzer.analyze_data()
+
+
+def _resample():
+    """
+    Converte os ticks em velas OHLC de um ou mais timeframes.
+    """
+    import pandas as pd
+    import tick_store
+    import resampler
+    import pipeline
+
+    # Mapeamento de timeframes do padrão MT5 para o padrão Pandas
+    timeframe_mapping = resampler.TIMEFRAMES
+    # Carrega as configurações do .env
+    asset = os.getenv("ASSET")
+    start_date = os.getenv("START_DATE")
+    end_date = os.getenv("END_DATE")
+    timeframe_mt5 = os.getenv("TIMEFRAME")
+
+    # TIMEFRAME aceita um timeframe, uma lista separada por vírgulas ou ALL
+    if timeframe_mt5 and (timeframe_mt5.upper() == "ALL" or "," in timeframe_mt5):
+        if timeframe_mt5.upper() == "ALL":
+            timeframes = list(timeframe_mapping)
+        else:
+            timeframes = [tf.strip() for tf in timeframe_mt5.split(",") if tf.strip()]
+
+        invalid = [tf for tf in timeframes if tf not in timeframe_mapping]
+        if invalid:
+            print(f"ERROR: Timeframe(s) '{', '.join(invalid)}' in .env file are not valid.")
             print(f"Please use one of the following: {', '.join(timeframe_mapping.keys())}")
             return
-            
-        timeframe_pd = timeframe_mapping[timeframe_mt5]
-        ticks_filename = f"{asset}-{start_date}-{end_date}.parquet"
-        ticks_filepath = os.path.join('data', ticks_filename)
 
-        if not os.path.exists(ticks_filepath):
-            print(f"ERROR: Ticks file not found at {ticks_filepath}")
+        # As assinaturas vêm antes da leitura: ticks baixados durante o resample deixam as velas desatualizadas
+        signatures = {tf: pipeline.ohlc_source_signature(asset, start_date, end_date, tf) for tf in timeframes}
+        tick_batches = tick_store.scan_ticks(asset, start_date, end_date, columns=tick_store.PRICE_COLUMNS)
+        if tick_batches is None:
+            print(f"ERROR: No ticks found for {asset} between {start_date} and {end_date}")
             print("Please run 'python main.py download' first.")
             return
 
-        print(f"Loading ticks from {ticks_filepath}...")
-        df_ticks = pd.read_parquet(ticks_filepath)
+        # Os ticks são lidos uma vez para as velas base; os demais timeframes vêm dessas velas
+        base_timeframe = os.getenv("BASE_TIMEFRAME", "1min")
+        output_paths = {
+            timeframe_mapping[tf]: os.path.join('data', f"{asset}-{start_date}-{end_date}-{tf}.parquet")
+            for tf in timeframes
+        }
+        print(f"Resampling ticks to {', '.join(timeframes)} in a single pass (base '{base_timeframe}')...")
+        totals = resampler.resample_multi_timeframe(tick_batches, output_paths, base_timeframe)
+
+        if not any(totals.values()):
+            print(f"ERROR: No ticks found for {asset} between {start_date} and {end_date}")
+            return
+
+        for tf in timeframes:
+            if totals[timeframe_mapping[tf]]:
+                pipeline.write_ohlc_source(output_paths[timeframe_mapping[tf]], signatures[tf])
+
+        print("\nResampling complete and files saved successfully!")
+        for tf in timeframes:
+            print(f"  {tf}: {totals[timeframe_mapping[tf]]} candles -> {output_paths[timeframe_mapping[tf]]}")
+        return
+
+    # Valida o timeframe informado no .env
+    if timeframe_mt5 not in timeframe_mapping:
+        print(f"ERROR: Timeframe '{timeframe_mt5}' in .env file is not valid.")
+        print(f"Please use one of the following: {', '.join(timeframe_mapping.keys())}")
+        return
         
+    timeframe_pd = timeframe_mapping[timeframe_mt5]
+    ohlc_filename = f"{asset}-{start_date}-{end_date}-{timeframe_mt5}.parquet"
+    ohlc_filepath = os.path.join('data', ohlc_filename)
+
+    signature = pipeline.ohlc_source_signature(asset, start_date, end_date, timeframe_mt5)
+
+    # 'stream' (padrão) lê os ticks em lotes com memória constante; 'memory' carrega tudo de uma vez
+    resample_mode = os.getenv("RESAMPLE_MODE", "stream").lower()
+
+    if resample_mode == "memory":
+        print(f"Loading ticks for {asset} from {start_date} to {end_date}...")
+        df_ticks = tick_store.load_ticks(asset, start_date, end_date, columns=tick_store.PRICE_COLUMNS)
+
+        if df_ticks is None:
+            print(f"ERROR: No ticks found for {asset} between {start_date} and {end_date}")
+            print("Please run 'python main.py download' first.")
+            return
+
         print(f"Resampling ticks to {timeframe_mt5} timeframe (using pandas '{timeframe_pd}')...")
         df_ohlc = resampler.resample_to_ohlc(df_ticks, timeframe_pd)
 
-        ohlc_filename = f"{asset}-{start_date}-{end_date}-{timeframe_mt5}.parquet"
-        ohlc_filepath = os.path.join('data', ohlc_filename)
-        
         print(f"Saving OHLC data to {ohlc_filepath}...")
         df_ohlc.to_parquet(ohlc_filepath)
+    else:
+        tick_batches = tick_store.scan_ticks(asset, start_date, end_date, columns=tick_store.PRICE_COLUMNS)
 
-        print("\nResampling complete and file saved successfully!")
-        print("\n--- OHLC Data Sample (First 5 Rows) ---")
-        print(df_ohlc.head())
+        if tick_batches is None:
+            print(f"ERROR: No ticks found for {asset} between {start_date} and {end_date}")
+            print("Please run 'python main.py download' first.")
+            return
 
-    elif command == "plot":
-        asset = os.getenv("ASSET")
-        start_date = os.getenv("START_DATE")
-        end_date = os.getenv("END_DATE")
-        timeframe_mt5 = os.getenv("TIMEFRAME")
+        print(f"Streaming ticks into {timeframe_mt5} candles (using pandas '{timeframe_pd}') at {ohlc_filepath}...")
+        total_candles = resampler.resample_parquet_to_ohlc(tick_batches, ohlc_filepath, timeframe_pd)
 
-        ohlc_filename = f"{asset}-{start_date}-{end_date}-{timeframe_mt5}.parquet"
-        ohlc_filepath = os.path.join('data', ohlc_filename)
-        
-        if not os.path.exists(ohlc_filepath):
-            print(f"ERROR: OHLC file not found at {ohlc_filepath}")
-            print("Please run 'python main.py resample' first.")
+        if total_candles == 0:
+            print(f"ERROR: No ticks found for {asset} between {start_date} and {end_date}")
             return
 
-        print(f"Loading OHLC data from {ohlc_filepath}...")
         df_ohlc = pd.read_parquet(ohlc_filepath)
 
-        visualizer.plot_ohlc(df_ohlc, asset) 
+    # O backtest só reaproveita as velas cuja assinatura ainda é a dos ticks
+    pipeline.write_ohlc_source(ohlc_filepath, signature)
 
-    # --- NOVO COMANDO BACKTEST ---
-    elif command == "backtest":
-        asset = os.getenv("ASSET")
-        start_date = os.getenv("START_DATE")
-        end_date = os.getenv("END_DATE")
-        timeframe_mt5 = os.getenv("TIMEFRAME")
+    print("\nResampling complete and file saved successfully!")
+    print("\n--- OHLC Data Sample (First 5 Rows) ---")
+    print(df_ohlc.head())
 
-        # Define os caminhos dos arquivos de entrada
-        ohlc_filename = f"{asset}-{start_date}-{end_date}-{timeframe_mt5}.parquet"
-        ohlc_filepath = os.path.join('data', ohlc_filename)
-        
-        ticks_filename = f"{asset}-{start_date}-{end_date}.parquet"
-        ticks_filepath = os.path.join('data', ticks_filename)
-        
-        if not os.path.exists(ohlc_filepath) or not os.path.exists(ticks_filepath):
-            print("ERROR: Input files not found. Please run 'download' and 'resample' first.")
-            return
 
-        print("Loading OHLC and Ticks data...")
-        df_ohlc = pd.read_parquet(ohlc_filepath)
-        df_ticks = pd.read_parquet(ticks_filepath)
+def _plot():
+    """
+    Plota as velas (e, opcionalmente, as operações do backtest).
+    """
+    import pandas as pd
+    import visualizer
+    import pipeline
 
-        # "Pluga" a estratégia desejada no motor de backtest.
-        results = backtester.run_backtest(df_ohlc, df_ticks, strategies.moving_average_crossover)
-        
-        if results is None:
-            return
+    asset = os.getenv("ASSET")
+    start_date = os.getenv("START_DATE")
+    end_date = os.getenv("END_DATE")
+    timeframe_mt5 = os.getenv("TIMEFRAME")
 
-        # Exibe um resumo simples dos resultados
-        print("\n--- Backtest Results Summary ---")
-        print(f"Total Trades: {len(results)}")
-        print(f"Winning Trades: {len(results[results['pnl_points'] > 0])}")
-        print(f"Losing Trades: {len(results[results['pnl_points'] <= 0])}")
-        
-        total_pnl_pips = results['pnl_points'].sum()
-        total_pnl_usd = results['pnl_usd'].sum() # Novo
-        print(f"Total PnL (in pips): {total_pnl_pips:.2f}")
-        print(f"Total PnL (in USD for {os.getenv('TRADE_VOLUME_LOTS')} lots): ${total_pnl_usd:.2f}") # Novo
+    ohlc_filename = f"{asset}-{start_date}-{end_date}-{timeframe_mt5}.parquet"
+    ohlc_filepath = os.path.join('data', ohlc_filename)
+    
+    if not os.path.exists(ohlc_filepath):
+        print(f"ERROR: OHLC file not found at {ohlc_filepath}")
+        print("Please run 'python main.py resample' first.")
+        return
+
+    print(f"Loading OHLC data from {ohlc_filepath}...")
+    df_ohlc = pd.read_parquet(ohlc_filepath)
+
+    # PLOT_MODE=last mantém o gráfico antigo das últimas 100 velas
+    if os.getenv("PLOT_MODE", "range").lower() == "last":
+        visualizer.plot_ohlc(df_ohlc, asset)
+        return
+
+    # Com PLOT_TRADES=1, as operações do backtest (do cache de artefatos) são marcadas no gráfico
+    trades = None
+    if os.getenv("PLOT_TRADES", "0") == "1":
+        trades, steps = pipeline.run_backtest_pipeline(asset, start_date, end_date, timeframe_mt5, verbose=False,
+                                                       compact=os.getenv("TICK_COMPACT") or None)
+        if 'missing' in steps.values():
+            print("WARNING: Tick files not found; plotting without trades.")
+
+    visualizer.plot_ohlc_range(df_ohlc, asset, trades=trades,
+                               start=os.getenv("PLOT_START") or None, end=os.getenv("PLOT_END") or None)
+
+
+def _backtest():
+    """
+    Roda o backtest pelo cache de artefatos do pipeline.
+    """
+    import resampler
+    import pipeline
+
+    asset = os.getenv("ASSET")
+    start_date = os.getenv("START_DATE")
+    end_date = os.getenv("END_DATE")
+    timeframe_mt5 = os.getenv("TIMEFRAME")
+
+    if timeframe_mt5 not in resampler.TIMEFRAMES:
+        print(f"ERROR: Timeframe '{timeframe_mt5}' in .env file is not valid.")
+        return
+
+    # Velas, indicadores e resultado vêm do cache de artefatos; só as etapas desatualizadas são refeitas
+    # (TICK_COMPACT=float32|int reduz a memória usada pelos ticks)
+    results, steps = pipeline.run_backtest_pipeline(asset, start_date, end_date, timeframe_mt5,
+                                                    compact=os.getenv("TICK_COMPACT") or None)
+    print("Pipeline steps: " + ", ".join(f"{step}={status}" for step, status in steps.items()))
+    ohlc_filepath = pipeline.ohlc_file(asset, start_date, end_date, timeframe_mt5)
+    if steps.get('ohlc') not in (None, 'reused') and os.path.exists(ohlc_filepath):
+        print(f"Note: {ohlc_filepath} was not resampled from the current tick files and was not used; "
+              "candles were resampled from the ticks.")
+
+    removed, freed = pipeline.evict_from_env()
+    if removed:
+        print(f"Evicted {removed} cached artifact(s), {freed / 2 ** 20:.1f} MB freed.")
+
+    if 'missing' in steps.values():
+        print("ERROR: Input files not found. Please run 'download' first.")
+        return
+
+    if results is None:
+        print("No trades were executed.")
+        return
+
+    # Exibe um resumo simples dos resultados
+    print("\n--- Backtest Results Summary ---")
+    print(f"Total Trades: {len(results)}")
+    print(f"Winning Trades: {len(results[results['pnl_points'] > 0])}")
+    print(f"Losing Trades: {len(results[results['pnl_points'] <= 0])}")
+    
+    total_pnl_pips = results['pnl_points'].sum()
+    total_pnl_usd = results['pnl_usd'].sum() # Novo
+    print(f"Total PnL (in pips): {total_pnl_pips:.2f}")
+    print(f"Total PnL (in USD for {pipeline.result_settings()['TRADE_VOLUME_LOTS']} lots): ${total_pnl_usd:.2f}") # Novo
+
+    print("\n--- Last 5 Trades ---")
+    print(results.tail())
+
+
+def _optimize():
+    """
+    Otimiza os parâmetros da estratégia sobre a grade OPTIMIZE_GRID.
+    """
+    import pandas as pd
+    import tick_store
+    import optimizer
+
+    asset = os.getenv("ASSET")
+    start_date = os.getenv("START_DATE")
+    end_date = os.getenv("END_DATE")
+    timeframe_mt5 = os.getenv("TIMEFRAME")
+    grid_spec = os.getenv("OPTIMIZE_GRID")
+
+    if not grid_spec:
+        print("ERROR: OPTIMIZE_GRID not found in the .env file.")
+        print("Example: OPTIMIZE_GRID=FAST_SMA_PERIOD=10:30:10;SLOW_SMA_PERIOD=50,100;STOP_LOSS_PIPS=100,200")
+        return
+
+    try:
+        grid = optimizer.parse_grid(grid_spec)
+    except ValueError as e:
+        print(f"ERROR: Invalid OPTIMIZE_GRID: {e}")
+        return
+
+    rank_by = os.getenv("OPTIMIZE_METRIC", "pnl_usd")
+    try:
+        optimizer.check_metric(rank_by)
+    except ValueError as e:
+        print(f"ERROR: Invalid OPTIMIZE_METRIC: {e}")
+        return
+
+    ohlc_filename = f"{asset}-{start_date}-{end_date}-{timeframe_mt5}.parquet"
+    ohlc_filepath = os.path.join('data', ohlc_filename)
+
+    if not os.path.exists(ohlc_filepath):
+        print("ERROR: Input files not found. Please run 'download' and 'resample' first.")
+        return
+
+    # Os dados são carregados uma única vez para toda a grade
+    print("Loading OHLC and Ticks data...")
+    df_ohlc = pd.read_parquet(ohlc_filepath)
+    df_ticks = tick_store.load_ticks(asset, start_date, end_date, columns=tick_store.PRICE_COLUMNS,
+                                     compact=os.getenv("TICK_COMPACT") or None, as_arrow=True)
+
+    if df_ticks is None:
+        print("ERROR: Input files not found. Please run 'download' and 'resample' first.")
+        return
+
+    max_workers = int(os.getenv("OPTIMIZE_WORKERS", 0)) or None
+    print(f"Optimizing {len(optimizer.build_combinations(grid))} parameter combinations...")
+    results = optimizer.optimize(df_ohlc, df_ticks, grid, max_workers=max_workers, rank_by=rank_by)
+
+    if results.empty:
+        print("No valid parameter combinations in OPTIMIZE_GRID.")
+        return
+
+    results_filepath = os.path.join('data', f"optimization-{asset}-{start_date}-{end_date}-{timeframe_mt5}.csv")
+    results.to_csv(results_filepath)
+
+    print(f"\n--- Top 10 Parameter Sets (by {rank_by}) ---")
+    print(results.head(10).to_string())
+    print(f"\nFull ranking saved to {results_filepath}")
+
+
+def _portfolio():
+    """
+    Roda o backtest de vários ativos em paralelo.
+    """
+    import resampler
+    import portfolio
+
+    # PORTFOLIO_ASSETS (ou ASSETS) lista os ativos separados por vírgula
+    assets_str = os.getenv("PORTFOLIO_ASSETS") or os.getenv("ASSETS") or os.getenv("ASSET") or ""
+    assets = [asset.strip() for asset in assets_str.split(",") if asset.strip()]
+    start_date = os.getenv("START_DATE")
+    end_date = os.getenv("END_DATE")
+    timeframe_mt5 = os.getenv("TIMEFRAME")
+
+    if not assets:
+        print("ERROR: PORTFOLIO_ASSETS not found in the .env file.")
+        return
+    if timeframe_mt5 not in resampler.TIMEFRAMES:
+        print(f"ERROR: Timeframe '{timeframe_mt5}' in .env file is not valid.")
+        return
+
+    max_workers = int(os.getenv("PORTFOLIO_WORKERS", 0)) or None
+    print(f"Running portfolio backtest for {len(assets)} assets...")
+    trades, summary, errors = portfolio.run_portfolio_backtest(assets, start_date, end_date, timeframe_mt5,
+                                                               max_workers=max_workers)
+
+    print("\n--- Portfolio Results Summary ---")
+    print(summary.to_string())
+
+    if errors:
+        print(f"\nAssets skipped because of errors: {', '.join(errors)}")
+
+    if trades is None:
+        print("\nNo trades were executed.")
+        return
+
+    trades_filepath = os.path.join('data', f"portfolio-{start_date}-{end_date}-{timeframe_mt5}.parquet")
+    trades.to_parquet(trades_filepath)
+    print(f"\nPortfolio trades and equity curve saved to {trades_filepath}")
+
+
+def _walkforward():
+    """
+    Análise walk-forward: otimiza em cada janela de treino e testa na seguinte.
+    """
+    import pandas as pd
+    import tick_store
+    import optimizer
+    import walkforward
+
+    asset = os.getenv("ASSET")
+    start_date = os.getenv("START_DATE")
+    end_date = os.getenv("END_DATE")
+    timeframe_mt5 = os.getenv("TIMEFRAME")
+
+    grid_spec = os.getenv("OPTIMIZE_GRID")
+
+    if not grid_spec:
+        print("ERROR: OPTIMIZE_GRID not found in the .env file.")
+        print("Example: OPTIMIZE_GRID=FAST_SMA_PERIOD=10:30:10;SLOW_SMA_PERIOD=50,100;STOP_LOSS_PIPS=100,200")
+        return
+
+    try:
+        grid = optimizer.parse_grid(grid_spec)
+    except ValueError as e:
+        print(f"ERROR: Invalid OPTIMIZE_GRID: {e}")
+        return
+
+    if not optimizer.build_combinations(grid):
+        print("No valid parameter combinations in OPTIMIZE_GRID.")
+        return
+
+    rank_by = os.getenv("OPTIMIZE_METRIC", "pnl_usd")
+    try:
+        optimizer.check_metric(rank_by)
+    except ValueError as e:
+        print(f"ERROR: Invalid OPTIMIZE_METRIC: {e}")
+        return
+
+    ohlc_filename = f"{asset}-{start_date}-{end_date}-{timeframe_mt5}.parquet"
+    ohlc_filepath = os.path.join('data', ohlc_filename)
+
+    if not os.path.exists(ohlc_filepath):
+        print("ERROR: Input files not found. Please run 'download' and 'resample' first.")
+        return
+
+    print("Loading OHLC and Ticks data...")
+    df_ohlc = pd.read_parquet(ohlc_filepath)
+    df_ticks = tick_store.load_ticks(asset, start_date, end_date, columns=tick_store.PRICE_COLUMNS,
+                                     compact=os.getenv("TICK_COMPACT") or None, as_arrow=True)
+
+    if df_ticks is None:
+        print("ERROR: Input files not found. Please run 'download' and 'resample' first.")
+        return
+
+    train_months = int(os.getenv("WF_TRAIN_MONTHS", 6))
+    test_months = int(os.getenv("WF_TEST_MONTHS", 1))
+    max_workers = int(os.getenv("WF_WORKERS", 0)) or None
+
+    print(f"Running walk-forward analysis (train={train_months} months, test={test_months} months)...")
+    windows, oos_trades, oos_summary = walkforward.run_walkforward(
+        df_ohlc, df_ticks, grid, train_months, test_months, max_workers=max_workers, rank_by=rank_by
+    )
+
+    if windows.empty:
+        print("Not enough data for a single walk-forward window.")
+        return
+
+    windows_filepath = os.path.join('data', f"walkforward-{asset}-{start_date}-{end_date}-{timeframe_mt5}.csv")
+    windows.to_csv(windows_filepath)
+
+    print("\n--- Walk-forward Windows ---")
+    print(windows.to_string())
+    partial = windows.index[windows['partial']].tolist()
+    if partial:
+        print(f"WARNING: The test period of window(s) {', '.join(map(str, partial))} runs past the end of the data; "
+              "their out-of-sample results cover less than WF_TEST_MONTHS.")
+    print("\n--- Stitched Out-of-Sample Summary ---")
+    for key, value in oos_summary.items():
+        print(f"{key}: {value}")
+
+    if oos_trades is not None:
+        trades_filepath = os.path.join('data', f"walkforward-{asset}-{start_date}-{end_date}-{timeframe_mt5}-oos.parquet")
+        oos_trades.to_parquet(trades_filepath)
+        print(f"\nOut-of-sample trades saved to {trades_filepath}")
+    print(f"Per-window results saved to {windows_filepath}")
+
+
+def _live():
+    """
+    Reproduz os ticks gravados como um fluxo ao vivo, pelo motor incremental.
+    """
+    import tick_store
+    import resampler
+    import live
+    import backtester
+
+    asset = os.getenv("ASSET")
+    start_date = os.getenv("START_DATE")
+    end_date = os.getenv("END_DATE")
+    timeframe_mt5 = os.getenv("TIMEFRAME")
+
+    if timeframe_mt5 not in resampler.TIMEFRAMES:
+        print(f"ERROR: Timeframe '{timeframe_mt5}' in .env file is not valid.")
+        return
+
+    tick_batches = tick_store.scan_ticks(asset, start_date, end_date, columns=tick_store.PRICE_COLUMNS)
+    if tick_batches is None:
+        print(f"ERROR: No ticks found for {asset} between {start_date} and {end_date}")
+        print("Please run 'python main.py download' first.")
+        return
+
+    print(f"Replaying {asset} ticks from {start_date} to {end_date} through the live engine ({timeframe_mt5})...")
+    engine = live.LiveEngine(resampler.TIMEFRAMES[timeframe_mt5])
+    started = time.perf_counter()
+    engine.replay(tick_batches)
+    engine.finish()
+    elapsed = time.perf_counter() - started
+
+    signals = engine.signals_frame()
+    print(f"\n{engine.ticks} ticks in {elapsed:.1f}s ({engine.ticks / elapsed:,.0f} ticks/s)")
+    print(f"Candles closed: {len(signals)}, buy signals: {(signals == 1).sum()}, sell signals: {(signals == -1).sum()}")
+
+    results = engine.results()
+    if results is None:
+        print("No trades were executed.")
+        return
+
+    summary = backtester.summarize_results(results)
+    print("\n--- Live Replay Results Summary ---")
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+
+    trades_filepath = os.path.join('data', f"live-{asset}-{start_date}-{end_date}-{timeframe_mt5}.parquet")
+    results.to_parquet(trades_filepath)
+    print(f"\nTrades saved to {trades_filepath}")
+
+
+def _convert():
+    """
+    Regrava as partições de ticks do período em outro formato de armazenamento.
+    """
+    import tick_store
+
+    asset = os.getenv("ASSET")
+    start_date = os.getenv("START_DATE")
+    end_date = os.getenv("END_DATE")
+
+    # Regrava as partições do período no formato de TICK_STORAGE_FORMAT ('encoded' se não definido)
+    storage = (os.getenv("TICK_STORAGE_FORMAT") or "encoded").lower()
+    if storage not in tick_store.STORAGE_FORMATS:
+        print(f"ERROR: Unknown TICK_STORAGE_FORMAT '{storage}'. Use 'raw' or 'encoded'.")
+        return
+
+    paths = [tick_store.partition_path(asset, year, month)
+             for year, month, _, _ in tick_store.month_periods(start_date, end_date)]
+    paths = [path for path in paths if os.path.exists(path)]
+    if not paths:
+        print(f"ERROR: No tick partitions found for {asset} between {start_date} and {end_date}")
+        return
+
+    total_before = total_after = 0
+    for path in paths:
+        size_before, size_after = tick_store.convert_partition(path, storage)
+        total_before += size_before
+        total_after += size_after
+        print(f"  {path}: {size_before / 2 ** 20:.1f} MB -> {size_after / 2 ** 20:.1f} MB")
+    print(f"\nConverted {len(paths)} partition(s) to '{storage}': "
+          f"{total_before / 2 ** 20:.1f} MB -> {total_after / 2 ** 20:.1f} MB")
+
+
+def _analytics():
+    """
+    Curva de patrimônio tick a tick e métricas de risco do backtest.
+    """
+    import resampler
+    import pipeline
+    import tick_store
+    import analytics
+
+    asset = os.getenv("ASSET")
+    start_date = os.getenv("START_DATE")
+    end_date = os.getenv("END_DATE")
+    timeframe_mt5 = os.getenv("TIMEFRAME")
+
+    if timeframe_mt5 not in resampler.TIMEFRAMES:
+        print(f"ERROR: Timeframe '{timeframe_mt5}' in .env file is not valid.")
+        return
+
+    # As operações vêm do cache de artefatos do backtest; os ticks são relidos em lotes
+    results, steps = pipeline.run_backtest_pipeline(asset, start_date, end_date, timeframe_mt5, verbose=False,
+                                                    compact=os.getenv("TICK_COMPACT") or None)
+    tick_batches = tick_store.scan_ticks(asset, start_date, end_date, columns=tick_store.PRICE_COLUMNS)
+    if 'missing' in steps.values() or tick_batches is None:
+        print("ERROR: Input files not found. Please run 'download' first.")
+        return
+
+    if results is None:
+        print("No trades were executed.")
+        return
+
+    print(f"Computing tick-level equity for {len(results)} trades...")
+    output_prefix = os.path.join('data', f"{asset}-{start_date}-{end_date}-{timeframe_mt5}")
+    summary, curve_path, summary_path = analytics.run_analytics(results, tick_batches, output_prefix)
+
+    print("\n--- Equity Analytics ---")
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+
+    if curve_path:
+        print(f"\nEquity curve saved to {curve_path}")
+    print(f"Analytics summary saved to {summary_path}")
+
+
+COMMANDS = {
+    'download': Command(_download, ['mt5_connector', 'download'], [
+        Option('--backend', 'MT5_BACKEND', "MetaTrader5 package or a compatible module such as fake_mt5"),
+    ], "download ticks from MetaTrader 5 into the tick store"),
+    'analyze': Command(_analyze, ['analyzer'], [
+        Option('--gap-threshold', 'GAP_THRESHOLD_SECONDS', "seconds without ticks reported as a gap"),
+        Option('--price-digits', 'PRICE_DIGITS', "price digits used to measure the spread in points"),
+    ], "stream a data-quality report of the ticks"),
+    'resample': Command(_resample, ['pandas', 'tick_store', 'resampler', 'pipeline'], [
+        Option('--mode', 'RESAMPLE_MODE', "'stream' (default) or 'memory'"),
+        Option('--base-timeframe', 'BASE_TIMEFRAME', "base candles for multi-timeframe resampling"),
+    ], "resample ticks into OHLC candles (TIMEFRAME may be a list or ALL)"),
+    'plot': Command(_plot, ['pandas', 'visualizer', 'pipeline'], [
+        Option('--mode', 'PLOT_MODE', "'range' (default) or 'last' for the last 100 candles"),
+        Option('--trades', 'PLOT_TRADES', "mark the backtest trades on the chart", const='1'),
+        Option('--from', 'PLOT_START', "start of the initial window"),
+        Option('--to', 'PLOT_END', "end of the initial window"),
+    ], "plot the OHLC candles"),
+    'backtest': Command(_backtest, ['resampler', 'pipeline'], [
+        Option('--compact', 'TICK_COMPACT', "'float32' or 'int' to reduce tick memory"),
+    ], "run the backtest through the cached pipeline"),
+    'optimize': Command(_optimize, ['pandas', 'tick_store', 'optimizer'], [
+        Option('--grid', 'OPTIMIZE_GRID', "parameter grid, e.g. FAST_SMA_PERIOD=10:30:10;SLOW_SMA_PERIOD=50,100"),
+        Option('--workers', 'OPTIMIZE_WORKERS', "worker processes (default: all cores)"),
+        Option('--rank-by', 'OPTIMIZE_METRIC', "summary metric used to rank the combinations"),
+        Option('--compact', 'TICK_COMPACT', "'float32' or 'int' to reduce tick memory"),
+    ], "optimize strategy parameters over OPTIMIZE_GRID"),
+    'portfolio': Command(_portfolio, ['resampler', 'portfolio'], [
+        Option('--assets', 'PORTFOLIO_ASSETS', "comma-separated asset symbols"),
+        Option('--workers', 'PORTFOLIO_WORKERS', "worker processes (default: all cores)"),
+    ], "backtest several assets in parallel"),
+    'walkforward': Command(_walkforward, ['pandas', 'tick_store', 'optimizer', 'walkforward'], [
+        Option('--grid', 'OPTIMIZE_GRID', "parameter grid, e.g. FAST_SMA_PERIOD=10:30:10;SLOW_SMA_PERIOD=50,100"),
+        Option('--train-months', 'WF_TRAIN_MONTHS', "months in each training window"),
+        Option('--test-months', 'WF_TEST_MONTHS', "months in each test window"),
+        Option('--workers', 'WF_WORKERS', "worker processes (default: all cores)"),
+        Option('--rank-by', 'OPTIMIZE_METRIC', "summary metric used to pick each window's parameters"),
+        Option('--compact', 'TICK_COMPACT', "'float32' or 'int' to reduce tick memory"),
+    ], "walk-forward optimization and out-of-sample test"),
+    'live': Command(_live, ['tick_store', 'resampler', 'live', 'backtester'], [],
+                    "replay the recorded ticks through the live engine"),
+    'convert': Command(_convert, ['tick_store'], [
+        Option('--storage', 'TICK_STORAGE_FORMAT', "'encoded' (default) or 'raw'"),
+    ], "rewrite the tick partitions in another storage format"),
+    'analytics': Command(_analytics, ['resampler', 'pipeline', 'tick_store', 'analytics'], [
+        Option('--equity-timeframe', 'ANALYTICS_TIMEFRAME', "period of each point of the saved equity curve"),
+        Option('--initial-balance', 'ANALYTICS_INITIAL_BALANCE', "account balance before the first trade"),
+        Option('--compact', 'TICK_COMPACT', "'float32' or 'int' to reduce tick memory"),
+    ], "tick-level equity curve and risk metrics of the backtest"),
+}
+
+
+def build_parser():
+    """
+    Monta o parser com um subcomando por entrada de COMMANDS. As opções não têm
+    valor padrão: o que não for informado continua vindo do .env.
+    """
+    parser = argparse.ArgumentParser(prog="main.py", description="Download, analyze and backtest MetaTrader 5 ticks.")
+    subparsers = parser.add_subparsers(dest="command", metavar="<command>")
+    for name, command in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=command.help, description=command.help)
+        for option in COMMON_OPTIONS + command.options:
+            help_text = f"{option.help} ({option.env})"
+            if option.const is None:
+                subparser.add_argument(option.flag, dest=option.env, metavar="VALUE", help=help_text)
+            else:
+                subparser.add_argument(option.flag, dest=option.env, action="store_const", const=option.const,
+                                       help=help_text)
+        subparser.add_argument("--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE",
+                               help="override any other .env variable (repeatable)")
+    return parser
+
+
+def apply_overrides(parser, args):
+    """
+    Grava as opções informadas em os.environ, por cima dos valores do .env
+    (load_dotenv não sobrescreve variáveis que já existem). Os processos de
+    trabalho herdam o ambiente, então também recebem os valores da linha de comando.
+    """
+    for override in args.overrides:
+        key, separator, value = override.partition("=")
+        if not separator or not key:
+            parser.error(f"--set expects KEY=VALUE, got '{override}'")
+        os.environ[key.strip()] = value
+
+    for option in COMMON_OPTIONS + COMMANDS[args.command].options:
+        value = getattr(args, option.env)
+        if value is not None:
+            os.environ[option.env] = value
+
+
+def import_command(name):
+    """
+    Importa os módulos de que o comando depende, sem executá-lo.
+
+    Returns:
+        list: Os módulos importados.
+    """
+    return [importlib.import_module(module) for module in COMMANDS[name].modules]
+
+
+def main():
+    """
+    Ponto de entrada principal do script.
+    Interpreta a linha de comando e executa o comando correspondente.
+    """
+    load_dotenv() # Garante que as variáveis de ambiente estão disponíveis
+
+    argv = sys.argv[1:]
+    if not argv:
+        print("Command not specified. Usage: python main.py <command> [options] (python main.py <command> --help)")
+        print(f"Available commands: {', '.join(COMMANDS)}")
+        return
+
+    # O nome do comando não diferencia maiúsculas de minúsculas
+    if argv[0].lower() in COMMANDS:
+        argv[0] = argv[0].lower()
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return
+    apply_overrides(parser, args)
+    command = args.command
+
+    try:
+        import_command(command)
+    except ModuleNotFoundError as e:
+        print(f"ERROR: Command '{command}' needs the '{e.name}' package, which is not installed.")
+        print("Install the dependencies with 'pip install -r requirements.txt'.")
+        return
+
+    # --metrics/--profile (ou METRICS=1/PROFILE=1 no .env) ativam a instrumentação das etapas
+    profile = os.getenv("PROFILE", "0") == "1"
+    if not (profile or os.getenv("METRICS", "0") == "1"):
+        run_command(command)
+        return
+
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    report_path = os.getenv("METRICS_REPORT") or os.path.join('data', f"metrics-{command}-{stamp}.json")
+    profile_path = os.path.join('data', f"profile-{command}-{stamp}.prof") if profile else None
+    with metrics.session(command, report_path, profile_path):
+        run_command(command)
+
+
+def run_command(command):
+    """
+    Executa o comando informado na linha de comando.
+    """
+    COMMANDS[command].handler()
 
-        print("\n--- Last 5 Trades ---")
-        print(results.tail())
-        
-    else:
-        print(f"Command '{command}' unknown.")
-        print("Available commands: download, analyze, resample, plot, backtest") # Atualizado
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,236 @@
+# metrics.py
+
+"""
+Instrumentação das etapas do pipeline: tempo e pico de memória por etapa,
+contadores e distribuições (ex: ticks varridos por operação).
+
+Desativada por padrão. Com ela desativada, stage() devolve um contexto vazio
+já pronto e count()/observe() retornam na primeira linha, então as chamadas
+espalhadas pelos módulos praticamente não custam nada.
+
+Ative com `python main.py <comando> --metrics` (ou METRICS=1 no .env); com
+--profile (ou PROFILE=1) também é gravado um dump do cProfile, que pode ser
+aberto no snakeviz ou convertido em flamegraph (flameprof, gprof2dot).
+
+As medidas são do processo atual: etapas que rodam em processos do pool
+(optimize, portfolio, walkforward) não entram no relatório.
+"""
+
+import cProfile
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+_NULL_STAGE = nullcontext()
+
+_state = {'enabled': False}
+_stages = {}
+_counters = {}
+_distributions = {}
+_stack = []
+
+
+def enabled():
+    return _state['enabled']
+
+
+def enable():
+    """
+    Ativa a coleta e zera as medidas anteriores.
+    """
+    _stages.clear()
+    _counters.clear()
+    _distributions.clear()
+    _stack.clear()
+    _state['enabled'] = True
+
+
+def disable():
+    _state['enabled'] = False
+
+
+def _read_status():
+    # VmRSS (atual) e VmHWM (pico) do processo em MB; só existe no Linux
+    values = {}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(('VmRSS:', 'VmHWM:')):
+                    values[line[:5]] = int(line.split()[1]) / 2 ** 10
+    except OSError:
+        pass
+    return values.get('VmRSS'), values.get('VmHWM')
+
+
+def _memory():
+    """
+    Returns:
+        tuple: (RSS atual em MB ou None, pico de RSS em MB ou None).
+    """
+    rss, peak = _read_status()
+    if peak is None:
+        try:
+            import resource
+        except ImportError:  # Windows
+            return None, None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss vem em KB no Linux e em bytes no macOS
+        peak = peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+    return rss, peak
+
+
+def _reset_peak():
+    # Escrever 5 em clear_refs zera o VmHWM (Linux >= 4.0), permitindo medir o pico de cada etapa
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+@contextmanager
+def _timed_stage(name):
+    _, peak_before = _memory()
+    # O pico já atingido pertence às etapas abertas, antes de ser zerado
+    for frame in _stack:
+        frame['peak'] = max(frame['peak'], peak_before or 0)
+    per_stage_peak = _reset_peak()
+
+    rss_start, _ = _memory()
+    frame = {'peak': 0}
+    _stack.append(frame)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        _stack.pop()
+        rss_end, peak = _memory()
+        frame['peak'] = max(frame['peak'], peak or 0)
+        for parent in _stack:
+            parent['peak'] = max(parent['peak'], frame['peak'])
+
+        entry = _stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'peak_rss_mb': None, 'rss_delta_mb': 0.0})
+        entry['calls'] += 1
+        entry['seconds'] += seconds
+        if peak is not None:
+            entry['peak_rss_mb'] = max(entry['peak_rss_mb'] or 0, frame['peak'])
+            entry['peak_is_per_stage'] = per_stage_peak
+        if rss_start is not None and rss_end is not None:
+            entry['rss_delta_mb'] += rss_end - rss_start
+
+
+def stage(name):
+    """
+    Mede o tempo e o pico de memória de uma etapa (use com `with`).
+
+    Chamadas repetidas da mesma etapa são somadas. Quando o sistema não permite
+    zerar o pico por etapa, 'peak_rss_mb' é o pico do processo até o fim dela.
+    """
+    if not _state['enabled']:
+        return _NULL_STAGE
+    return _timed_stage(name)
+
+
+def _timed_items(iterable, name, counter):
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            item = next(iterator, None)
+        if item is None:
+            return
+        if counter:
+            count(counter, len(item))
+        yield item
+
+
+def timed_iter(iterable, name, counter=None):
+    """
+    Mede como etapa `name` o tempo gasto produzindo cada item de um iterador
+    preguiçoso (ex: lotes lidos do Parquet) e soma len(item) ao contador `counter`.
+
+    Desativada, devolve o próprio iterável.
+    """
+    if not _state['enabled']:
+        return iterable
+    return _timed_items(iterable, name, counter)
+
+
+def count(name, value=1):
+    """
+    Soma `value` ao contador `name`.
+    """
+    if not _state['enabled']:
+        return
+    _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name, value):
+    """
+    Registra uma amostra na distribuição `name` (quantidade, soma, mínimo e máximo).
+    """
+    if not _state['enabled']:
+        return
+    entry = _distributions.get(name)
+    if entry is None:
+        _distributions[name] = {'count': 1, 'sum': value, 'min': value, 'max': value}
+    else:
+        entry['count'] += 1
+        entry['sum'] += value
+        entry['min'] = min(entry['min'], value)
+        entry['max'] = max(entry['max'], value)
+
+
+def report():
+    """
+    Returns:
+        dict: Etapas, contadores e distribuições coletados, prontos para JSON.
+    """
+    distributions = {
+        name: {**entry, 'mean': entry['sum'] / entry['count']} for name, entry in _distributions.items()
+    }
+    _, peak = _memory()
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'process_peak_rss_mb': peak,
+        'stages': {name: dict(entry) for name, entry in _stages.items()},
+        'counters': dict(_counters),
+        'distributions': distributions,
+    }
+
+
+@contextmanager
+def session(command, report_path=None, profile_path=None):
+    """
+    Coleta as medidas durante o bloco e grava o relatório JSON (e o dump do
+    cProfile, se `profile_path` for informado) ao final, mesmo em caso de erro.
+    """
+    enable()
+    profiler = cProfile.Profile() if profile_path else None
+    if profiler is not None:
+        profiler.enable()
+    started = time.perf_counter()
+    try:
+        with stage('total'):
+            yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        disable()
+
+        data = {'command': command, 'seconds': time.perf_counter() - started, **report()}
+        if report_path:
+            os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+            with open(report_path, 'w') as f:
+                json.dump(data, f, indent=2, default=float)
+            print(f"\nMetrics report saved to {report_path}")
+        if profiler is not None:
+            os.makedirs(os.path.dirname(profile_path) or '.', exist_ok=True)
+            profiler.dump_stats(profile_path)
+            print(f"cProfile dump saved to {profile_path}")
@@ -1,17 +1,34 @@
 # mt5_connector.py
 
-import MetaTrader5 as mt5
+import importlib
 import os
 from dotenv import load_dotenv
 
+_mt5 = None
+
+def get_mt5():
+    """
+    Retorna o módulo do MetaTrader 5, importado só no primeiro uso.
+
+    Com MT5_BACKEND=fake no .env, usa o substituto local fake_mt5, que gera
+    ticks sintéticos e funciona sem o terminal (inclusive no Linux).
+    """
+    global _mt5
+    if _mt5 is None:
+        load_dotenv()
+        backend = os.getenv("MT5_BACKEND", "MetaTrader5")
+        _mt5 = importlib.import_module("fake_mt5" if backend.lower() == "fake" else backend)
+    return _mt5
+
 def connect():
     """
     Carrega as variáveis de ambiente e inicializa a conexão com o MetaTrader 5.
     """
     # Carrega as variáveis do arquivo .env
     load_dotenv()
+    mt5 = get_mt5()
     
-    login = int(os.getenv("MT5_LOGIN"))
+    login = int(os.getenv("MT5_LOGIN", 0))
     password = os.getenv("MT5_PASSWORD")
     server = os.getenv("MT5_SERVER")
     
@@ -36,4 +53,4 @@ def disconnect():
     Encerra a conexão com o MetaTrader 5.
     """
     print("Encerrando a conexão com o MetaTrader 5.")
-    mt5.shutdown()
\ No newline at end of file
+    get_mt5().shutdown()
\ No newline at end of file
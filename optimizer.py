@@ -0,0 +1,215 @@
+# optimizer.py
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+import backtester
+import strategies
+
+# Parâmetros que podem entrar na grade, com o nome usado no .env
+STRATEGY_PARAMS = {
+    'FAST_SMA_PERIOD': 'fast_period',
+    'SLOW_SMA_PERIOD': 'slow_period',
+    'TREND_FILTER_PERIOD': 'trend_filter_period',
+}
+BACKTEST_PARAMS = {
+    'STOP_LOSS_PIPS': 'stop_loss_pips',
+    'TAKE_PROFIT_PIPS': 'take_profit_pips',
+}
+
+# Estado de cada processo do pool, preenchido pelo initializer
+_worker = {}
+
+
+def parse_grid(spec):
+    """
+    Converte a especificação textual da grade em um dicionário de listas.
+
+    Formato: "FAST_SMA_PERIOD=10,20,30;SLOW_SMA_PERIOD=50:200:50", onde
+    "início:fim:passo" é um intervalo inclusivo.
+
+    Returns:
+        dict: Nome do parâmetro -> lista de valores inteiros.
+    """
+    grid = {}
+    for item in spec.split(';'):
+        if not item.strip():
+            continue
+        name, _, values = item.partition('=')
+        name = name.strip().upper()
+        if name not in STRATEGY_PARAMS and name not in BACKTEST_PARAMS:
+            raise ValueError(f"Unknown optimization parameter '{name}'.")
+
+        if ':' in values:
+            start, stop, step = (int(v) for v in values.split(':'))
+            grid[name] = list(range(start, stop + 1, step))
+        else:
+            grid[name] = [int(v) for v in values.split(',') if v.strip()]
+    return grid
+
+
+def check_metric(rank_by):
+    """
+    Garante que `rank_by` é uma das métricas de backtester.summarize_results.
+
+    Raises:
+        ValueError: Se a métrica não existir (a mensagem lista as válidas).
+    """
+    metrics = list(backtester.summarize_results(None))
+    if rank_by not in metrics:
+        raise ValueError(f"Unknown metric '{rank_by}'. Valid metrics: {', '.join(metrics)}.")
+
+
+def build_combinations(grid):
+    """
+    Gera todas as combinações da grade, descartando as que não fazem sentido
+    (média rápida maior ou igual à lenta).
+    """
+    names = list(grid)
+    combinations = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(zip(names, values))
+        fast = params.get('FAST_SMA_PERIOD', int(os.getenv("FAST_SMA_PERIOD", 20)))
+        slow = params.get('SLOW_SMA_PERIOD', int(os.getenv("SLOW_SMA_PERIOD", 50)))
+        if fast >= slow:
+            continue
+        combinations.append(params)
+    return combinations
+
+
+def share_arrays(arrays):
+    """
+    Copia arrays numpy para blocos de memória compartilhada.
+
+    Returns:
+        tuple: (lista de SharedMemory, especificação para reconectar nos workers).
+    """
+    blocks = []
+    spec = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+        blocks.append(block)
+        spec[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, spec
+
+
+def attach_arrays(spec):
+    """
+    Reconecta aos blocos criados por share_arrays, sem copiar os dados.
+
+    Returns:
+        tuple: (lista de SharedMemory a manter viva, dict nome -> array).
+    """
+    blocks = []
+    arrays = {}
+    # Os workers do pool usam o mesmo resource_tracker do processo principal,
+    # então o bloco continua sendo removido uma única vez, por release_arrays
+    for name, (block_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return blocks, arrays
+
+
+def release_arrays(blocks):
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+
+# Colunas das velas levadas aos workers; as do ask (quando existem) permitem
+# resolver as saídas pelas velas em backtester.window_extremes
+OHLC_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+ASK_COLUMNS = ['ask_high', 'ask_low']
+
+
+def share_market_data(df_ohlc, df_ticks):
+    """
+    Coloca os ticks (já ordenados) e as velas em memória compartilhada.
+    """
+    ticks = backtester.prepare_ticks(df_ticks)
+    arrays = {
+        'tick_time': ticks.time, 'tick_bid': ticks.bid, 'tick_ask': ticks.ask,
+        'ohlc_time': backtester._to_ns(df_ohlc.index),
+    }
+    for column in OHLC_COLUMNS + [c for c in ASK_COLUMNS if c in df_ohlc.columns]:
+        arrays[f'ohlc_{column}'] = df_ohlc[column].to_numpy()
+    return share_arrays(arrays)
+
+
+def market_data_from_arrays(arrays):
+    """
+    Monta o TickArrays e o DataFrame de velas sobre os arrays compartilhados.
+    """
+    ticks = backtester.TickArrays(arrays['tick_time'], arrays['tick_bid'], arrays['tick_ask'])
+    index = pd.DatetimeIndex(arrays['ohlc_time'].view('datetime64[ns]'), name='time')
+    columns = OHLC_COLUMNS + [c for c in ASK_COLUMNS if f'ohlc_{c}' in arrays]
+    df_ohlc = pd.DataFrame({column: arrays[f'ohlc_{column}'] for column in columns}, index=index, copy=False)
+    return df_ohlc, ticks
+
+
+def _init_worker(spec):
+    blocks, arrays = attach_arrays(spec)
+    _worker['blocks'] = blocks
+    _worker['ohlc'], _worker['ticks'] = market_data_from_arrays(arrays)
+
+
+def _run_combination(params):
+    strategy_kwargs = {STRATEGY_PARAMS[k]: v for k, v in params.items() if k in STRATEGY_PARAMS}
+    backtest_kwargs = {BACKTEST_PARAMS[k]: v for k, v in params.items() if k in BACKTEST_PARAMS}
+
+    strategy_func = partial(strategies.moving_average_crossover, verbose=False, **strategy_kwargs)
+    results = backtester.run_backtest(_worker['ohlc'], _worker['ticks'], strategy_func,
+                                      verbose=False, **backtest_kwargs)
+    return {**params, **backtester.summarize_results(results)}
+
+
+def optimize(df_ohlc, df_ticks, grid, max_workers=None, rank_by='pnl_usd'):
+    """
+    Executa run_backtest para cada combinação da grade em um pool de processos.
+
+    Os ticks e as velas são publicados uma única vez em memória compartilhada;
+    cada worker apenas se conecta a eles, sem receber cópias serializadas.
+
+    Args:
+        df_ohlc (pd.DataFrame): Velas OHLC.
+        df_ticks (pd.DataFrame): Ticks com 'time', 'bid' e 'ask'.
+        grid (dict): Nome do parâmetro (.env) -> lista de valores.
+        max_workers (int | None): Número de processos (padrão: todos os núcleos).
+        rank_by (str): Métrica usada para ordenar o resultado (maior é melhor).
+
+    Returns:
+        pd.DataFrame: Uma linha por combinação, ordenada da melhor para a pior.
+    """
+    check_metric(rank_by)
+    combinations = build_combinations(grid)
+    if not combinations:
+        return pd.DataFrame()
+
+    max_workers = max_workers or os.cpu_count() or 1
+    # Pedaços grandes o suficiente para diluir a comunicação, pequenos o suficiente para balancear a carga
+    chunksize = max(1, len(combinations) // (max_workers * 4))
+
+    blocks, spec = share_market_data(df_ohlc, df_ticks)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(spec,)) as executor:
+            rows = list(tqdm(executor.map(_run_combination, combinations, chunksize=chunksize),
+                             total=len(combinations), desc="Optimization Progress"))
+    finally:
+        release_arrays(blocks)
+
+    results = pd.DataFrame(rows)
+    ascending = rank_by == 'max_drawdown_usd'
+    results = results.sort_values(rank_by, ascending=ascending, kind='stable').reset_index(drop=True)
+    results.index.name = 'rank'
+    results.index += 1
+    return results
@@ -0,0 +1,351 @@
+# pipeline.py
+
+"""
+Pipeline ticks -> velas OHLC -> indicadores -> resultado do backtest, com cada
+artefato guardado sob uma chave que é o hash das suas entradas e parâmetros.
+
+Rodar de novo com as mesmas entradas reaproveita os artefatos; mudar um
+parâmetro ou baixar mais ticks refaz só as etapas que dependem disso, como
+no make. Os ticks não são copiados: a chave deles vem do caminho, tamanho e
+data de modificação de cada partição do período.
+
+Os artefatos ficam em data/artifacts/<tipo>/<chave>.* e podem ser removidos
+por tamanho total ou idade (ARTIFACT_CACHE_MAX_MB, ARTIFACT_CACHE_MAX_AGE_DAYS).
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+import backtester
+import indicators
+import optimizer
+import resampler
+import strategies
+import tick_store
+
+# Mudanças no formato dos artefatos invalidam as chaves antigas
+PIPELINE_VERSION = 3
+DEFAULT_ARTIFACT_DIR = os.path.join('data', 'artifacts')
+
+# Configurações do .env que mudam o resultado do backtest: (conversão, padrão), os mesmos de strategies e backtester
+RESULT_SETTINGS = {
+    'FAST_SMA_PERIOD': (int, 20),
+    'SLOW_SMA_PERIOD': (int, 50),
+    'TREND_FILTER_PERIOD': (int, 200),
+    'STOP_LOSS_PIPS': (int, 200),
+    'TAKE_PROFIT_PIPS': (int, 400),
+    'TRADE_VOLUME_LOTS': (float, 0.1),
+}
+
+
+def artifact_key(kind, *inputs):
+    """
+    Returns:
+        str: Hash hexadecimal do tipo do artefato, da versão do pipeline e das entradas.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([PIPELINE_VERSION, kind, *inputs], sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def result_settings():
+    """
+    Returns:
+        dict: Os valores efetivos de RESULT_SETTINGS (lidos do .env, com os padrões aplicados).
+    """
+    return {name: parse(os.getenv(name) or default) for name, (parse, default) in RESULT_SETTINGS.items()}
+
+
+def _tick_files(asset, start_date, end_date, data_dir='data'):
+    files = []
+    for year, month, _, _ in tick_store.month_periods(start_date, end_date):
+        path = tick_store.partition_path(asset, year, month, data_dir)
+        if os.path.exists(path):
+            files.append(path)
+    if not files:
+        legacy_path = os.path.join(data_dir, f"{asset}-{start_date}-{end_date}.parquet")
+        if os.path.exists(legacy_path):
+            files.append(legacy_path)
+    return files
+
+
+def ticks_key(asset, start_date, end_date, data_dir='data'):
+    """
+    Chave dos ticks do período, a partir dos metadados dos arquivos (sem lê-los).
+
+    Returns:
+        str | None: A chave, ou None se não houver ticks do ativo.
+    """
+    files = _tick_files(asset, start_date, end_date, data_dir)
+    if not files:
+        return None
+
+    stats = [(os.path.relpath(path, data_dir), os.stat(path).st_size, os.stat(path).st_mtime_ns) for path in files]
+    return artifact_key('ticks', asset, str(start_date), str(end_date), stats)
+
+
+class ArtifactStore:
+    """
+    Diretório de artefatos endereçados por conteúdo.
+
+    Cada artefato é gravado em um arquivo temporário e renomeado; o manifesto
+    JSON ({chave}.json) é gravado por último, então um artefato só existe para
+    o pipeline depois de completo. O horário de modificação do manifesto marca
+    o último uso, usado na remoção por idade e por tamanho (LRU).
+    """
+
+    def __init__(self, root=DEFAULT_ARTIFACT_DIR):
+        self.root = root
+
+    def kind_dir(self, kind):
+        path = os.path.join(self.root, kind)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def path(self, kind, key, extension='parquet'):
+        return os.path.join(self.kind_dir(kind), f'{key}.{extension}')
+
+    def manifest(self, kind, key):
+        """
+        Returns:
+            dict | None: O manifesto do artefato (marcando o uso), ou None se ele não existir.
+        """
+        path = self.path(kind, key, 'json')
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)
+        return manifest
+
+    def commit(self, kind, key, manifest):
+        path = self.path(kind, key, 'json')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'kind': kind, 'key': key, 'created': time.time(), **manifest}, f, indent=2, default=str)
+        os.replace(tmp_path, path)
+
+    def evict(self, max_bytes=None, max_age_days=None):
+        """
+        Remove os artefatos não usados há mais de `max_age_days` dias e, depois,
+        os usados há mais tempo até o total caber em `max_bytes`.
+
+        Returns:
+            tuple: (artefatos removidos, bytes liberados).
+        """
+        if not os.path.isdir(self.root):
+            return 0, 0
+
+        # Os arquivos de um artefato compartilham o nome-base (a chave)
+        groups = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                stat = os.stat(path)
+                group = groups.setdefault(os.path.join(dirpath, name.split('.')[0]), [[], 0, 0])
+                group[0].append(path)
+                group[1] += stat.st_size
+                group[2] = max(group[2], stat.st_mtime)
+
+        ordered = sorted(groups.values(), key=lambda group: group[2])
+        total = sum(group[1] for group in ordered)
+        now = time.time()
+        removed = freed = 0
+
+        for paths, size, last_used in ordered:
+            too_old = max_age_days is not None and now - last_used > max_age_days * 86_400
+            too_big = max_bytes is not None and total > max_bytes
+            if not (too_old or too_big):
+                continue
+            for path in sorted(paths, key=lambda path: path.endswith('.json'), reverse=True):
+                os.remove(path)
+            total -= size
+            removed += 1
+            freed += size
+
+        return removed, freed
+
+
+def ohlc_file(asset, start_date, end_date, timeframe_mt5, data_dir='data'):
+    """
+    Returns:
+        str: Caminho do arquivo de velas gravado pelo comando resample.
+    """
+    return os.path.join(data_dir, f"{asset}-{start_date}-{end_date}-{timeframe_mt5}.parquet")
+
+
+def ohlc_source_path(path):
+    """
+    Returns:
+        str: Caminho do arquivo, ao lado das velas do resample, com a assinatura dos ticks de origem.
+    """
+    return path + '.source.json'
+
+
+def ohlc_source_signature(asset, start_date, end_date, timeframe_mt5, data_dir='data'):
+    """
+    Assinatura das entradas de um arquivo do resample: as partições de ticks do
+    período (caminho, tamanho e data de modificação), o período e o timeframe.
+
+    Deve ser calculada antes de ler os ticks, para que um download durante o
+    resample deixe o arquivo desatualizado em vez de marcá-lo como atual.
+
+    Returns:
+        str | None: A assinatura, ou None se não houver ticks do ativo.
+    """
+    source_key = ticks_key(asset, start_date, end_date, data_dir)
+    return None if source_key is None else artifact_key('ohlc-file', source_key, timeframe_mt5)
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def write_ohlc_source(path, signature):
+    """
+    Grava o arquivo de assinatura das velas em `path` (já gravadas), ligando-as
+    aos ticks de origem e à própria versão do arquivo de velas.
+    """
+    sidecar = ohlc_source_path(path)
+    tmp_path = sidecar + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'source': signature, 'file': _file_signature(path)}, f)
+    os.replace(tmp_path, sidecar)
+
+
+def _current_ohlc_file(asset, start_date, end_date, timeframe_mt5, data_dir):
+    """
+    Returns:
+        str | None: O arquivo do resample, se ele veio dos ticks atuais do período
+            (pela assinatura gravada ao lado dele) e não foi alterado depois.
+    """
+    path = ohlc_file(asset, start_date, end_date, timeframe_mt5, data_dir)
+    try:
+        with open(ohlc_source_path(path)) as f:
+            source = json.load(f)
+        current = source['file'] == _file_signature(path)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    signature = ohlc_source_signature(asset, start_date, end_date, timeframe_mt5, data_dir)
+    return path if current and signature is not None and source['source'] == signature else None
+
+
+def _ensure_ohlc(store, asset, start_date, end_date, timeframe_mt5, source_key, data_dir):
+    # As velas do comando resample são usadas como estão, se vieram dos ticks atuais
+    path = _current_ohlc_file(asset, start_date, end_date, timeframe_mt5, data_dir)
+    if path is not None:
+        stat = os.stat(path)
+        key = artifact_key('ohlc-file', source_key, timeframe_mt5, os.path.relpath(path, data_dir),
+                           stat.st_size, stat.st_mtime_ns)
+        return key, path, 'reused'
+
+    key = artifact_key('ohlc', source_key, asset, str(start_date), str(end_date), timeframe_mt5)
+    path = store.path('ohlc', key)
+    if store.manifest('ohlc', key) is not None:
+        return key, path, 'cached'
+
+    tick_batches = tick_store.scan_ticks(asset, start_date, end_date, data_dir=data_dir,
+                                         columns=tick_store.PRICE_COLUMNS)
+    if tick_batches is None:
+        return key, None, 'missing'
+
+    tmp_path = path + '.tmp'
+    candles = resampler.resample_parquet_to_ohlc(tick_batches, tmp_path, resampler.TIMEFRAMES[timeframe_mt5])
+    if candles == 0:
+        return key, None, 'missing'
+    os.replace(tmp_path, path)
+
+    store.commit('ohlc', key, {'inputs': {'ticks': source_key, 'asset': asset, 'start_date': start_date,
+                                          'end_date': end_date, 'timeframe': timeframe_mt5},
+                               'candles': candles})
+    return key, path, 'built'
+
+
+def run_backtest_pipeline(asset, start_date, end_date, timeframe_mt5, data_dir='data', artifact_dir=None,
+                          compact=None, verbose=True):
+    """
+    Executa o backtest reaproveitando tudo o que não mudou desde a última execução.
+
+    Etapas: velas OHLC (o arquivo do comando resample, se a assinatura ao lado dele
+    for a dos ticks atuais; senão um artefato com chave ticks + timeframe), indicadores (cache em disco
+    de indicators.IndicatorCache, chaveado pelo conteúdo das velas) e resultado
+    (chave: velas + ticks + parâmetros da estratégia e de risco do .env).
+
+    Returns:
+        tuple: (operações ou None, dicionário etapa -> 'cached' | 'built' | 'reused' | 'missing').
+    """
+    store = ArtifactStore(artifact_dir or DEFAULT_ARTIFACT_DIR)
+    steps = {}
+
+    source_key = ticks_key(asset, start_date, end_date, data_dir)
+    steps['ticks'] = 'missing' if source_key is None else 'cached'
+    if source_key is None:
+        return None, steps
+
+    ohlc_key, ohlc_path, steps['ohlc'] = _ensure_ohlc(store, asset, start_date, end_date, timeframe_mt5,
+                                                      source_key, data_dir)
+    if ohlc_path is None:
+        return None, steps
+
+    settings = result_settings()
+    results_key = artifact_key('backtest', ohlc_key, source_key, settings, compact)
+    results_path = store.path('backtest', results_key)
+    manifest = store.manifest('backtest', results_key)
+    if manifest is not None:
+        steps['indicators'] = steps['backtest'] = 'cached'
+        return (pd.read_parquet(results_path) if manifest['trades'] else None), steps
+
+    df_ohlc = pd.read_parquet(ohlc_path)
+    df_ticks = tick_store.load_ticks(asset, start_date, end_date, data_dir=data_dir,
+                                     columns=tick_store.PRICE_COLUMNS, compact=compact, as_arrow=True)
+    if df_ticks is None:
+        steps['ticks'] = 'missing'
+        return None, steps
+
+    # INDICATOR_CACHE_DIR continua valendo; sem ele, os indicadores ficam junto dos demais artefatos
+    cache = indicators.IndicatorCache(
+        max_entries=int(os.getenv("INDICATOR_CACHE_SIZE", 128)),
+        disk_dir=os.getenv("INDICATOR_CACHE_DIR") or store.kind_dir('indicators'),
+    )
+    # Os mesmos valores da chave são passados adiante, para a chave e o resultado não divergirem
+    strategy_kwargs = {param: settings[name] for name, param in optimizer.STRATEGY_PARAMS.items()}
+    backtest_kwargs = {param: settings[name] for name, param in optimizer.BACKTEST_PARAMS.items()}
+    results = backtester.run_backtest(
+        df_ohlc, df_ticks,
+        lambda df: strategies.moving_average_crossover(df, verbose=verbose, cache=cache, **strategy_kwargs),
+        trade_volume_lots=settings['TRADE_VOLUME_LOTS'], verbose=verbose, **backtest_kwargs
+    )
+    steps['indicators'] = 'cached' if cache.misses == 0 else 'built'
+    steps['backtest'] = 'built'
+
+    if results is not None:
+        tmp_path = results_path + '.tmp'
+        results.to_parquet(tmp_path)
+        os.replace(tmp_path, results_path)
+    store.commit('backtest', results_key, {'inputs': {'ohlc': ohlc_key, 'ticks': source_key, 'settings': settings,
+                                                      'compact': compact},
+                                           'trades': 0 if results is None else len(results)})
+    return results, steps
+
+
+def evict_from_env(artifact_dir=None):
+    """
+    Aplica os limites ARTIFACT_CACHE_MAX_MB e ARTIFACT_CACHE_MAX_AGE_DAYS do .env, se definidos.
+
+    Returns:
+        tuple: (artefatos removidos, bytes liberados).
+    """
+    max_mb = os.getenv("ARTIFACT_CACHE_MAX_MB")
+    max_age_days = os.getenv("ARTIFACT_CACHE_MAX_AGE_DAYS")
+    if not max_mb and not max_age_days:
+        return 0, 0
+    return ArtifactStore(artifact_dir or DEFAULT_ARTIFACT_DIR).evict(
+        max_bytes=float(max_mb) * 2 ** 20 if max_mb else None,
+        max_age_days=float(max_age_days) if max_age_days else None,
+    )
@@ -0,0 +1,116 @@
+# portfolio.py
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import backtester
+import resampler
+import strategies
+import tick_store
+
+
+def _data_size(asset, data_dir='data'):
+    # Tamanho em disco dos ticks do ativo, usado para começar pelos ativos mais pesados
+    root = tick_store.asset_dir(asset, data_dir)
+    total = 0
+    for dirpath, _, filenames in os.walk(root):
+        total += sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+    return total
+
+
+def run_asset_backtest(asset, start_date, end_date, timeframe_mt5, data_dir='data'):
+    """
+    Executa o backtest de um único ativo (roda dentro de um processo do pool).
+
+    Usa o arquivo OHLC gerado pelo comando resample quando ele existe; caso
+    contrário, gera as velas em streaming a partir dos ticks.
+
+    Returns:
+        tuple: (ativo, DataFrame de operações com a coluna 'asset' ou None, mensagem de erro ou None).
+    """
+    ohlc_filepath = os.path.join(data_dir, f"{asset}-{start_date}-{end_date}-{timeframe_mt5}.parquet")
+    if os.path.exists(ohlc_filepath):
+        df_ohlc = pd.read_parquet(ohlc_filepath)
+    else:
+        tick_batches = tick_store.scan_ticks(asset, start_date, end_date, data_dir=data_dir,
+                                             columns=tick_store.PRICE_COLUMNS)
+        if tick_batches is None:
+            return asset, None, "no ticks found"
+        frames = list(resampler.resample_batches(tick_batches, resampler.TIMEFRAMES[timeframe_mt5]))
+        if not frames:
+            return asset, None, "no ticks found"
+        df_ohlc = pd.concat(frames)
+
+    df_ticks = tick_store.load_ticks(asset, start_date, end_date, data_dir=data_dir, columns=tick_store.PRICE_COLUMNS,
+                                     compact=os.getenv("TICK_COMPACT") or None, as_arrow=True)
+    if df_ticks is None:
+        return asset, None, "no ticks found"
+
+    results = backtester.run_backtest(df_ohlc, df_ticks,
+                                      lambda df: strategies.moving_average_crossover(df, verbose=False),
+                                      verbose=False)
+    if results is not None:
+        results.insert(0, 'asset', asset)
+    return asset, results, None
+
+
+def merge_trades(results_by_asset):
+    """
+    Junta as operações de todos os ativos em ordem cronológica de saída e
+    calcula a curva de PnL acumulado da carteira.
+
+    Returns:
+        pd.DataFrame: Operações de todos os ativos com a coluna 'equity_usd'.
+    """
+    frames = [results for results in results_by_asset.values() if results is not None]
+    if not frames:
+        return None
+
+    trades = pd.concat(frames, ignore_index=True)
+    trades = trades.sort_values(['exit_time', 'entry_time', 'asset'], kind='stable').reset_index(drop=True)
+    trades['equity_usd'] = trades['pnl_usd'].cumsum()
+    return trades
+
+
+def run_portfolio_backtest(assets, start_date, end_date, timeframe_mt5, max_workers=None, data_dir='data'):
+    """
+    Executa o backtest de cada ativo em um processo separado e combina as
+    operações em um único resultado de carteira.
+
+    Os ativos com mais dados são enviados primeiro, para que o tempo total
+    fique próximo ao do ativo mais lento e não à soma de todos.
+
+    Returns:
+        tuple: (operações combinadas ou None, resumo por ativo e da carteira, erros por ativo).
+    """
+    max_workers = max_workers or min(len(assets), os.cpu_count() or 1)
+    ordered = sorted(assets, key=lambda asset: _data_size(asset, data_dir), reverse=True)
+
+    results_by_asset = {}
+    errors = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run_asset_backtest, asset, start_date, end_date, timeframe_mt5, data_dir): asset
+                   for asset in ordered}
+        for future in as_completed(futures):
+            # Uma falha do processo (ou do pool) perde só o ativo dele, não os demais
+            try:
+                asset, results, error = future.result()
+            except Exception as e:
+                asset, results, error = futures[future], None, f"{type(e).__name__}: {e}"
+            results_by_asset[asset] = results
+            if error:
+                errors[asset] = error
+                print(f"  -> {asset}: ERROR: {error}")
+            else:
+                print(f"  -> {asset}: {0 if results is None else len(results)} trades")
+
+    trades = merge_trades(results_by_asset)
+
+    summary = pd.DataFrame(
+        {asset: backtester.summarize_results(results_by_asset.get(asset)) for asset in assets}
+    ).T
+    summary.loc['PORTFOLIO'] = backtester.summarize_results(trades)
+    summary.index.name = 'asset'
+    return trades, summary, errors
@@ -1,8 +1,26 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas.tseries.frequencies import to_offset
+
+import metrics
+
+_DAY_NS = 86_400_000_000_000
+
+# Mapeamento de timeframes do padrão MT5 para o padrão Pandas
+TIMEFRAMES = {
+    'M1': '1min', 'M5': '5min', 'M15': '15min', 'M30': '30min',
+    'H1': '1h', 'H4': '4h', 'D1': '1d', 'W1': '1w', 'MN': 'MS'
+}
 
 def resample_to_ohlc(df_ticks, timeframe='1H'):
     """
     Converte um DataFrame de ticks em um DataFrame de velas OHLC.
+
+    O OHLC é do bid; se houver a coluna 'ask', as velas também trazem a máxima
+    e a mínima do ask ('ask_high' e 'ask_low'), usadas pelo backtester para
+    descartar velas que não podem ter atingido o SL/TP de uma venda.
     
     Args:
         df_ticks (pd.DataFrame): O DataFrame contendo os dados de ticks.
@@ -14,6 +32,10 @@ def resample_to_ohlc(df_ticks, timeframe='1H'):
     # 1. Define a coluna 'time' como o índice, que é um requisito para a reamostragem (resample)
     df_indexed = df_ticks.set_index('time')
 
+    # Ticks sem bid não contam para nenhuma coluna, nem para as do ask (como em resample_batches)
+    if 'ask' in df_indexed.columns and df_indexed['bid'].isna().any():
+        df_indexed = df_indexed[df_indexed['bid'].notna()]
+
     # 2. Define a lógica de agregação de forma explícita
     # 'first': primeiro preço -> Open
     # 'max': preço máximo -> High
@@ -23,23 +45,327 @@ def resample_to_ohlc(df_ticks, timeframe='1H'):
     logic = {
         'bid': ['first', 'max', 'min', 'last', 'count']
     }
+    if 'ask' in df_indexed.columns:
+        logic['ask'] = ['max', 'min']
 
     # 3. Aplica a reamostragem e a agregação em uma única chamada (esta é a correção principal)
-    df_ohlc = df_indexed.resample(timeframe).agg(logic)
-
-    # 4. Remove o nível superior das colunas gerado pelo .agg()
-    df_ohlc.columns = df_ohlc.columns.droplevel(0)
-
-    # 5. Renomeia as colunas para o padrão OHLC
-    df_ohlc.rename(columns={
-        'first': 'open',
-        'max': 'high',
-        'min': 'low',
-        'last': 'close',
-        'count': 'volume'
-    }, inplace=True)
-    
-    # 6. Remove as linhas que não tiveram ticks (ex: fins de semana, feriados)
-    df_ohlc.dropna(inplace=True)
+    with metrics.stage('resample'):
+        df_ohlc = df_indexed.resample(timeframe).agg(logic)
+
+    # 4. Renomeia as colunas para o padrão OHLC (removendo o nível superior gerado pelo .agg())
+    names = {
+        ('bid', 'first'): 'open',
+        ('bid', 'max'): 'high',
+        ('bid', 'min'): 'low',
+        ('bid', 'last'): 'close',
+        ('bid', 'count'): 'volume',
+        ('ask', 'max'): 'ask_high',
+        ('ask', 'min'): 'ask_low',
+    }
+    df_ohlc.columns = [names[column] for column in df_ohlc.columns]
+
+    # 5. Remove as linhas que não tiveram ticks (ex: fins de semana, feriados)
+    df_ohlc.dropna(subset=['open'], inplace=True)
+
+    return df_ohlc
+
+
+def _fixed_step_ns(timeframe):
+    """
+    Duração fixa do timeframe em nanossegundos, ou None se ela variar (semanas ancoradas, meses).
+    """
+    offset = to_offset(timeframe)
+    # Dias são sempre de calendário (24h) no resample, mesmo nas versões em que Day não é um Tick
+    if isinstance(offset, pd.offsets.Day):
+        return offset.n * _DAY_NS
+    try:
+        return pd.Timedelta(offset).value
+    except (ValueError, TypeError):
+        return None
+
+
+def _bucket_labels(times_ns, timeframe, origin_ns):
+    """
+    Calcula o rótulo (início da vela) de cada instante, com os mesmos
+    limites usados por DataFrame.resample.
+
+    Args:
+        times_ns (np.ndarray): Instantes em nanossegundos (int64).
+        timeframe (str): Frequência do pandas (ex: '5min', '1h', '1w', 'MS').
+        origin_ns (int): Meia-noite do primeiro tick (origin='start_day' do pandas).
+    """
+    offset = to_offset(timeframe)
+
+    # Semanas: o pandas fecha o intervalo à direita e rotula pelo dia âncora (domingo no '1w')
+    if isinstance(offset, pd.offsets.Week) and offset.weekday is not None and offset.n == 1:
+        days = times_ns // _DAY_NS
+        day_of_week = (days + 3) % 7  # 1970-01-01 foi uma quinta-feira
+        return (days + (offset.weekday - day_of_week) % 7) * _DAY_NS
+
+    # Meses: rótulo no primeiro dia do mês
+    if isinstance(offset, pd.offsets.MonthBegin) and offset.n == 1:
+        return times_ns.view('datetime64[ns]').astype('datetime64[M]').astype('datetime64[ns]').view(np.int64)
+
+    step = _fixed_step_ns(timeframe)
+    if step is None:
+        raise ValueError(f"Timeframe '{timeframe}' is not supported by the streaming resampler.")
+
+    return origin_ns + (times_ns - origin_ns) // step * step
+
+
+def _aggregate(labels, open_, high, low, close, volume, *ask_extremes):
+    """
+    Agrega linhas consecutivas com o mesmo rótulo (first/max/min/last/sum).
+
+    Serve tanto para ticks (open=high=low=close=bid, volume=1) quanto para
+    reagregar velas já formadas. Os rótulos precisam estar ordenados. Se
+    vierem também (ask_high, ask_low), eles são agregados por max/min
+    ignorando NaN, como no pandas.
+    """
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    ends = np.r_[starts[1:], len(labels)] - 1
+
+    candles = (labels[starts], open_[starts], np.maximum.reduceat(high, starts),
+               np.minimum.reduceat(low, starts), close[ends], np.add.reduceat(volume, starts))
+    if ask_extremes:
+        ask_high, ask_low = ask_extremes
+        candles += (np.fmax.reduceat(ask_high, starts), np.fmin.reduceat(ask_low, starts))
+    return candles
+
+
+def _to_frame(candles):
+    labels, open_, high, low, close, volume = candles[:6]
+    index = pd.DatetimeIndex(labels.view('datetime64[ns]'), name='time')
+    df = pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}, index=index)
+    if len(candles) > 6:
+        df['ask_high'], df['ask_low'] = candles[6], candles[7]
+    return df
+
+
+def _concat_candles(left, right):
+    return tuple(np.concatenate([a, b]) for a, b in zip(left, right))
+
+
+def _tick_candles(batch):
+    """
+    Extrai de um lote de ticks as colunas no formato de velas de um único tick
+    (com ask_high=ask_low=ask se o lote tiver a coluna 'ask').
+    """
+    if isinstance(batch, pd.DataFrame):
+        columns = ['time', 'bid', 'ask'] if 'ask' in batch.columns else ['time', 'bid']
+        batch = pa.RecordBatch.from_pandas(batch[columns], preserve_index=False)
+
+    times = batch.column('time').cast(pa.timestamp('ns')).to_numpy().view(np.int64)
+    bid = batch.column('bid').to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+    has_ask = 'ask' in batch.schema.names
+    ask = batch.column('ask').to_numpy(zero_copy_only=False).astype(np.float64, copy=False) if has_ask else None
+
+    # Ticks sem preço não contam para nenhuma coluna (como 'first'/'count' do pandas)
+    valid = ~np.isnan(bid)
+    if not valid.all():
+        times, bid = times[valid], bid[valid]
+        ask = ask[valid] if has_ask else None
+
+    candles = (times, bid, bid, bid, bid, np.ones(len(bid), dtype=np.int64))
+    if has_ask:
+        candles += (ask, ask)
+    return candles
+
+
+class _CandleStream:
+    """
+    Agrega um fluxo de velas (ou ticks) em um timeframe maior, mantendo
+    pendente a última vela, que pode continuar no próximo pedaço do fluxo.
+    """
+
+    def __init__(self, timeframe):
+        self.timeframe = timeframe
+        self.origin_ns = None
+        self.pending = None
+
+    def push(self, candles):
+        """
+        Recebe velas em ordem cronológica e devolve as que já fecharam (ou None).
+        """
+        if len(candles[0]) == 0:
+            return None
+        if self.origin_ns is None:
+            self.origin_ns = candles[0][0] // _DAY_NS * _DAY_NS
+
+        labels = _bucket_labels(candles[0], self.timeframe, self.origin_ns)
+        rolled = _aggregate(labels, *candles[1:])
+        if self.pending is not None:
+            rolled = _aggregate(*_concat_candles(self.pending, rolled))
+
+        self.pending = tuple(column[-1:] for column in rolled)
+        if len(rolled[0]) == 1:
+            return None
+        return tuple(column[:-1] for column in rolled)
+
+    def flush(self):
+        """
+        Devolve a última vela pendente ao final do fluxo (ou None).
+        """
+        pending, self.pending = self.pending, None
+        return pending
+
+
+def resample_batches(batches, timeframe='1H'):
+    """
+    Converte um fluxo de lotes de ticks em velas OHLC, uma parte de cada vez.
+
+    A última vela de cada lote fica pendente e é combinada com o lote seguinte,
+    então o resultado concatenado é igual ao de resample_to_ohlc.
+
+    Args:
+        batches (Iterable[pa.RecordBatch | pd.DataFrame]): Ticks em ordem cronológica,
+            com as colunas 'time' e 'bid' (e 'ask', para gerar 'ask_high' e 'ask_low').
+        timeframe (str): O intervalo de tempo para as velas.
+
+    Yields:
+        pd.DataFrame: Velas OHLC já fechadas, indexadas por 'time'.
+    """
+    stream = _CandleStream(timeframe)
+
+    for batch in batches:
+        with metrics.stage('resample'):
+            closed = stream.push(_tick_candles(batch))
+        if closed is not None:
+            yield _to_frame(closed)
+
+    pending = stream.flush()
+    if pending is not None:
+        yield _to_frame(pending)
+
+
+class _OhlcWriter:
+    """
+    Grava velas em um arquivo Parquet de forma incremental, acumulando
+    pedaços pequenos até formar row groups de tamanho razoável.
+    """
+
+    def __init__(self, output_path, rows_per_group=100_000):
+        self.output_path = output_path
+        self.rows_per_group = rows_per_group
+        self.writer = None
+        self.buffer = []
+        self.buffered_rows = 0
+        self.total = 0
+
+    def write(self, df_ohlc):
+        self.buffer.append(df_ohlc)
+        self.buffered_rows += len(df_ohlc)
+        self.total += len(df_ohlc)
+        if self.buffered_rows >= self.rows_per_group:
+            self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        with metrics.stage('parquet_write'):
+            table = pa.Table.from_pandas(pd.concat(self.buffer))
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.output_path, table.schema)
+            self.writer.write_table(table)
+        self.buffer = []
+        self.buffered_rows = 0
+
+    def close(self):
+        self._flush()
+        if self.writer is not None:
+            self.writer.close()
+
+
+def resample_parquet_to_ohlc(batches, output_path, timeframe='1H'):
+    """
+    Versão em streaming de resample_to_ohlc: lê os ticks em lotes e grava as
+    velas no arquivo Parquet de saída à medida que elas fecham, com uso de
+    memória aproximadamente constante.
+
+    Args:
+        batches (Iterable[pa.RecordBatch]): Ticks em ordem cronológica (ex: tick_store.scan_ticks).
+        output_path (str): Caminho do arquivo Parquet de velas.
+        timeframe (str): O intervalo de tempo para as velas.
+
+    Returns:
+        int: Quantidade de velas gravadas.
+    """
+    writer = _OhlcWriter(output_path)
+
+    try:
+        for df_ohlc in resample_batches(batches, timeframe):
+            writer.write(df_ohlc)
+    finally:
+        writer.close()
+
+    return writer.total
+
+
+def _check_derivable(base_timeframe, timeframe):
+    # Um timeframe só pode ser derivado se cada vela da base couber inteira em uma vela dele;
+    # semanas e meses são formados por dias inteiros
+    base_step = _fixed_step_ns(base_timeframe)
+    step = _fixed_step_ns(timeframe) or _DAY_NS
+
+    if base_step is None or _DAY_NS % base_step != 0 or step % base_step != 0:
+        raise ValueError(f"Timeframe '{timeframe}' cannot be derived from base timeframe '{base_timeframe}'.")
+
+
+def resample_multi_timeframe(batches, output_paths, base_timeframe='1min'):
+    """
+    Gera vários timeframes em uma única passada sobre os ticks.
+
+    Os ticks são agregados uma vez nas velas base (M1 por padrão, ou segundos)
+    e os demais timeframes são derivados dessas velas, não dos ticks.
+
+    Args:
+        batches (Iterable[pa.RecordBatch]): Ticks em ordem cronológica (ex: tick_store.scan_ticks).
+        output_paths (dict): Timeframe do pandas -> caminho do arquivo Parquet de saída.
+        base_timeframe (str): Timeframe das velas base; precisa dividir todos os demais.
+
+    Returns:
+        dict: Timeframe do pandas -> quantidade de velas gravadas.
+    """
+    for timeframe in output_paths:
+        if timeframe != base_timeframe:
+            _check_derivable(base_timeframe, timeframe)
+
+    base_stream = _CandleStream(base_timeframe)
+    derived_streams = {tf: _CandleStream(tf) for tf in output_paths if tf != base_timeframe}
+    writers = {tf: _OhlcWriter(path) for tf, path in output_paths.items()}
+
+    def derive(base_candles):
+        frames = []
+        if base_timeframe in writers:
+            frames.append((base_timeframe, _to_frame(base_candles)))
+        for timeframe, stream in derived_streams.items():
+            closed = stream.push(base_candles)
+            if closed is not None:
+                frames.append((timeframe, _to_frame(closed)))
+        return frames
+
+    def write(frames):
+        for timeframe, df_ohlc in frames:
+            writers[timeframe].write(df_ohlc)
+
+    # A gravação fica fora da etapa 'resample' para não ser contada também em 'parquet_write'
+    try:
+        for batch in batches:
+            with metrics.stage('resample'):
+                closed = base_stream.push(_tick_candles(batch))
+                frames = derive(closed) if closed is not None else []
+            write(frames)
+
+        with metrics.stage('resample'):
+            pending = base_stream.flush()
+            frames = derive(pending) if pending is not None else []
+            for timeframe, stream in derived_streams.items():
+                pending = stream.flush()
+                if pending is not None:
+                    frames.append((timeframe, _to_frame(pending)))
+        write(frames)
+    finally:
+        for writer in writers.values():
+            writer.close()
 
-    return df_ohlc
\ No newline at end of file
+    return {tf: writer.total for tf, writer in writers.items()}
@@ -1,52 +1,70 @@
-import pandas_ta as ta
 import os
 
+import indicators
+import metrics
 
-def moving_average_crossover(df):
+
+def moving_average_crossover(df, fast_period=None, slow_period=None, trend_filter_period=None, verbose=True,
+                             cache=None):
     """
     Calcula os sinais para uma estratégia de cruzamento de médias móveis,
     mas agora com um filtro de tendência de longo prazo.
+
+    Os períodos não informados são lidos do ambiente (.env). As médias vêm do
+    cache de indicadores (indicators.get_default_cache() por padrão) e o df
+    recebido não é modificado: o resultado é um novo DataFrame.
     """
     # Lê os períodos do ambiente
-    fast_period = int(os.getenv("FAST_SMA_PERIOD", 20))
-    slow_period = int(os.getenv("SLOW_SMA_PERIOD", 50))
-    trend_filter_period = int(
-        os.getenv("TREND_FILTER_PERIOD", 200))  # <-- Novo
+    if fast_period is None:
+        fast_period = int(os.getenv("FAST_SMA_PERIOD", 20))
+    if slow_period is None:
+        slow_period = int(os.getenv("SLOW_SMA_PERIOD", 50))
+    if trend_filter_period is None:
+        trend_filter_period = int(
+            os.getenv("TREND_FILTER_PERIOD", 200))  # <-- Novo
+
+    if verbose:
+        print(
+            f"Calculating MA Crossover with Trend Filter (fast={fast_period}, slow={slow_period}, filter={trend_filter_period})...")
 
-    print(
-        f"Calculating MA Crossover with Trend Filter (fast={fast_period}, slow={slow_period}, filter={trend_filter_period})...")
+    if cache is None:
+        cache = indicators.get_default_cache()
 
-    # --- Calcula todas as três médias móveis ---
-    df.ta.sma(length=fast_period, append=True)
-    df.ta.sma(length=slow_period, append=True)
-    df.ta.sma(length=trend_filter_period, append=True)  # <-- Novo
+    # --- Obtém as três médias móveis do cache (calculadas só na primeira vez) ---
+    with metrics.stage('indicators'):
+        data_fingerprint = indicators.fingerprint(df)
+        df = df.assign(**{
+            f'SMA_{period}': cache.get(df, 'sma', data_fingerprint=data_fingerprint, length=period)
+            for period in (fast_period, slow_period, trend_filter_period)  # <-- Novo
+        })
 
     # Renomeia as colunas dinamicamente para facilitar a leitura
     fast_sma_col = f'SMA_{fast_period}'
     slow_sma_col = f'SMA_{slow_period}'
     trend_filter_col = f'SMA_{trend_filter_period}'  # <-- Novo
 
-    df.dropna(inplace=True)
-    df['signal'] = 0
+    with metrics.stage('signals'):
+        df.dropna(inplace=True)
+        df['signal'] = 0
 
-    # --- Lógica de Sinal com o Filtro ---
+        # --- Lógica de Sinal com o Filtro ---
 
-    # Condição de cruzamento de compra
-    buy_crossover = (df[fast_sma_col].shift(1) > df[slow_sma_col].shift(1)) & \
-                    (df[fast_sma_col].shift(2) < df[slow_sma_col].shift(2))
+        # Condição de cruzamento de compra
+        buy_crossover = (df[fast_sma_col].shift(1) > df[slow_sma_col].shift(1)) & \
+                        (df[fast_sma_col].shift(2) < df[slow_sma_col].shift(2))
 
-    # Condição de cruzamento de venda
-    sell_crossover = (df[fast_sma_col].shift(1) < df[slow_sma_col].shift(1)) & \
-                     (df[fast_sma_col].shift(2) > df[slow_sma_col].shift(2))
+        # Condição de cruzamento de venda
+        sell_crossover = (df[fast_sma_col].shift(1) < df[slow_sma_col].shift(1)) & \
+                         (df[fast_sma_col].shift(2) > df[slow_sma_col].shift(2))
 
-    # Condição de filtro de tendência
-    uptrend_filter = df['close'] > df[trend_filter_col]
-    downtrend_filter = df['close'] < df[trend_filter_col]
+        # Condição de filtro de tendência
+        uptrend_filter = df['close'] > df[trend_filter_col]
+        downtrend_filter = df['close'] < df[trend_filter_col]
 
-    # Um sinal de compra SÓ é válido se o cruzamento de compra ocorrer E a tendência for de alta
-    df.loc[buy_crossover & uptrend_filter, 'signal'] = 1
+        # Um sinal de compra SÓ é válido se o cruzamento de compra ocorrer E a tendência for de alta
+        df.loc[buy_crossover & uptrend_filter, 'signal'] = 1
 
-    # Um sinal de venda SÓ é válido se o cruzamento de venda ocorrer E a tendência for de baixa
-    df.loc[sell_crossover & downtrend_filter, 'signal'] = -1
+        # Um sinal de venda SÓ é válido se o cruzamento de venda ocorrer E a tendência for de baixa
+        df.loc[sell_crossover & downtrend_filter, 'signal'] = -1
 
     return df
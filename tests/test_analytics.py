@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import analytics
+import backtester
+import resampler
+
+INITIAL_BALANCE = 10_000.0
+LOTS = 0.1
+
+
+def _ticks(rows=60_000, seed=0):
+    # Alguns dias de ticks, com preços ausentes
+    rng = np.random.default_rng(seed)
+    time = pd.Timestamp('2024-01-08').value + np.cumsum(rng.integers(1, 15, rows)) * 1_000_000_000
+    bid = np.round(1.1 + np.cumsum(rng.normal(0, 5e-5, rows)), 5)
+    ask = bid + np.round(rng.uniform(0, 3e-4, rows), 5)
+    bid[rng.random(rows) < 0.005] = np.nan
+    ask[rng.random(rows) < 0.005] = np.nan
+    return pd.DataFrame({'time': time.view('datetime64[ns]'), 'bid': bid, 'ask': ask})
+
+
+def _trades(ticks, seed=0):
+    ohlc = resampler.resample_to_ohlc(ticks, '5min')
+    signals = np.random.default_rng(seed).choice([-1, 0, 1], len(ohlc), p=[0.03, 0.94, 0.03])
+    return backtester.simulate_signals(ohlc.assign(signal=signals), ticks, stop_loss_pips=30, take_profit_pips=40,
+                                       trade_volume_lots=LOTS, verbose=False)
+
+
+def _naive_equity(trades, ticks):
+    # Patrimônio de cada tick com preço, operação por operação
+    ticks = ticks.dropna(subset=['bid', 'ask']).reset_index(drop=True)
+    usd_per_price = backtester.PIP_VALUE_PER_LOT * LOTS / backtester.PIP_SIZE
+    equity = pd.Series(INITIAL_BALANCE, index=ticks.index)
+    for trade in trades.to_dict('records'):
+        equity[ticks['time'] >= trade['exit_time']] += trade['pnl_usd']
+        is_open = (ticks['time'] > trade['entry_time']) & (ticks['time'] < trade['exit_time'])
+        if trade['type'] == 'buy':
+            equity[is_open] += (ticks['bid'][is_open] - trade['entry_price']) * usd_per_price
+        else:
+            equity[is_open] += (trade['entry_price'] - ticks['ask'][is_open]) * usd_per_price
+    return ticks['time'], equity
+
+
+def _batches(ticks, size):
+    return [pa.RecordBatch.from_pandas(ticks.iloc[start:start + size], preserve_index=False)
+            for start in range(0, len(ticks), size)]
+
+
+@pytest.mark.parametrize('batch_size', [997, 100_000])
+def test_equity_matches_naive_per_tick(batch_size):
+    ticks = _ticks()
+    trades = _trades(ticks)
+    assert len(trades) > 10
+
+    curve, summary = analytics.analyze_equity(trades, _batches(ticks, batch_size), LOTS, timeframe='1h',
+                                              initial_balance=INITIAL_BALANCE)
+    times, equity = _naive_equity(trades, ticks)
+
+    peaks = np.maximum(equity.cummax(), INITIAL_BALANCE)
+    drawdown = peaks - equity
+    assert summary['ticks'] == len(equity)
+    assert summary['final_equity'] == pytest.approx(equity.iloc[-1], abs=1e-6)
+    assert summary['max_drawdown_usd'] == pytest.approx(drawdown.max(), abs=1e-6)
+    assert summary['max_drawdown_pct'] == pytest.approx((drawdown / peaks).max(), abs=1e-12)
+
+    # Retornos diários sobre o patrimônio do último tick de cada dia
+    closes = equity.groupby(times.dt.normalize().to_numpy()).last()
+    returns = closes / closes.shift(1, fill_value=INITIAL_BALANCE) - 1
+    assert summary['trading_days'] == len(returns)
+    assert summary['daily_return_mean'] == pytest.approx(returns.mean(), abs=1e-12)
+    assert summary['daily_return_std'] == pytest.approx(returns.std(), abs=1e-12)
+    assert summary['best_day_return'] == pytest.approx(returns.max(), abs=1e-12)
+    assert summary['worst_day_return'] == pytest.approx(returns.min(), abs=1e-12)
+
+    # A curva gravada é o OHLC do patrimônio por hora, com o drawdown máximo de cada hora
+    frame = pd.DataFrame({'equity': equity.to_numpy(), 'drawdown': drawdown.to_numpy()},
+                         index=pd.DatetimeIndex(times, name='time'))
+    hourly = frame.resample('1h').agg({'equity': ['first', 'max', 'min', 'last', 'count'], 'drawdown': 'max'})
+    hourly.columns = ['equity_open', 'equity_high', 'equity_low', 'equity_close', 'ticks', 'drawdown_max']
+    hourly = hourly[hourly['ticks'] > 0]
+    pd.testing.assert_frame_equal(curve[hourly.columns], hourly, check_freq=False, check_dtype=False, atol=1e-6)
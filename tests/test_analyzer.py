@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import analyzer
+
+_SECOND_MS = 1000
+
+
+def _ticks(seed=0):
+    # Sexta à noite até terça, com o fim de semana fechado, alguns ticks no sábado, duplicatas,
+    # ticks fora de ordem, intervalos longos, preços ausentes e spreads variados
+    rng = np.random.default_rng(seed)
+    segments = []
+    for start, rows in [('2024-01-05 21:00', 12_000), ('2024-01-07 22:00', 60_000)]:
+        steps = rng.exponential(600, rows).astype(np.int64)
+        steps[rng.random(rows) < 0.03] = 0
+        back = rng.random(rows) < 0.002
+        steps[back] = -rng.integers(1, 500, back.sum())
+        steps[rng.random(rows) < 0.001] = 5 * 60 * _SECOND_MS
+        segments.append(pd.Timestamp(start).value // 1_000_000 + np.cumsum(steps))
+    time_msc = np.concatenate(segments)
+    rows = len(time_msc)
+
+    bid = np.round(1.1 + np.cumsum(rng.normal(0, 1e-5, rows)), 5)
+    unchanged = rng.random(rows) < 0.05
+    bid[unchanged] = np.r_[bid[0], bid[:-1]][unchanged]
+    spread = rng.integers(0, 30, rows)
+    spread[rng.random(rows) < 0.002] = 500
+    spread[rng.random(rows) < 0.001] = -2
+    ask = np.round(bid + spread / 1e5, 5)
+    bid[rng.random(rows) < 0.01] = np.nan
+    ask[rng.random(rows) < 0.01] = np.nan
+    # Repetições exatas de linhas (mesmo time_msc e preços)
+    repeat = np.flatnonzero(rng.random(rows) < 0.01)
+    time_msc = np.insert(time_msc, repeat, time_msc[repeat])
+    bid, ask = np.insert(bid, repeat, bid[repeat]), np.insert(ask, repeat, ask[repeat])
+
+    return pd.DataFrame({'time': pd.to_datetime(time_msc // _SECOND_MS, unit='s'), 'time_msc': time_msc,
+                         'bid': bid, 'ask': ask})
+
+
+def _batches(df, sizes):
+    # Lotes de tamanhos variados, incluindo lotes vazios
+    batches, start = [], 0
+    while start < len(df):
+        size = sizes[len(batches) % len(sizes)]
+        batches.append(pa.RecordBatch.from_pandas(df[analyzer.QUALITY_COLUMNS].iloc[start:start + size],
+                                                  preserve_index=False))
+        start += size
+    return batches
+
+
+def _percentile(values, fraction):
+    # Mesmo critério do histograma: o menor valor que acumula `fraction` das amostras
+    ordered = np.sort(values)
+    return int(ordered[int(np.ceil(fraction * len(ordered))) - 1])
+
+
+def _reference(df, gap_threshold_seconds=60, price_digits=5, top_gaps=10):
+    times = df['time_msc'].to_numpy() * 1_000_000
+    bid, ask = df['bid'].to_numpy(), df['ask'].to_numpy()
+    deltas = np.diff(times)
+    same_prices = (bid[1:] == bid[:-1]) & (ask[1:] == ask[:-1])
+
+    gaps = []
+    closed = 0
+    for i in np.flatnonzero(deltas > gap_threshold_seconds * 1e9):
+        start, end = pd.Timestamp(times[i]), pd.Timestamp(times[i + 1])
+        if (pd.date_range(start.normalize(), end.normalize()).dayofweek == 5).any():
+            closed += 1
+        else:
+            gaps.append((deltas[i], times[i], times[i + 1]))
+
+    valid = ~(np.isnan(bid) | np.isnan(ask))
+    spread = np.round((ask[valid] - bid[valid]) * 10 ** price_digits).astype(np.int64)
+    clipped = np.clip(spread, 0, None)
+
+    # Horas: sequências de ticks consecutivos na mesma hora
+    hours = times // (3600 * 10 ** 9)
+    starts = np.flatnonzero(np.r_[True, hours[1:] != hours[:-1]])
+    hourly = np.diff(np.r_[starts, len(hours)])
+
+    stamps = pd.to_datetime(times)
+    return {
+        'ticks': len(df),
+        'duplicate_timestamps': int((deltas == 0).sum()),
+        'duplicate_rows': int(((deltas == 0) & same_prices).sum()),
+        'out_of_order': int((deltas < 0).sum()),
+        'missing_prices': int((~valid).sum()),
+        'weekend_ticks': int((stamps.dayofweek >= 5).sum()),
+        'gaps': len(gaps), 'market_closed': closed,
+        'largest': sorted(gaps, reverse=True)[:top_gaps],
+        'spread': (int(spread.min()), _percentile(clipped, 0.5), _percentile(clipped, 0.99), int(spread.max()),
+                   int((spread < 0).sum()), int((spread == 0).sum())),
+        'hourly': (len(hourly), int(hourly.min()), _percentile(hourly, 0.5), int(hourly.max())),
+        'by_hour_of_day': np.bincount(stamps.hour, minlength=24).tolist(),
+    }
+
+
+@pytest.mark.parametrize('sizes', [[len(_ticks())], [1, 0, 7, 997, 3_001], [50_000, 2]])
+def test_streaming_stats_match_pandas(sizes):
+    df = _ticks()
+    report = analyzer.analyze_ticks(_batches(df, sizes))
+    expected = _reference(df)
+
+    for key in ['ticks', 'duplicate_timestamps', 'duplicate_rows', 'out_of_order', 'missing_prices',
+                'weekend_ticks']:
+        assert report[key] == expected[key], key
+    assert report['gaps']['count'] == expected['gaps'] > 0
+    assert report['gaps']['market_closed'] == expected['market_closed'] == 1
+    assert [(gap['start'], gap['end']) for gap in report['gaps']['largest']] == \
+        [(str(pd.Timestamp(start)), str(pd.Timestamp(end))) for _, start, end in expected['largest']]
+
+    spread = report['spread_points']
+    assert (spread['min'], spread['median'], spread['p99'], spread['max'], spread['negative'],
+            spread['zero']) == expected['spread']
+
+    hourly = report['ticks_per_hour']
+    active_hours, low, median, high = expected['hourly']
+    assert (hourly['active_hours'], hourly['min'], hourly['max']) == (active_hours, low, high)
+    # A mediana sai de baldes logarítmicos de ~2% de largura
+    assert hourly['median'] == pytest.approx(median, rel=2 ** (1 / analyzer._HOURLY_BINS_PER_OCTAVE) - 1)
+    assert hourly['by_hour_of_day'] == expected['by_hour_of_day']
+
+
+def test_ticks_in_the_same_second_are_not_duplicates():
+    df = _ticks()
+    report = analyzer.analyze_ticks(_batches(df, [4_096]))
+    same_second = int((np.diff(df['time'].to_numpy().view(np.int64)) == 0).sum())
+    assert report['duplicate_timestamps'] < same_second / 10
+
+
+def test_result_does_not_close_the_open_hour():
+    df = _ticks()
+    batches = _batches(df, [5_000])
+    stats = analyzer.TickQualityStats()
+    for batch in batches[:len(batches) // 2]:
+        stats.update(batch)
+    stats.result()
+    for batch in batches[len(batches) // 2:]:
+        stats.update(batch)
+    assert stats.result() == analyzer.analyze_ticks(batches)
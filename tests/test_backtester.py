@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtester
+import resampler
+
+_KEYS = ['entry_time', 'entry_price', 'type', 'status', 'exit_time', 'exit_price']
+
+
+def _reference_exit(ticks_df, entry_time, exit_time, stop_loss, take_profit, trade_type='buy'):
+    # Laço tick a tick original, usado como referência para a busca vetorizada
+    trade_ticks = ticks_df[(ticks_df['time'] > entry_time) & (ticks_df['time'] <= exit_time)]
+    if trade_ticks.empty:
+        return {'status': 'NO_TICKS', 'exit_price': None, 'exit_time': None}
+
+    for _, tick in trade_ticks.iterrows():
+        price = tick['bid'] if trade_type == 'buy' else tick['ask']
+        if trade_type == 'buy':
+            if price <= stop_loss:
+                return {'status': 'STOP_LOSS', 'exit_price': stop_loss, 'exit_time': tick['time']}
+            if price >= take_profit:
+                return {'status': 'TAKE_PROFIT', 'exit_price': take_profit, 'exit_time': tick['time']}
+        else:
+            if price >= stop_loss:
+                return {'status': 'STOP_LOSS', 'exit_price': stop_loss, 'exit_time': tick['time']}
+            if price <= take_profit:
+                return {'status': 'TAKE_PROFIT', 'exit_price': take_profit, 'exit_time': tick['time']}
+
+    last = trade_ticks.iloc[-1]
+    return {'status': 'TIME_LIMIT', 'exit_price': last['bid'] if trade_type == 'buy' else last['ask'],
+            'exit_time': last['time']}
+
+
+def _reference_backtest(ohlc, ticks_df, stop_loss_pips, take_profit_pips):
+    # Laço de velas original: cada janela (vela anterior, vela atual] é varrida tick a tick
+    trades, position = [], None
+    for i in range(1, len(ohlc)):
+        candle = ohlc.iloc[i]
+        signal = candle['signal']
+        if position is not None:
+            result = _reference_exit(ticks_df, ohlc.index[i - 1], ohlc.index[i], position['stop_loss'],
+                                     position['take_profit'], position['type'])
+            if result['status'] in ('STOP_LOSS', 'TAKE_PROFIT'):
+                position.update(result)
+                trades.append(position)
+                position = None
+            elif (position['type'] == 'buy' and signal == -1) or (position['type'] == 'sell' and signal == 1):
+                position.update(status='SIGNAL_EXIT', exit_price=candle['open'], exit_time=ohlc.index[i])
+                trades.append(position)
+                position = None
+
+        if position is None and signal in (1, -1):
+            entry = candle['open']
+            side = 1 if signal == 1 else -1
+            position = {'entry_price': entry, 'entry_time': ohlc.index[i], 'type': 'buy' if signal == 1 else 'sell',
+                        'stop_loss': entry - side * stop_loss_pips * backtester.PIP_SIZE,
+                        'take_profit': entry + side * take_profit_pips * backtester.PIP_SIZE}
+    return trades
+
+
+def _ticks(rows=3_000, seed=0, volatility=2e-4):
+    rng = np.random.default_rng(seed)
+    time = pd.Timestamp('2024-01-10').value + np.cumsum(rng.integers(1, 20, rows)) * 1_000_000_000
+    bid = np.round(1.1 + np.cumsum(rng.normal(0, volatility, rows)), 5)
+    ask = bid + np.round(rng.uniform(0, 3e-4, rows), 5)
+    return pd.DataFrame({'time': time.view('datetime64[ns]'), 'bid': bid, 'ask': ask})
+
+
+def _with_signals(ohlc, seed=0, frequency=0.1):
+    rng = np.random.default_rng(seed)
+    signals = rng.choice([-1, 0, 1], len(ohlc), p=[frequency / 2, 1 - frequency, frequency / 2])
+    return ohlc.assign(signal=signals)
+
+
+def _assert_same_trades(results, expected):
+    assert results is not None and len(results) == len(expected)
+    for row, trade in zip(results.to_dict('records'), expected):
+        for key in _KEYS:
+            assert row[key] == trade[key], (key, row, trade)
+
+
+# Ticks de exemplo: bid 1.1000, 1.0990, 1.1010, 1.1030
+_CASE_TICKS = pd.DataFrame({
+    'time': pd.to_datetime(['2024-01-10 00:00:01', '2024-01-10 00:00:02', '2024-01-10 00:00:03',
+                            '2024-01-10 00:00:04']).as_unit('ns'),
+    'bid': [1.1000, 1.0990, 1.1010, 1.1030],
+    'ask': [1.1002, 1.0992, 1.1012, 1.1032],
+})
+
+
+@pytest.mark.parametrize('stop_loss, take_profit, trade_type, status', [
+    (1.0995, 1.1050, 'buy', 'STOP_LOSS'),
+    (1.0900, 1.1005, 'buy', 'TAKE_PROFIT'),
+    (1.1100, 1.0900, 'buy', 'STOP_LOSS'),        # o mesmo tick atinge os dois: o SL tem precedência
+    (1.1020, 1.0900, 'sell', 'STOP_LOSS'),
+    (1.1100, 1.0995, 'sell', 'TAKE_PROFIT'),
+    (1.0900, 1.1100, 'sell', 'STOP_LOSS'),       # idem, na venda
+    (1.0900, 1.1100, 'buy', 'TIME_LIMIT'),
+])
+def test_exit_matches_tick_loop(stop_loss, take_profit, trade_type, status):
+    entry, exit_ = pd.Timestamp('2024-01-10'), pd.Timestamp('2024-01-10 00:00:04')
+    result = backtester.run_trade_simulation(_CASE_TICKS, entry, exit_, 1.1, stop_loss, take_profit, trade_type)
+
+    assert result['status'] == status
+    assert result == _reference_exit(_CASE_TICKS, entry, exit_, stop_loss, take_profit, trade_type)
+
+
+def test_empty_window_has_no_ticks():
+    entry, exit_ = pd.Timestamp('2024-01-11'), pd.Timestamp('2024-01-12')
+    result = backtester.run_trade_simulation(_CASE_TICKS, entry, exit_, 1.1, 1.0, 1.2)
+    assert result == {'status': 'NO_TICKS', 'exit_price': None, 'exit_time': None}
+
+
+def test_random_windows_match_tick_loop():
+    ticks_df = _ticks()
+    ticks = backtester.prepare_ticks(ticks_df)
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        first, last = np.sort(rng.integers(0, len(ticks_df), 2))
+        entry, exit_ = ticks_df['time'].iloc[first], ticks_df['time'].iloc[last]
+        price = ticks_df['bid'].iloc[first]
+        trade_type = rng.choice(['buy', 'sell'])
+        side = 1 if trade_type == 'buy' else -1
+        stop_loss = price - side * rng.uniform(5, 60) * backtester.PIP_SIZE
+        take_profit = price + side * rng.uniform(5, 60) * backtester.PIP_SIZE
+
+        assert backtester.run_trade_simulation(ticks, entry, exit_, price, stop_loss, take_profit, trade_type) == \
+            _reference_exit(ticks_df, entry, exit_, stop_loss, take_profit, trade_type)
+
+
+def test_signal_exit_before_stop_or_target():
+    ticks_df = _ticks(volatility=1e-5)
+    ohlc = resampler.resample_to_ohlc(ticks_df[['time', 'bid']], '5min')
+    signals = np.zeros(len(ohlc), dtype=int)
+    signals[[2, 6]] = [1, -1]
+    ohlc = ohlc.assign(signal=signals)
+
+    results = backtester.simulate_signals(ohlc, ticks_df, stop_loss_pips=500, take_profit_pips=500,
+                                          trade_volume_lots=0.1, verbose=False)
+    expected = _reference_backtest(ohlc, ticks_df, 500, 500)
+
+    assert [trade['status'] for trade in expected] == ['SIGNAL_EXIT']
+    _assert_same_trades(results, expected)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_backtest_matches_tick_loop(seed):
+    ticks_df = _ticks(seed=seed)
+    ohlc = _with_signals(resampler.resample_to_ohlc(ticks_df[['time', 'bid']], '5min'), seed)
+
+    results = backtester.simulate_signals(ohlc, ticks_df, stop_loss_pips=30, take_profit_pips=60,
+                                          trade_volume_lots=0.1, verbose=False)
+    _assert_same_trades(results, _reference_backtest(ohlc, ticks_df, 30, 60))
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2, 3])
+def test_candle_first_exits_match_full_tick_scan(seed):
+    # Com ask_high/ask_low as janelas que não alcançam o SL/TP são puladas sem ler os ticks
+    ticks_df = _ticks(20_000, seed=seed, volatility=5e-5)
+    ticks_df.loc[np.random.default_rng(seed).random(len(ticks_df)) < 0.01, 'bid'] = np.nan
+    ohlc = _with_signals(resampler.resample_to_ohlc(ticks_df, '5min'), seed, frequency=0.05)
+    assert {'ask_high', 'ask_low'}.issubset(ohlc.columns)
+
+    candle_first = backtester.simulate_signals(ohlc, ticks_df, stop_loss_pips=15, take_profit_pips=20,
+                                               trade_volume_lots=0.1, verbose=False)
+    full_scan = backtester.simulate_signals(ohlc.drop(columns=['ask_high', 'ask_low']), ticks_df,
+                                            stop_loss_pips=15, take_profit_pips=20, trade_volume_lots=0.1,
+                                            verbose=False)
+
+    pd.testing.assert_frame_equal(candle_first, full_scan)
+    assert {'STOP_LOSS', 'TAKE_PROFIT'}.issubset(set(candle_first['status']))
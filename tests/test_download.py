@@ -0,0 +1,131 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import download
+import fake_mt5
+import mt5_connector
+import tick_store
+
+ASSETS = ['EURUSD', 'GBPUSD', 'USDJPY']
+# Dois lotes mensais curtos, atravessando a virada de janeiro para fevereiro
+START, END = '2024-01-31 22:00:00', '2024-02-01 02:00:00'
+
+
+@pytest.fixture
+def mt5(tmp_path, monkeypatch):
+    # O download grava em 'data' relativo ao diretório atual
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('MT5_BACKEND', 'fake')
+    monkeypatch.delenv('FAKE_MT5_LATENCY', raising=False)
+    monkeypatch.delenv('TICK_STORAGE_FORMAT', raising=False)
+    monkeypatch.setattr(mt5_connector, '_mt5', None)
+    mt5 = mt5_connector.get_mt5()
+    assert mt5 is fake_mt5
+    mt5.initialize()
+    yield mt5
+    mt5.shutdown()
+
+
+def _stored_msc(asset, start, end):
+    ticks = tick_store.load_ticks(asset, start, end, ipc_cache=False)
+    return None if ticks is None else ticks['time_msc'].to_numpy()
+
+
+def _expected_msc(asset, start, end):
+    return fake_mt5.generate_ticks(asset, pd.Timestamp(start).value // 1_000_000,
+                                   pd.Timestamp(end).value // 1_000_000)['time_msc']
+
+
+def test_plan_skips_and_resumes_written_partitions(mt5):
+    tasks, skipped = download.plan_downloads(['EURUSD'], START, END)
+    assert [(year, month) for _, year, month, _, _ in tasks] == [(2024, 1), (2024, 2)] and skipped == 0
+
+    stats = download.download_assets(['EURUSD'], START, END, rate_limit=0)
+    assert stats['batches'] == 2 and stats['errors'] == 0
+
+    tasks, skipped = download.plan_downloads(['EURUSD'], START, END)
+    assert tasks == [] and skipped == 2
+    assert download.download_assets(['EURUSD'], START, END, rate_limit=0)['batches'] == 0
+
+    # Estender o período baixa só fevereiro, como a união do que já existe com o trecho novo
+    tasks, skipped = download.plan_downloads(['EURUSD'], START, '2024-02-01 04:00:00')
+    assert skipped == 1
+    assert tasks == [('EURUSD', 2024, 2, pd.Timestamp('2024-02-01'), pd.Timestamp('2024-02-01 04:00:00'))]
+
+    download.download_assets(['EURUSD'], START, '2024-02-01 04:00:00', rate_limit=0)
+    np.testing.assert_array_equal(_stored_msc('EURUSD', START, '2024-02-01 04:00:00'),
+                                  _expected_msc('EURUSD', START, '2024-02-01 04:00:00'))
+
+
+def test_each_asset_is_written_by_a_single_writer(mt5, monkeypatch):
+    monkeypatch.setenv('FAKE_MT5_LATENCY', '0.02')
+    writes = []
+    write_partition = tick_store.write_partition
+
+    def recording_write(asset, year, month, *args, **kwargs):
+        writes.append((asset, threading.get_ident()))
+        return write_partition(asset, year, month, *args, **kwargs)
+
+    monkeypatch.setattr(tick_store, 'write_partition', recording_write)
+    stats = download.download_assets(ASSETS, START, END, fetch_workers=4, write_workers=2, rate_limit=0)
+
+    assert stats['batches'] == len(writes) == 2 * len(ASSETS) and stats['errors'] == 0
+    writers = {asset: {thread for name, thread in writes if name == asset} for asset in ASSETS}
+    assert all(len(threads) == 1 for threads in writers.values())
+    assert len(set.union(*writers.values())) == 2
+
+    # Qualquer que seja a ordem dos meses, a fronteira fica sem duplicatas e sem buracos
+    for asset in ASSETS:
+        np.testing.assert_array_equal(_stored_msc(asset, START, END), _expected_msc(asset, START, END))
+
+
+def test_rate_limiter_spaces_calls_across_threads():
+    limiter = download.RateLimiter(50)
+    calls = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(4):
+            limiter.acquire()
+            with lock:
+                calls.append(time.monotonic())
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 12 chamadas a 50 por segundo: a primeira sai na hora e cada uma das outras espera 20 ms
+    assert len(calls) == 12
+    assert max(calls) - min(calls) >= 11 * limiter.interval * 0.9
+
+
+def test_failed_fetch_does_not_stop_the_other_assets(mt5, monkeypatch):
+    copy_ticks_range = mt5.copy_ticks_range
+
+    def failing_copy(symbol, date_from, date_to, flags):
+        if symbol == 'GBPUSD' and date_from.month == 1:
+            raise ConnectionError('terminal disconnected')
+        return copy_ticks_range(symbol, date_from, date_to, flags)
+
+    monkeypatch.setattr(mt5, 'copy_ticks_range', failing_copy)
+    stats = download.download_assets(ASSETS, START, END, fetch_workers=2, write_workers=2, rate_limit=0)
+
+    assert stats['batches'] == 6 and stats['errors'] == 1
+    for asset in ['EURUSD', 'USDJPY']:
+        np.testing.assert_array_equal(_stored_msc(asset, START, END), _expected_msc(asset, START, END))
+    assert tick_store.read_partition_period(tick_store.partition_path('GBPUSD', 2024, 1)) is None
+    assert tick_store.read_partition_period(tick_store.partition_path('GBPUSD', 2024, 2)) is not None
+
+    # Rodar de novo completa só o lote que falhou
+    monkeypatch.setattr(mt5, 'copy_ticks_range', copy_ticks_range)
+    tasks, skipped = download.plan_downloads(ASSETS, START, END)
+    assert [task[:3] for task in tasks] == [('GBPUSD', 2024, 1)] and skipped == 5
+
+    download.download_assets(ASSETS, START, END, rate_limit=0)
+    np.testing.assert_array_equal(_stored_msc('GBPUSD', START, END), _expected_msc('GBPUSD', START, END))
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+import indicators
+
+
+def _ohlc(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 1e-4, rows))
+    index = pd.date_range('2024-01-01', periods=rows, freq='min')
+    return pd.DataFrame({'open': close, 'high': close, 'low': close, 'close': close, 'volume': 1}, index=index)
+
+
+def test_extended_sma_is_identical_to_full_recompute():
+    df = _ohlc(200_000)
+    cache = indicators.IndicatorCache()
+    cache.get(df.iloc[:150_000], 'sma', length=50)
+
+    extended = cache.get(df, 'sma', length=50).to_numpy()
+    full = indicators.IndicatorCache().get(df, 'sma', length=50).to_numpy()
+
+    assert cache.extensions == 1
+    assert np.array_equal(extended, full, equal_nan=True)
+
+
+def test_blocks_match_pandas_within_rounding():
+    df = _ohlc(200_000)
+    blocks = indicators.IndicatorCache().get(df, 'sma', length=50).to_numpy()
+    reference = indicators.sma(df['close'], 50).to_numpy()
+
+    assert np.array_equal(np.isnan(blocks), np.isnan(reference))
+    np.testing.assert_allclose(blocks, reference, rtol=1e-12)
+
+
+def test_disk_tier_prefix_is_extended(tmp_path):
+    df = _ohlc(100_000)
+    indicators.IndicatorCache(disk_dir=str(tmp_path)).get(df.iloc[:70_000], 'sma', length=20)
+
+    cache = indicators.IndicatorCache(disk_dir=str(tmp_path))
+    extended = cache.get(df, 'sma', length=20).to_numpy()
+
+    assert cache.extensions == 1
+    assert np.array_equal(extended, indicators.IndicatorCache().get(df, 'sma', length=20).to_numpy(), equal_nan=True)
+
+
+def test_numpy_window_shares_the_key_of_the_plain_int(tmp_path):
+    df = _ohlc(10_000)
+    cache = indicators.IndicatorCache(disk_dir=str(tmp_path))
+    plain = cache.get(df, 'sma', length=20)
+    numpy = cache.get(df, 'sma', length=np.int64(20))
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert numpy.name == plain.name == 'SMA_20'
+    assert len(list(tmp_path.glob('*.npy'))) == 1
+
+    # Outro processo (cache novo) acha a série em disco pela mesma chave
+    other = indicators.IndicatorCache(disk_dir=str(tmp_path))
+    other.get(df, 'sma', length=np.int64(20))
+    assert (other.hits, other.misses) == (1, 0)
+
+
+def test_disk_index_is_read_once(tmp_path, monkeypatch):
+    df = _ohlc(100_000)
+    indicators.IndicatorCache(disk_dir=str(tmp_path)).get(df.iloc[:70_000], 'sma', length=20)
+
+    scans = []
+    scandir = indicators.os.scandir
+    monkeypatch.setattr(indicators.os, 'scandir', lambda path: scans.append(path) or scandir(path))
+
+    cache = indicators.IndicatorCache(disk_dir=str(tmp_path), max_entries=1)
+    for length in [50, 30, 40]:
+        cache.get(df.iloc[:80_000], 'sma', length=length)
+    # Séries gravadas depois da leitura entram no índice: a de 50, já fora da memória, é estendida do disco
+    cache.get(df, 'sma', length=50)
+    cache.get(df, 'sma', length=20)
+
+    assert len(scans) == 1
+    assert (cache.misses, cache.extensions) == (3, 2)
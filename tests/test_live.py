@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtester
+import indicators
+import live
+import resampler
+import strategies
+
+
+def _ticks(candles, ticks_per_candle=2, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = candles * ticks_per_candle
+    step = 60 // ticks_per_candle
+    time = pd.Timestamp('2024-01-10').value + np.arange(rows, dtype=np.int64) * step * 1_000_000_000
+    # Passeio aleatório arredondado a 5 casas, como os preços do MT5 (gera empates entre as médias)
+    bid = np.round(1.1 + np.cumsum(rng.normal(0, 2e-5, rows)), 5)
+    return time, bid
+
+
+def test_live_signals_match_batch_path():
+    # Mais velas que indicators.BLOCK_ROWS, para passar pelo reinício da soma das médias
+    time, bid = _ticks(indicators.BLOCK_ROWS + 5_000)
+    periods = dict(fast_period=5, slow_period=12, trend_filter_period=30)
+
+    builder = live.CandleBuilder('1min')
+    strategy = live.MovingAverageCrossover(**periods)
+    labels, signals = [], []
+    for time_ns, price in zip(time.tolist(), bid.tolist()):
+        closed = builder.update(time_ns, price)
+        if closed is not None:
+            labels.append(closed[0])
+            signals.append(strategy.on_candle(closed[4]))
+    closed = builder.candle()
+    labels.append(closed[0])
+    signals.append(strategy.on_candle(closed[4]))
+    live_signals = pd.Series(signals, index=pd.DatetimeIndex(np.array(labels).view('datetime64[ns]')))
+
+    ohlc = resampler.resample_to_ohlc(pd.DataFrame({'time': time.view('datetime64[ns]'), 'bid': bid}), '1min')
+    batch = strategies.moving_average_crossover(ohlc, verbose=False, cache=indicators.IndicatorCache(), **periods)
+
+    assert len(live_signals) == len(ohlc)
+    assert (batch['signal'] != 0).sum() > 100
+    np.testing.assert_array_equal(live_signals.loc[batch.index].to_numpy(), batch['signal'].to_numpy())
+    # As velas descartadas no lote (médias incompletas) não geram sinal ao vivo
+    assert (live_signals.drop(batch.index) == 0).all()
+
+
+def _tick_frame(rows=40_000, seed=0):
+    rng = np.random.default_rng(seed)
+    time = pd.Timestamp('2024-01-10').value + np.cumsum(rng.integers(1, 10, rows)) * 1_000_000_000
+    bid = np.round(1.1 + np.cumsum(rng.normal(0, 5e-5, rows)), 5)
+    ask = bid + np.round(rng.uniform(0, 3e-4, rows), 5)
+    bid[rng.random(rows) < 0.005] = np.nan
+    return pd.DataFrame({'time': time.view('datetime64[ns]'), 'bid': bid, 'ask': ask})
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_engine_trades_match_batch_backtest(seed):
+    ticks = _tick_frame(seed=seed)
+    periods = dict(fast_period=5, slow_period=12, trend_filter_period=30)
+    risk = dict(stop_loss_pips=10, take_profit_pips=15, trade_volume_lots=0.1)
+
+    engine = live.LiveEngine('1min', strategy=live.MovingAverageCrossover(**periods), **risk)
+    engine.replay([ticks.iloc[start:start + 997] for start in range(0, len(ticks), 997)])
+    engine.finish()
+    live_trades = engine.results()
+
+    # Ao vivo, o sinal de uma vela é executado no primeiro tick da vela seguinte: no lote, isso é
+    # o sinal deslocado uma vela, com entrada (e saída por sinal) no open dela
+    def next_candle_strategy(df):
+        signals = strategies.moving_average_crossover(df, verbose=False, cache=indicators.IndicatorCache(),
+                                                      **periods)
+        return signals.assign(signal=signals['signal'].shift(1, fill_value=0))
+
+    ohlc = resampler.resample_to_ohlc(ticks, '1min')
+    batch_trades = backtester.run_backtest(ohlc, ticks, next_candle_strategy, verbose=False, **risk)
+
+    assert live_trades is not None and len(live_trades) > 20
+    assert {'STOP_LOSS', 'TAKE_PROFIT', 'SIGNAL_EXIT'}.issubset(set(live_trades['status']))
+    # O lote registra o rótulo da vela nas entradas e saídas no open; ao vivo, o horário do tick
+    live_trades = live_trades.copy()
+    live_trades['entry_time'] = live_trades['entry_time'].dt.floor('1min')
+    signal_exit = live_trades['status'] == 'SIGNAL_EXIT'
+    live_trades.loc[signal_exit, 'exit_time'] = live_trades.loc[signal_exit, 'exit_time'].dt.floor('1min')
+    pd.testing.assert_frame_equal(live_trades, batch_trades[live_trades.columns], check_dtype=False)
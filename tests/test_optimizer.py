@@ -0,0 +1,63 @@
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtester
+import optimizer
+import resampler
+import strategies
+
+
+def _market_data(rows=40_000, seed=0):
+    rng = np.random.default_rng(seed)
+    time = pd.Timestamp('2024-01-10').value + np.cumsum(rng.integers(1, 20, rows)) * 1_000_000_000
+    bid = np.round(1.1 + np.cumsum(rng.normal(0, 5e-5, rows)), 5)
+    ask = bid + np.round(rng.uniform(0, 3e-4, rows), 5)
+    ticks = pd.DataFrame({'time': time.view('datetime64[ns]'), 'bid': bid, 'ask': ask})
+    return resampler.resample_to_ohlc(ticks, '5min'), ticks
+
+
+def test_unknown_metric_fails_before_running():
+    # Falha antes de publicar os dados: as velas e os ticks nem são olhados
+    with pytest.raises(ValueError, match="Valid metrics: trades, win_rate, pnl_points, pnl_usd, max_drawdown_usd"):
+        optimizer.optimize(pd.DataFrame(), None, {'FAST_SMA_PERIOD': [10]}, rank_by='sharpe')
+
+
+@pytest.mark.parametrize('metric', ['trades', 'win_rate', 'pnl_points', 'pnl_usd', 'max_drawdown_usd'])
+def test_summary_metrics_are_accepted(metric):
+    optimizer.check_metric(metric)
+
+
+def test_shared_candles_keep_ask_extremes():
+    df_ohlc, ticks = _market_data(5_000)
+    blocks, spec = optimizer.share_market_data(df_ohlc, ticks)
+    try:
+        attached, arrays = optimizer.attach_arrays(spec)
+        shared_ohlc, _ = optimizer.market_data_from_arrays(arrays)
+        pd.testing.assert_frame_equal(shared_ohlc, df_ohlc, check_freq=False)
+        del shared_ohlc, arrays
+        for block in attached:
+            block.close()
+    finally:
+        optimizer.release_arrays(blocks)
+
+
+def test_parallel_optimize_matches_sequential_backtests(monkeypatch):
+    monkeypatch.setenv('TRADE_VOLUME_LOTS', '0.1')
+    df_ohlc, ticks = _market_data()
+    grid = {'FAST_SMA_PERIOD': [3, 5], 'SLOW_SMA_PERIOD': [8, 13], 'TREND_FILTER_PERIOD': [21],
+            'STOP_LOSS_PIPS': [10, 20], 'TAKE_PROFIT_PIPS': [15]}
+
+    results = optimizer.optimize(df_ohlc, ticks, grid, max_workers=2)
+    assert len(results) == len(optimizer.build_combinations(grid))
+    assert results['trades'].sum() > 0
+
+    for row in results.to_dict('records'):
+        strategy = partial(strategies.moving_average_crossover, verbose=False, fast_period=row['FAST_SMA_PERIOD'],
+                           slow_period=row['SLOW_SMA_PERIOD'], trend_filter_period=row['TREND_FILTER_PERIOD'])
+        trades = backtester.run_backtest(df_ohlc, ticks, strategy, stop_loss_pips=row['STOP_LOSS_PIPS'],
+                                         take_profit_pips=row['TAKE_PROFIT_PIPS'], verbose=False)
+        expected = backtester.summarize_results(trades)
+        assert {key: row[key] for key in expected} == expected, row
@@ -0,0 +1,103 @@
+import os
+
+import pandas as pd
+import pytest
+
+import fake_mt5
+import pipeline
+import tick_store
+
+ASSET = 'EURUSD'
+START, END = '2024-01-29', '2024-01-31'
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    for name in pipeline.RESULT_SETTINGS:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.delenv('INDICATOR_CACHE_DIR', raising=False)
+
+    ticks = pd.DataFrame(fake_mt5.generate_ticks(ASSET, pd.Timestamp(START).value // 1_000_000,
+                                                 pd.Timestamp('2024-01-31 23:59:59').value // 1_000_000,
+                                                 interval_ms=5_000))
+    ticks['time'] = pd.to_datetime(ticks['time'], unit='s')
+    tick_store.write_partition(ASSET, 2024, 1, ticks, START, END, data_dir=str(tmp_path))
+    return tmp_path
+
+
+def _run(data_dir):
+    return pipeline.run_backtest_pipeline(ASSET, START, END, 'M5', data_dir=str(data_dir),
+                                          artifact_dir=str(data_dir / 'artifacts'), verbose=False)
+
+
+def test_explicit_defaults_reuse_the_result(data_dir, monkeypatch):
+    _, steps = _run(data_dir)
+    assert steps['backtest'] == 'built'
+
+    # Valores iguais aos padrões (mesmo escritos de outro jeito) não mudam a chave
+    monkeypatch.setenv('FAST_SMA_PERIOD', '20')
+    monkeypatch.setenv('TRADE_VOLUME_LOTS', '0.10')
+    _, steps = _run(data_dir)
+    assert steps['backtest'] == 'cached'
+
+    monkeypatch.setenv('FAST_SMA_PERIOD', '10')
+    _, steps = _run(data_dir)
+    assert steps['backtest'] == 'built'
+
+
+def test_resampled_file_is_used_only_with_the_current_source_signature(data_dir):
+    _, steps = _run(data_dir)
+    assert steps['ohlc'] == 'built'
+
+    # Sem a assinatura ao lado, o arquivo do comando resample não é usado
+    candles = pd.read_parquet(next((data_dir / 'artifacts' / 'ohlc').glob('*.parquet')))
+    path = pipeline.ohlc_file(ASSET, START, END, 'M5', data_dir=str(data_dir))
+    candles.to_parquet(path)
+    _, steps = _run(data_dir)
+    assert steps['ohlc'] == 'cached'
+
+    signature = pipeline.ohlc_source_signature(ASSET, START, END, 'M5', data_dir=str(data_dir))
+    pipeline.write_ohlc_source(path, signature)
+    _, steps = _run(data_dir)
+    assert steps['ohlc'] == 'reused'
+
+    # A assinatura de outro timeframe não vale para este
+    assert signature != pipeline.ohlc_source_signature(ASSET, START, END, 'M15', data_dir=str(data_dir))
+
+    # Ticks regravados com data de modificação mais antiga que as velas ainda invalidam o arquivo
+    partition = tick_store.partition_path(ASSET, 2024, 1, str(data_dir))
+    os.utime(partition, ns=(os.stat(path).st_mtime_ns - 10 ** 9,) * 2)
+    _, steps = _run(data_dir)
+    assert steps['ohlc'] == 'built'
+
+
+def test_resampled_file_changed_after_its_signature_is_not_used(data_dir):
+    _run(data_dir)
+    candles = pd.read_parquet(next((data_dir / 'artifacts' / 'ohlc').glob('*.parquet')))
+    path = pipeline.ohlc_file(ASSET, START, END, 'M5', data_dir=str(data_dir))
+    candles.to_parquet(path)
+    pipeline.write_ohlc_source(path, pipeline.ohlc_source_signature(ASSET, START, END, 'M5', data_dir=str(data_dir)))
+
+    # Um resample interrompido (ou uma edição manual) muda o arquivo depois da assinatura
+    candles.iloc[:-10].to_parquet(path)
+    _, steps = _run(data_dir)
+    assert steps['ohlc'] == 'cached'
+
+
+@pytest.mark.parametrize('timeframe, mode', [('M5', 'stream'), ('M5', 'memory'), ('M5,H1', 'stream')])
+def test_resample_command_writes_the_source_signature(data_dir, monkeypatch, timeframe, mode):
+    import main
+
+    # O comando grava em 'data' relativo ao diretório atual
+    asset_dir = tick_store.asset_dir(ASSET, str(data_dir))
+    os.renames(asset_dir, tick_store.asset_dir(ASSET, str(data_dir / 'data')))
+    monkeypatch.chdir(data_dir)
+    for name, value in [('ASSET', ASSET), ('START_DATE', START), ('END_DATE', END), ('TIMEFRAME', timeframe),
+                        ('RESAMPLE_MODE', mode), ('TICK_IPC_CACHE', '0')]:
+        monkeypatch.setenv(name, value)
+    main._resample()
+
+    for tf in timeframe.split(','):
+        assert pipeline._current_ohlc_file(ASSET, START, END, tf, 'data') is not None
+        _, steps = pipeline.run_backtest_pipeline(ASSET, START, END, tf, artifact_dir='artifacts', verbose=False)
+        assert steps['ohlc'] == 'reused'
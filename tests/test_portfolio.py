@@ -0,0 +1,62 @@
+import os
+
+import pandas as pd
+
+import fake_mt5
+import portfolio
+import tick_store
+
+START, END = '2024-01-08', '2024-01-12'
+
+
+def _write_asset(data_dir, asset):
+    ticks = pd.DataFrame(fake_mt5.generate_ticks(asset, pd.Timestamp(START).value // 1_000_000,
+                                                 pd.Timestamp('2024-01-12 23:59:59').value // 1_000_000,
+                                                 interval_ms=5_000))
+    ticks['time'] = pd.to_datetime(ticks['time'], unit='s')
+    tick_store.write_partition(asset, 2024, 1, ticks, START, END, data_dir=str(data_dir))
+
+
+def test_failed_asset_does_not_lose_the_others(tmp_path, monkeypatch):
+    monkeypatch.delenv('TICK_COMPACT', raising=False)
+    # Médias curtas para haver operações em poucos dias (os processos herdam o ambiente)
+    for name, value in [('FAST_SMA_PERIOD', '5'), ('SLOW_SMA_PERIOD', '12'), ('TREND_FILTER_PERIOD', '30'),
+                        ('STOP_LOSS_PIPS', '10'), ('TAKE_PROFIT_PIPS', '15'), ('TRADE_VOLUME_LOTS', '0.1')]:
+        monkeypatch.setenv(name, value)
+    for asset in ['EURUSD', 'GBPUSD', 'USDJPY']:
+        _write_asset(tmp_path, asset)
+    # Partição corrompida: a leitura levanta uma exceção dentro do processo do ativo
+    with open(tick_store.partition_path('USDJPY', 2024, 1, str(tmp_path)), 'wb') as f:
+        f.write(b'not a parquet file')
+
+    trades, summary, errors = portfolio.run_portfolio_backtest(['EURUSD', 'GBPUSD', 'USDJPY'], START, END, 'M5',
+                                                               max_workers=3, data_dir=str(tmp_path))
+
+    assert list(errors) == ['USDJPY']
+    assert trades is not None and set(trades['asset']) == {'EURUSD', 'GBPUSD'}
+    assert trades['exit_time'].is_monotonic_increasing
+    assert trades['equity_usd'].iloc[-1] == trades['pnl_usd'].sum()
+    assert summary.loc['USDJPY', 'trades'] == 0
+    assert summary.loc['PORTFOLIO', 'trades'] == len(trades)
+
+    # Cada ativo que sobreviveu tem as mesmas operações do backtest feito sozinho
+    for asset in ['EURUSD', 'GBPUSD']:
+        _, expected, error = portfolio.run_asset_backtest(asset, START, END, 'M5', data_dir=str(tmp_path))
+        assert error is None
+        merged = trades[trades['asset'] == asset].drop(columns='equity_usd')
+        expected = expected.sort_values(['exit_time', 'entry_time'], kind='stable')
+        pd.testing.assert_frame_equal(merged.reset_index(drop=True), expected.reset_index(drop=True))
+
+
+def test_merge_trades_orders_by_exit_time():
+    times = pd.to_datetime(['2024-01-08 10:00', '2024-01-08 12:00', '2024-01-08 11:00'])
+    first = pd.DataFrame({'asset': 'EURUSD', 'entry_time': times[:2] - pd.Timedelta('1h'), 'exit_time': times[:2],
+                          'pnl_usd': [1.0, 2.0]})
+    second = pd.DataFrame({'asset': 'GBPUSD', 'entry_time': times[2:] - pd.Timedelta('1h'),
+                           'exit_time': times[2:], 'pnl_usd': [4.0]})
+
+    merged = portfolio.merge_trades({'EURUSD': first, 'GBPUSD': second, 'USDJPY': None})
+
+    assert merged['asset'].tolist() == ['EURUSD', 'GBPUSD', 'EURUSD']
+    assert merged['equity_usd'].tolist() == [1.0, 5.0, 7.0]
+    assert portfolio.merge_trades({'USDJPY': None}) is None
@@ -0,0 +1,94 @@
+import contextlib
+import functools
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import resampler
+
+
+def _ticks(rows=20_000, seed=0):
+    # Ticks irregulares ao longo de alguns dias, com intervalos grandes e alguns bids ausentes
+    rng = np.random.default_rng(seed)
+    steps = rng.exponential(20, rows)
+    steps[rng.random(rows) < 0.001] = 6 * 3600
+    time = pd.Timestamp('2024-01-10 00:00:03').value + np.cumsum(steps * 1e9).astype(np.int64)
+    bid = 1.1 + np.cumsum(rng.normal(0, 1e-5, rows))
+    ask = bid + np.round(rng.uniform(0, 3e-4, rows), 5)
+    bid[rng.random(rows) < 0.01] = np.nan
+    return pd.DataFrame({'time': time.view('datetime64[ns]'), 'bid': bid, 'ask': ask})
+
+
+def _batches(df, sizes):
+    # Lotes de tamanhos variados, incluindo lotes vazios
+    batches, start = [], 0
+    while start < len(df):
+        size = sizes[len(batches) % len(sizes)]
+        batches.append(pa.RecordBatch.from_pandas(df.iloc[start:start + size], preserve_index=False))
+        start += size
+    return batches
+
+
+@pytest.mark.parametrize('timeframe', ['1min', '5min', '1h', '4h', '1d', '1w', 'MS'])
+def test_streaming_matches_in_memory(tmp_path, timeframe):
+    ticks = _ticks()
+    path = str(tmp_path / 'ohlc.parquet')
+
+    total = resampler.resample_parquet_to_ohlc(_batches(ticks, [1, 0, 7, 997, 0, 3_001]), path, timeframe)
+    streamed = pd.read_parquet(path)
+    expected = resampler.resample_to_ohlc(ticks, timeframe)
+
+    assert total == len(expected)
+    pd.testing.assert_frame_equal(streamed, expected, check_freq=False, check_dtype=False)
+
+
+def test_batches_that_split_a_candle():
+    ticks = _ticks(2_000)
+    # Lotes de um tick: todas as velas são montadas a partir de pedaços
+    streamed = pd.concat(resampler.resample_batches(_batches(ticks, [1]), '5min'))
+    pd.testing.assert_frame_equal(streamed, resampler.resample_to_ohlc(ticks, '5min'), check_freq=False,
+                                  check_dtype=False)
+
+
+def test_candle_with_only_missing_bids_is_dropped():
+    time = pd.to_datetime(['2024-01-10 00:00:01', '2024-01-10 00:01:01', '2024-01-10 00:02:01']).as_unit('ns')
+    # O ask do tick sem bid também é ignorado, nos dois caminhos
+    ticks = pd.DataFrame({'time': time, 'bid': [1.1, np.nan, 1.2], 'ask': [1.1002, 1.5, 1.2002]})
+
+    streamed = pd.concat(resampler.resample_batches(_batches(ticks, [2, 0, 1]), '1min'))
+    expected = resampler.resample_to_ohlc(ticks, '1min')
+
+    assert len(expected) == 2
+    assert expected['ask_high'].max() < 1.5
+    pd.testing.assert_frame_equal(streamed, expected, check_freq=False, check_dtype=False)
+
+
+def test_multi_timeframe_matches_single_passes(tmp_path, monkeypatch):
+    ticks = _ticks()
+    timeframes = ['1min', '5min', '1h', '1d', 'MS']
+    paths = {tf: str(tmp_path / f'{tf}.parquet') for tf in timeframes}
+
+    # A gravação não pode acontecer dentro da etapa 'resample' (seria contada duas vezes)
+    open_stages = []
+
+    @contextlib.contextmanager
+    def stage(name):
+        assert not (name == 'parquet_write' and 'resample' in open_stages)
+        open_stages.append(name)
+        try:
+            yield
+        finally:
+            open_stages.pop()
+
+    monkeypatch.setattr(resampler.metrics, 'stage', stage)
+    # Row groups de uma vela: cada write grava na hora
+    monkeypatch.setattr(resampler, '_OhlcWriter', functools.partial(resampler._OhlcWriter, rows_per_group=1))
+    totals = resampler.resample_multi_timeframe(_batches(ticks, [1, 0, 7, 997, 0, 3_001]), paths)
+
+    for timeframe in timeframes:
+        expected = resampler.resample_to_ohlc(ticks, timeframe)
+        assert totals[timeframe] == len(expected)
+        pd.testing.assert_frame_equal(pd.read_parquet(paths[timeframe]), expected, check_freq=False,
+                                      check_dtype=False)
@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import backtester
+import fake_mt5
+import tick_store
+
+ASSET = 'EURUSD'
+
+
+def _month_df(start, end, nan_prices=True):
+    ticks = fake_mt5.generate_ticks(ASSET, pd.Timestamp(start).value // 1_000_000, pd.Timestamp(end).value // 1_000_000,
+                                    interval_ms=5_000)
+    df = pd.DataFrame(ticks)
+    df['time'] = pd.to_datetime(df['time'], unit='s')
+    if nan_prices and len(df):
+        rng = np.random.default_rng(len(df))
+        df.loc[rng.random(len(df)) < 0.01, 'bid'] = np.nan
+        df.loc[rng.random(len(df)) < 0.01, 'ask'] = np.nan
+    return df
+
+
+# Fim de janeiro, começo de fevereiro e um março sem ticks (partição vazia)
+_MONTHS = [
+    (2024, 1, '2024-01-29', '2024-01-31 23:59:59'),
+    (2024, 2, '2024-02-01', '2024-02-02 23:59:59'),
+    (2024, 3, '2024-03-02', '2024-03-03 23:59:59'),
+]
+
+
+def _write(data_dir, storages):
+    for (year, month, start, end), storage in zip(_MONTHS, storages):
+        tick_store.write_partition(ASSET, year, month, _month_df(start, end), start, end, data_dir=str(data_dir),
+                                   storage=storage)
+
+
+@pytest.fixture(scope='module')
+def stores(tmp_path_factory):
+    dirs = {}
+    for name, storages in [('raw', ['raw'] * 3), ('encoded', ['encoded'] * 3),
+                           ('mixed', ['raw', 'encoded', 'encoded'])]:
+        dirs[name] = tmp_path_factory.mktemp(name)
+        _write(dirs[name], storages)
+    return dirs
+
+
+@pytest.mark.parametrize('store', ['encoded', 'mixed'])
+@pytest.mark.parametrize('start, end', [
+    ('2024-01-29', '2024-03-03'),                        # todas as partições, incluindo a vazia
+    ('2024-01-30 10:00:00', '2024-01-30 10:05:00'),      # trecho curto dentro de um mês
+    ('2024-01-31 23:00:00', '2024-02-01 01:00:00'),      # atravessa a fronteira entre os meses
+    ('2024-03-02', '2024-03-03'),                        # só a partição vazia
+])
+@pytest.mark.parametrize('columns', [None, tick_store.PRICE_COLUMNS])
+def test_load_ticks_matches_raw(stores, store, start, end, columns):
+    expected = tick_store.load_ticks(ASSET, start, end, data_dir=str(stores['raw']), columns=columns,
+                                     ipc_cache=False)
+    loaded = tick_store.load_ticks(ASSET, start, end, data_dir=str(stores[store]), columns=columns, ipc_cache=False)
+
+    if expected is None:
+        assert loaded is None
+    else:
+        assert expected['bid'].isna().any() or len(expected) < 100
+        pd.testing.assert_frame_equal(loaded, expected)
+
+
+@pytest.mark.parametrize('store', ['encoded', 'mixed'])
+def test_scan_ticks_matches_raw(stores, store):
+    def scanned(data_dir):
+        batches = tick_store.scan_ticks(ASSET, '2024-01-29', '2024-03-03', data_dir=str(data_dir), batch_size=7_777)
+        return pa.Table.from_batches(list(batches)).to_pandas()
+
+    pd.testing.assert_frame_equal(scanned(stores[store]), scanned(stores['raw']))
+
+
+def test_ipc_cache_of_encoded_partition_matches_raw(stores, tmp_path):
+    expected = tick_store.load_ticks(ASSET, '2024-01-29', '2024-03-03', data_dir=str(stores['raw']), ipc_cache=False)
+    loaded = tick_store.load_ticks(ASSET, '2024-01-29', '2024-03-03', data_dir=str(stores['encoded']), ipc_cache=True)
+    pd.testing.assert_frame_equal(loaded, expected)
+
+
+def test_encoded_partitions_are_smaller(stores):
+    for year, month, _, _ in _MONTHS[:2]:
+        raw = tick_store.partition_path(ASSET, year, month, str(stores['raw']))
+        encoded = tick_store.partition_path(ASSET, year, month, str(stores['encoded']))
+        assert tick_store.os.path.getsize(encoded) < tick_store.os.path.getsize(raw)
+
+
+@pytest.mark.parametrize('as_arrow', [False, True])
+def test_int_compact_keeps_missing_prices(stores, as_arrow):
+    expected = backtester.prepare_ticks(tick_store.load_ticks(ASSET, '2024-01-29', '2024-02-02',
+                                                              data_dir=str(stores['raw']), ipc_cache=False))
+    compact = tick_store.load_ticks(ASSET, '2024-01-29', '2024-02-02', data_dir=str(stores['raw']),
+                                    compact='int', price_digits=5, ipc_cache=False, as_arrow=as_arrow)
+    ticks = backtester.prepare_ticks(compact)
+
+    assert np.isnan(expected.bid).any() and np.isnan(expected.ask).any()
+    np.testing.assert_array_equal(ticks.time, expected.time)
+    np.testing.assert_allclose(ticks.bid, expected.bid, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(ticks.ask, expected.ask, rtol=0, atol=1e-9)
+
+
+def _boundary_batches():
+    # Como nos lotes do MT5, janeiro vai até alguns segundos depois da virada e fevereiro começa
+    # na virada: os ticks desse trecho aparecem nas duas partições
+    january = _month_df('2024-01-31 23:00:00', '2024-02-01 00:00:20', nan_prices=False)
+    february = _month_df('2024-02-01 00:00:00', '2024-02-01 01:00:00', nan_prices=False)
+    repeated = february[february['time'] <= january['time'].iloc[-1]]
+    assert len(repeated) >= 3
+
+    # Ticks distintos no mesmo time_msc de um tick repetido, com outro preço, um em cada partição
+    twin = repeated.iloc[[1]].assign(bid=repeated['bid'].iloc[1] + 1e-5)
+    january = pd.concat([january, twin.assign(ask=twin['ask'] + 2e-5)], ignore_index=True)
+    february = pd.concat([february, twin], ignore_index=True)
+    return january, february, len(repeated)
+
+
+@pytest.mark.parametrize('order', ['january_first', 'february_first'])
+@pytest.mark.parametrize('storage', ['raw', 'encoded'])
+def test_month_boundary_drops_only_repeated_ticks(tmp_path, order, storage):
+    january, february, repeated = _boundary_batches()
+    writes = [(2024, 1, january, '2024-01-31', '2024-02-01'), (2024, 2, february, '2024-02-01', '2024-02-02')]
+    if order == 'february_first':
+        writes.reverse()
+
+    written = [tick_store.write_partition(ASSET, year, month, df, start, end, data_dir=str(tmp_path), storage=storage)
+               for year, month, df, start, end in writes]
+    # Só a segunda partição gravada perde os ticks que a vizinha já tem
+    assert written == [len(writes[0][2]), len(writes[1][2]) - repeated]
+
+    loaded = tick_store.load_ticks(ASSET, '2024-01-31', '2024-02-02', data_dir=str(tmp_path), ipc_cache=False)
+    expected = pd.concat([january, february], ignore_index=True).drop_duplicates()
+    assert len(expected) == len(january) + len(february) - repeated
+
+    key = ['time_msc', 'bid', 'ask']
+    pd.testing.assert_frame_equal(loaded.sort_values(key, ignore_index=True),
+                                  expected.sort_values(key, ignore_index=True), check_dtype=False)
+    # Os dois ticks com o mesmo time_msc e preço diferente sobrevivem à deduplicação
+    twins = loaded['time_msc'].value_counts()
+    assert (twins > 1).sum() == 1 and twins.max() == 3
+
+
+@pytest.mark.parametrize('columns', [['bid', 'ask'], ['time_msc', 'bid'], tick_store.PRICE_COLUMNS])
+def test_ipc_cache_selects_columns_without_time(stores, columns):
+    start, end = '2024-01-31 23:00:00', '2024-02-01 01:00:00'
+    expected = tick_store.load_ticks(ASSET, start, end, data_dir=str(stores['raw']), columns=columns, ipc_cache=False)
+    loaded = tick_store.load_ticks(ASSET, start, end, data_dir=str(stores['raw']), columns=columns, ipc_cache=True)
+    pd.testing.assert_frame_equal(loaded, expected)
+
+
+def test_ipc_cache_is_rebuilt_when_the_partition_changes(tmp_path):
+    start, end = '2024-01-29', '2024-01-31 23:59:59'
+    tick_store.write_partition(ASSET, 2024, 1, _month_df(start, '2024-01-30'), start, end, data_dir=str(tmp_path))
+    first = tick_store.load_ticks(ASSET, start, end, data_dir=str(tmp_path), ipc_cache=True)
+
+    # A partição é regravada com mais ticks: a assinatura muda e o cache deixa de valer
+    tick_store.write_partition(ASSET, 2024, 1, _month_df(start, end), start, end, data_dir=str(tmp_path))
+    expected = tick_store.load_ticks(ASSET, start, end, data_dir=str(tmp_path), ipc_cache=False)
+    loaded = tick_store.load_ticks(ASSET, start, end, data_dir=str(tmp_path), ipc_cache=True)
+
+    assert len(loaded) > len(first)
+    pd.testing.assert_frame_equal(loaded, expected)
+    path = tick_store.partition_path(ASSET, 2024, 1, str(tmp_path))
+    cached = tick_store._read_ipc(tick_store.ipc_cache_path(path))
+    assert cached.schema.metadata[tick_store._IPC_SOURCE_KEY] == tick_store._source_signature(path)
+
+
+def test_ipc_cache_falls_back_to_memory_when_it_cannot_be_written(tmp_path):
+    start, end = '2024-01-29', '2024-01-30'
+    tick_store.write_partition(ASSET, 2024, 1, _month_df(start, end), start, end, data_dir=str(tmp_path))
+    path = tick_store.partition_path(ASSET, 2024, 1, str(tmp_path))
+
+    # Um diretório no lugar do cache faz o os.replace falhar com OSError, como um arquivo mapeado no Windows
+    cache_path = tick_store.ipc_cache_path(path)
+    tick_store.os.makedirs(tick_store.os.path.join(cache_path, 'busy'))
+
+    table = tick_store.open_ipc_cache(path)
+    assert table.num_rows > 0
+    pd.testing.assert_frame_equal(table.to_pandas(), pq.read_table(path).to_pandas())
+    assert sorted(tick_store.os.listdir(tick_store.os.path.dirname(path))) == [tick_store.os.path.basename(cache_path),
+                                                                               tick_store.PARTITION_FILENAME]
+
+    expected = tick_store.load_ticks(ASSET, start, end, data_dir=str(tmp_path), ipc_cache=False)
+    pd.testing.assert_frame_equal(tick_store.load_ticks(ASSET, start, end, data_dir=str(tmp_path), ipc_cache=True),
+                                  expected)
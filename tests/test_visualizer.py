@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import fake_mt5
+import resampler
+import visualizer
+
+# Quinta a terça-feira: o fim de semana sem ticks fica no meio das velas
+START, END = '2024-01-04 09:17:00', '2024-01-09 18:00:00'
+
+
+@pytest.fixture(scope='module')
+def ticks():
+    df = pd.DataFrame(fake_mt5.generate_ticks('EURUSD', pd.Timestamp(START).value // 1_000_000,
+                                              pd.Timestamp(END).value // 1_000_000, interval_ms=5_000))
+    df['time'] = pd.to_datetime(df['time_msc'], unit='ms')
+    return df[['time', 'bid', 'ask']]
+
+
+@pytest.fixture(scope='module')
+def pyramid(ticks):
+    return visualizer.CandlePyramid(resampler.resample_to_ohlc(ticks, '1min'), factor=4, min_candles=16)
+
+
+def _level_frame(level):
+    time, open_, high, low, close, volume = level
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume},
+                        index=pd.DatetimeIndex(time.view('datetime64[ns]'), name='time'))
+
+
+def test_each_level_matches_resample_at_its_timeframe(ticks, pyramid):
+    assert len(pyramid.levels) >= 5
+    for number, level in enumerate(pyramid.levels):
+        minutes = 4 ** number
+        assert pyramid.widths[number] == minutes * 60 * 10 ** 9
+        expected = resampler.resample_to_ohlc(ticks, f'{minutes}min')[['open', 'high', 'low', 'close', 'volume']]
+        pd.testing.assert_frame_equal(_level_frame(level), expected.astype(np.float64), check_freq=False,
+                                      check_index_type=False)
+
+
+@pytest.mark.parametrize('start, end', [
+    ('2024-01-04 12:00', '2024-01-04 18:00'),   # algumas horas
+    ('2024-01-05 20:00', '2024-01-08 04:00'),   # atravessa o fim de semana
+    (START, END),                               # tudo
+])
+@pytest.mark.parametrize('max_candles', [16, 100, 400, 2_000])
+def test_window_picks_the_finest_level_within_the_budget(ticks, pyramid, start, end, max_candles):
+    start_ns, end_ns = pd.Timestamp(start).value, pd.Timestamp(end).value
+    number, time, *_ = pyramid.window(start_ns, end_ns, max_candles)
+
+    # Velas de cada nível no intervalo, incluindo a que começou antes dele e ainda está aberta no início
+    def candles(level):
+        labels = resampler.resample_to_ohlc(ticks, f'{4 ** level}min').index.values
+        labels = labels.astype('datetime64[ns]').view(np.int64)
+        first = max(np.searchsorted(labels, start_ns, side='right') - 1, 0)
+        return labels[first:np.searchsorted(labels, end_ns, side='right')]
+
+    np.testing.assert_array_equal(time, candles(number))
+    if number < len(pyramid.levels) - 1:
+        assert len(time) <= max_candles
+    if number > 0:
+        assert len(candles(number - 1)) > max_candles
+
+
+def test_zoom_redraws_from_the_level_that_fits_the_axes(ticks):
+    import matplotlib
+    matplotlib.use('Agg')
+
+    df = resampler.resample_to_ohlc(ticks, '1min')
+    fig = visualizer.plot_ohlc_range(df, 'EURUSD', factor=4, pixels_per_candle=2, show=False)
+    ax = fig.axes[0]
+    budget = max(int(ax.bbox.width / 2), 16)
+
+    pyramid = visualizer.CandlePyramid(df, factor=4)
+    for start, end in [(START, END), ('2024-01-04 12:00', '2024-01-04 14:00')]:
+        ax.set_xlim(pd.Timestamp(start).value / visualizer._DAY_NS, pd.Timestamp(end).value / visualizer._DAY_NS)
+        number, time, *_ = pyramid.window(pd.Timestamp(start).value, pd.Timestamp(end).value, budget)
+        label = 'original candles' if number == 0 else f'1 bar = {4 ** number} candles'
+        assert ax.get_title() == f'EURUSD - {len(time):,} bars ({label})'
+    assert 'original candles' in ax.get_title()
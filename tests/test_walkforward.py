@@ -0,0 +1,22 @@
+import pandas as pd
+
+import walkforward
+
+
+def _candles(start, end):
+    times = pd.date_range(start, end, freq='5min')
+    return times[times.dayofweek < 5]
+
+
+def test_last_window_is_partial_when_test_runs_past_data():
+    windows = walkforward.plan_windows(_candles('2024-01-01', '2024-05-15 23:55'), train_months=2, test_months=1)
+    assert [w['test_end'] for w in windows] == [pd.Timestamp('2024-04-01'), pd.Timestamp('2024-05-01'),
+                                                pd.Timestamp('2024-06-01')]
+    assert [w['partial'] for w in windows] == [False, False, True]
+
+
+def test_window_ending_with_the_data_is_complete():
+    # A última vela (sexta-feira, 23:55) fecha exatamente no fim do teste
+    windows = walkforward.plan_windows(_candles('2024-01-01', '2024-05-31 23:55'), train_months=2, test_months=1)
+    assert windows[-1]['test_end'] == pd.Timestamp('2024-06-01')
+    assert not any(w['partial'] for w in windows)
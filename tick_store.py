@@ -0,0 +1,699 @@
+# tick_store.py
+
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import metrics
+
+# Os ticks ficam particionados por ativo/ano/mês no formato "hive":
+# data/ticks/EURUSD/year=2024/month=01/ticks.parquet
+STORE_DIRNAME = 'ticks'
+PARTITION_FILENAME = 'ticks.parquet'
+
+# Chaves gravadas nos metadados de cada partição com o período efetivamente baixado
+_PERIOD_START_KEY = b'pythagoras.period_start'
+_PERIOD_END_KEY = b'pythagoras.period_end'
+
+# Chaves do cache Arrow IPC: assinatura (tamanho:mtime) do Parquet de origem e se os ticks estão em ordem
+_IPC_SOURCE_KEY = b'pythagoras.ipc_source'
+_IPC_SORTED_KEY = b'pythagoras.ipc_sorted'
+# Fator de escala dos preços em pontos inteiros (compact='int') em tabelas Arrow
+PRICE_SCALE_KEY = b'pythagoras.price_scale'
+
+# Formato das partições: 'raw' (colunas do MT5 como vieram) ou 'encoded' (veja encode_ticks)
+STORAGE_FORMATS = ('raw', 'encoded')
+# Partições 'encoded': como decodificar (JSON) e o schema Arrow original (serializado)
+_ENCODING_KEY = b'pythagoras.encoding'
+_SCHEMA_KEY = b'pythagoras.schema'
+ENCODING_VERSION = 1
+# Row groups menores que o padrão (1M) deixam o filtro de tempo descartar trechos de poucos dias
+ENCODED_ROW_GROUP_SIZE = 256 * 1024
+
+
+def asset_dir(asset, data_dir='data'):
+    """
+    Retorna o diretório raiz das partições de um ativo.
+    """
+    return os.path.join(data_dir, STORE_DIRNAME, asset)
+
+
+def partition_path(asset, year, month, data_dir='data'):
+    """
+    Retorna o caminho do arquivo Parquet da partição de um mês.
+    """
+    return os.path.join(asset_dir(asset, data_dir), f'year={year:04d}', f'month={month:02d}', PARTITION_FILENAME)
+
+
+def month_periods(start_date, end_date):
+    """
+    Divide o intervalo [start_date, end_date] em períodos mensais.
+
+    Diferente de pd.date_range(freq='MS'), o primeiro mês começa exatamente
+    em start_date mesmo que ele não seja o dia 1.
+
+    Returns:
+        list[tuple]: Tuplas (ano, mês, início do período, fim do período).
+    """
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date)
+    periods = []
+
+    period_start = start
+    while period_start < end:
+        next_month = period_start.normalize().replace(day=1) + pd.offsets.MonthBegin(1)
+        period_end = min(next_month, end)
+        periods.append((period_start.year, period_start.month, period_start, period_end))
+        period_start = period_end
+
+    return periods
+
+
+def read_partition_period(path):
+    """
+    Lê dos metadados da partição o período coberto pelo download.
+
+    Returns:
+        tuple | None: (início, fim) como pd.Timestamp, ou None se a partição não existir.
+    """
+    if not os.path.exists(path):
+        return None
+
+    metadata = pq.read_schema(path).metadata or {}
+    if _PERIOD_START_KEY not in metadata or _PERIOD_END_KEY not in metadata:
+        return None
+
+    return pd.Timestamp(metadata[_PERIOD_START_KEY].decode()), pd.Timestamp(metadata[_PERIOD_END_KEY].decode())
+
+
+def partition_covers(asset, year, month, period_start, period_end, data_dir='data'):
+    """
+    Verifica se a partição do mês já existe e cobre todo o período pedido.
+    """
+    stored = read_partition_period(partition_path(asset, year, month, data_dir))
+    if stored is None:
+        return False
+    return stored[0] <= pd.Timestamp(period_start) and stored[1] >= pd.Timestamp(period_end)
+
+
+def _neighbour_months(year, month):
+    previous_month = pd.Timestamp(year=year, month=month, day=1) - pd.offsets.MonthBegin(1)
+    next_month = pd.Timestamp(year=year, month=month, day=1) + pd.offsets.MonthBegin(1)
+    return (previous_month.year, previous_month.month), (next_month.year, next_month.month)
+
+
+def _drop_overlap(df, neighbour_path, filters):
+    """
+    Remove de df as linhas idênticas às de uma partição vizinha na região de fronteira.
+
+    Args:
+        filters (tuple): (início, fim) da região de fronteira na vizinha; None não limita.
+    """
+    if df.empty or not os.path.exists(neighbour_path):
+        return df
+
+    overlap = _read_file(neighbour_path, *filters)
+    if overlap is None:
+        return df
+    overlap = overlap.to_pandas()
+    if overlap.empty:
+        return df
+
+    columns = [c for c in df.columns if c in overlap.columns]
+    merged = df.merge(overlap[columns].drop_duplicates(), on=columns, how='left', indicator=True)
+    keep = (merged['_merge'] == 'left_only').to_numpy()
+    return df[keep]
+
+
+def storage_format():
+    """
+    Formato das partições gravadas (TICK_STORAGE_FORMAT no .env: 'raw', o padrão, ou 'encoded').
+    """
+    name = os.getenv("TICK_STORAGE_FORMAT", "raw").lower()
+    if name not in STORAGE_FORMATS:
+        raise ValueError(f"Unknown tick storage format '{name}'. Use 'raw' or 'encoded'.")
+    return name
+
+
+def _price_digits(values, max_digits=8):
+    """
+    Menor número de casas decimais com que os preços voltam exatamente ao float original.
+
+    Returns:
+        tuple: (casas decimais, pontos inteiros em int64), ou (None, None) se nenhuma servir.
+    """
+    for digits in range(max_digits + 1):
+        scale = 10 ** digits
+        points = np.round(values * scale)
+        if np.array_equal(points / scale, values):
+            return digits, points.astype(np.int64)
+    return None, None
+
+
+def encode_ticks(table):
+    """
+    Converte os ticks do MT5 para o formato 'encoded', sem perda de informação:
+
+    - bid/ask/last viram pontos inteiros na precisão do ativo (detectada nos próprios
+      preços; a coluna fica em float se algum preço não voltar exato), e o ask é
+      gravado como o spread em pontos, que se repete muito e comprime bem melhor;
+    - 'time' (segundos) é descartada quando é só time_msc truncado, e time_msc é
+      gravado com DELTA_BINARY_PACKED (as diferenças entre ticks cabem em poucos bits);
+    - colunas só com zeros (last, volume, volume_real no forex) não são gravadas.
+
+    O schema original vai nos metadados, para que a leitura devolva exatamente as
+    mesmas colunas e tipos do formato 'raw' (veja _decode_table).
+
+    Returns:
+        tuple: (tabela codificada, encodings por coluna para pq.write_table).
+    """
+    encoding = {'version': ENCODING_VERSION, 'time_from_msc': False, 'prices': {}, 'zeros': [],
+                'ask_as_spread': False}
+    column_encoding = {}
+    columns = {}
+
+    for field in table.schema:
+        name, column = field.name, table.column(field.name)
+        values = column.to_numpy()
+
+        if name == 'time' and 'time_msc' in table.column_names:
+            seconds = values.astype('datetime64[s]').view(np.int64)
+            if np.array_equal(seconds, table.column('time_msc').to_numpy() // 1000):
+                encoding['time_from_msc'] = True
+                continue
+
+        if pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+            if name != 'time_msc' and column.null_count == 0 and not values.any():
+                encoding['zeros'].append(name)
+                continue
+
+        if name in ('bid', 'ask', 'last') and pa.types.is_floating(field.type) and column.null_count == 0:
+            digits, points = _price_digits(values.astype(np.float64))
+            if digits is not None:
+                encoding['prices'][name] = digits
+                if name == 'ask' and encoding['prices'].get('bid') == digits:
+                    points = points - bid_points
+                    encoding['ask_as_spread'] = True
+                elif name == 'bid':
+                    bid_points = points
+                int32 = len(points) == 0 or np.abs(points).max() < 2 ** 31
+                column = pa.array(points.astype(np.int32) if int32 else points)
+
+        if name in ('time', 'time_msc') or (name in encoding['prices'] and
+                                            not (name == 'ask' and encoding['ask_as_spread'])):
+            column_encoding[name] = 'DELTA_BINARY_PACKED'
+        columns[name] = column
+
+    metadata = dict(table.schema.metadata or {})
+    metadata.pop(b'pandas', None)
+    metadata[_ENCODING_KEY] = json.dumps(encoding).encode()
+    # O Parquet não tem timestamp em segundos e grava em ms: o formato 'raw' é lido assim
+    schema = pa.schema([pa.field(field.name, pa.timestamp('ms', field.type.tz))
+                        if pa.types.is_timestamp(field.type) and field.type.unit == 's' else field
+                        for field in table.schema])
+    metadata[_SCHEMA_KEY] = schema.serialize().to_pybytes()
+    return pa.table(columns).replace_schema_metadata(metadata), column_encoding
+
+
+def _write_encoded(table, path):
+    encoded, column_encoding = encode_ticks(table)
+    dictionary_columns = [name for name in encoded.column_names if name not in column_encoding]
+    pq.write_table(encoded, path, compression='zstd', row_group_size=ENCODED_ROW_GROUP_SIZE,
+                   use_dictionary=dictionary_columns, column_encoding=column_encoding)
+
+
+def _read_encoding(path):
+    """
+    Returns:
+        tuple | None: (encoding, schema original) de uma partição 'encoded', ou None se ela for 'raw'.
+    """
+    metadata = pq.read_schema(path).metadata or {}
+    if _ENCODING_KEY not in metadata:
+        return None
+    encoding = json.loads(metadata[_ENCODING_KEY])
+    if encoding['version'] > ENCODING_VERSION:
+        raise ValueError(f"{path} uses tick encoding version {encoding['version']}; please update the code.")
+    return encoding, pa.ipc.read_schema(pa.py_buffer(metadata[_SCHEMA_KEY]))
+
+
+def _stored_columns(encoding, schema, columns):
+    # Colunas do arquivo necessárias para montar as colunas pedidas
+    stored = []
+    for name in columns:
+        needed = [name]
+        if name == 'time' and encoding['time_from_msc']:
+            needed = ['time_msc']
+        elif name == 'ask' and encoding.get('ask_as_spread'):
+            needed = ['bid', 'ask']
+        stored += [column for column in needed if column not in encoding['zeros'] and column not in stored]
+    return stored
+
+
+def _decode_table(table, encoding, schema, columns):
+    """
+    Reconstrói, a partir das colunas lidas de uma partição 'encoded', as colunas
+    pedidas com os mesmos valores e tipos do formato 'raw'.
+    """
+    arrays = []
+    for name in columns:
+        field = schema.field(name)
+        if name == 'time' and encoding['time_from_msc']:
+            # Segundos inteiros, já na unidade do schema original (sem conversão pelo pyarrow)
+            unit = field.type.unit
+            seconds = table.column('time_msc').to_numpy() // 1000
+            if unit != 's':
+                seconds *= {'ms': 10 ** 3, 'us': 10 ** 6, 'ns': 10 ** 9}[unit]
+            column = pa.array(seconds.view(f'datetime64[{unit}]'), type=field.type)
+        elif name in encoding['zeros']:
+            column = pa.array(np.zeros(table.num_rows, dtype=field.type.to_pandas_dtype()), type=field.type)
+        elif name in encoding['prices']:
+            points = table.column(name).to_numpy()
+            if name == 'ask' and encoding.get('ask_as_spread'):
+                points = points.astype(np.int64) + table.column('bid').to_numpy()
+            column = pa.array(points / 10 ** encoding['prices'][name]).cast(field.type)
+        else:
+            column = table.column(name)
+        arrays.append(column)
+    return pa.Table.from_arrays(arrays, schema=pa.schema([schema.field(name) for name in columns]))
+
+
+def write_partition(asset, year, month, df, period_start, period_end, data_dir='data', storage=None):
+    """
+    Grava os ticks de um mês como uma partição, removendo apenas as duplicatas
+    de fronteira com os meses vizinhos já gravados.
+
+    Args:
+        asset (str): O ativo.
+        year (int), month (int): A partição de destino.
+        df (pd.DataFrame): Ticks do mês, com a coluna 'time' já convertida para datetime.
+        period_start, period_end: O período efetivamente coberto pelo download.
+        storage (str | None): 'raw' ou 'encoded' (padrão: storage_format()).
+
+    Returns:
+        int: Quantidade de ticks gravados.
+    """
+    df = df.sort_values('time', kind='stable')
+
+    if not df.empty:
+        (prev_year, prev_month), (next_year, next_month) = _neighbour_months(year, month)
+        # Os lotes do MT5 incluem os ticks do instante final, que reaparecem no lote seguinte
+        df = _drop_overlap(df, partition_path(asset, prev_year, prev_month, data_dir),
+                           (df['time'].iloc[0], None))
+    if not df.empty:
+        df = _drop_overlap(df, partition_path(asset, next_year, next_month, data_dir),
+                           (None, df['time'].iloc[-1]))
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[_PERIOD_START_KEY] = pd.Timestamp(period_start).isoformat().encode()
+    metadata[_PERIOD_END_KEY] = pd.Timestamp(period_end).isoformat().encode()
+    table = table.replace_schema_metadata(metadata)
+
+    path = partition_path(asset, year, month, data_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Grava em um arquivo temporário e troca no final para nunca deixar uma partição pela metade
+    # (o prefixo '.' faz o pyarrow.dataset ignorá-lo durante a escrita)
+    tmp_path = os.path.join(os.path.dirname(path), '.' + PARTITION_FILENAME + '.tmp')
+    if (storage or storage_format()) == 'encoded':
+        _write_encoded(table, tmp_path)
+    else:
+        pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+    return len(df)
+
+
+def convert_partition(path, storage):
+    """
+    Regrava uma partição existente no formato pedido ('raw' ou 'encoded'),
+    mantendo o período baixado nos metadados.
+
+    Returns:
+        tuple: (tamanho antes, tamanho depois) em bytes.
+    """
+    size_before = os.path.getsize(path)
+    table = _read_file(path)
+    metadata = dict(pq.read_schema(path).metadata or {})
+    period = {key: metadata[key] for key in (_PERIOD_START_KEY, _PERIOD_END_KEY) if key in metadata}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **period})
+
+    tmp_path = os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + '.tmp')
+    if storage == 'encoded':
+        _write_encoded(table, tmp_path)
+    else:
+        pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+    return size_before, os.path.getsize(path)
+
+
+# Colunas necessárias para resample e backtest; o restante do MT5 raramente é usado
+PRICE_COLUMNS = ['time', 'bid', 'ask']
+
+
+def _partition_files(asset, start_date, end_date, data_dir):
+    """
+    Arquivos com os ticks do intervalo: as partições mensais existentes ou, se o
+    ativo ainda não tiver partições, o arquivo monolítico antigo
+    '{ASSET}-{START}-{END}.parquet' gerado pelas versões anteriores do download.
+    """
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date)
+
+    if os.path.isdir(asset_dir(asset, data_dir)):
+        paths = [partition_path(asset, period.year, period.month, data_dir)
+                 for period in pd.period_range(start, end, freq='M')]
+    else:
+        paths = [os.path.join(data_dir, f"{asset}-{start_date}-{end_date}.parquet")]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def _file_source(path, start=None, end=None, columns=None):
+    """
+    Prepara a leitura de um arquivo de ticks em qualquer formato, com o filtro de
+    tempo que o pyarrow aplica sobre as estatísticas de cada row group antes de
+    ler os dados.
+
+    Returns:
+        tuple: (dataset, colunas gravadas a ler, filtro, função que decodifica a
+            tabela lida nas colunas pedidas ou None no formato 'raw').
+    """
+    dataset = ds.dataset(path, format='parquet')
+    encoded = _read_encoding(path)
+
+    if encoded is None:
+        if columns is None:
+            columns = dataset.schema.names
+        time_field, time_type = 'time', dataset.schema.field('time').type
+        lower, upper = start, end
+        decode = None
+    else:
+        encoding, schema = encoded
+        if columns is None:
+            columns = schema.names
+        stored = _stored_columns(encoding, schema, columns)
+        decode = lambda table, columns=list(columns): _decode_table(table, encoding, schema, columns)
+        if encoding['time_from_msc']:
+            # 'time' é time_msc truncado no segundo: time em [start, end] <=> time_msc em
+            # [start arredondado para cima, fim do segundo de end]
+            time_field, time_type = 'time_msc', pa.int64()
+            lower = None if start is None else -(-pd.Timestamp(start).value // 10 ** 9) * 1000
+            upper = None if end is None else pd.Timestamp(end).value // 10 ** 9 * 1000 + 999
+        else:
+            time_field, time_type = 'time', dataset.schema.field('time').type
+            lower, upper = start, end
+        columns = stored
+
+    row_filter = None
+    if lower is not None:
+        row_filter = ds.field(time_field) >= pa.scalar(lower, type=time_type)
+    if upper is not None:
+        upper_filter = ds.field(time_field) <= pa.scalar(upper, type=time_type)
+        row_filter = upper_filter if row_filter is None else row_filter & upper_filter
+    return dataset, columns, row_filter, decode
+
+
+def _read_file(path, start=None, end=None, columns=None):
+    """
+    Lê os ticks de um arquivo (já decodificados) no intervalo [start, end].
+    """
+    if not os.path.exists(path):
+        return None
+    dataset, stored, row_filter, decode = _file_source(path, start, end, columns)
+    table = dataset.to_table(columns=stored, filter=row_filter)
+    return table if decode is None else decode(table)
+
+
+def _open_sources(asset, start_date, end_date, data_dir, columns):
+    """
+    Returns:
+        list | None: Um _file_source por arquivo do intervalo, ou None se não houver dados para o ativo.
+    """
+    paths = _partition_files(asset, start_date, end_date, data_dir)
+    if not paths:
+        return None
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    return [_file_source(path, start, end, columns) for path in paths]
+
+
+def _compact_table(table, compact, price_digits):
+    """
+    Converte os preços para uma representação menor antes de criar o DataFrame.
+
+    'float32' usa float32; 'int' guarda pontos inteiros (preço * 10**price_digits),
+    em int32 quando cabem, com os preços NaN como nulos. O tempo fica sempre em datetime64[ns] (int64 em ns).
+    """
+    if 'time' in table.column_names:
+        table = table.set_column(table.column_names.index('time'), 'time',
+                                 table.column('time').cast(pa.timestamp('ns')))
+
+    for name in ('bid', 'ask', 'last'):
+        if name not in table.column_names:
+            continue
+        column = table.column(name)
+        if compact == 'float32':
+            column = column.cast(pa.float32())
+        elif compact == 'int':
+            points = pc.round(pc.multiply(column, 10 ** price_digits))
+            # Inteiros não representam NaN: o preço ausente vira nulo (NaN de novo ao converter para numpy)
+            points = pc.if_else(pc.is_nan(points), pa.scalar(None, points.type), points)
+            max_points = pc.max(pc.abs(points)).as_py() or 0
+            column = points.cast(pa.int32() if max_points < 2 ** 31 else pa.int64())
+        else:
+            raise ValueError(f"Unknown compact representation '{compact}'. Use 'float32' or 'int'.")
+        table = table.set_column(table.column_names.index(name), name, column)
+
+    return table
+
+
+def ipc_cache_enabled():
+    """
+    Indica se o cache Arrow IPC está ativo (TICK_IPC_CACHE=1 no .env).
+    """
+    return os.getenv("TICK_IPC_CACHE", "0") == "1"
+
+
+def ipc_cache_path(parquet_path):
+    """
+    Caminho do cache Arrow IPC de um arquivo Parquet, ao lado dele (o prefixo '.'
+    faz o pyarrow.dataset ignorá-lo ao ler o diretório da partição).
+    """
+    directory, name = os.path.split(parquet_path)
+    return os.path.join(directory, f'.{name}.arrow')
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return f'{stat.st_size}:{stat.st_mtime_ns}'.encode()
+
+
+def _read_ipc(cache_path):
+    # Com memory map, os buffers da tabela apontam direto para o arquivo (sem cópia)
+    try:
+        return pa.ipc.open_file(pa.memory_map(cache_path, 'r')).read_all()
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+
+def open_ipc_cache(parquet_path):
+    """
+    Abre, com memory map, a cópia Arrow IPC (Feather v2, sem compressão) de um
+    arquivo Parquet de ticks, criando-a ou refazendo-a se o Parquet mudou.
+
+    Como os dados são lidos direto do arquivo mapeado, leituras repetidas não
+    descomprimem nada e processos diferentes compartilham as mesmas páginas
+    do cache do sistema operacional em vez de cada um ter sua cópia.
+
+    Returns:
+        pa.Table: Todos os ticks do arquivo, com os buffers no arquivo mapeado.
+    """
+    cache_path = ipc_cache_path(parquet_path)
+    signature = _source_signature(parquet_path)
+
+    table = _read_ipc(cache_path)
+    if table is not None and (table.schema.metadata or {}).get(_IPC_SOURCE_KEY) == signature:
+        return table
+
+    with metrics.stage('ipc_build'):
+        # Um único bloco por coluna, para que as colunas virem arrays numpy sem cópia
+        # (partições 'encoded' são decodificadas: o cache guarda sempre o formato 'raw')
+        table = _read_file(parquet_path).combine_chunks()
+        times = table.column('time').chunk(0).to_numpy() if table.num_rows else np.array([])
+        is_sorted = bool(len(times) < 2 or (times[1:] >= times[:-1]).all())
+
+        metadata = dict(table.schema.metadata or {})
+        metadata[_IPC_SOURCE_KEY] = signature
+        metadata[_IPC_SORTED_KEY] = b'1' if is_sorted else b'0'
+        table = table.replace_schema_metadata(metadata)
+
+        # Nome temporário por processo: dois processos podem criar o mesmo cache ao mesmo tempo
+        tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+        try:
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # Disco cheio, ou (no Windows) um arquivo mapeado por outro processo não pode ser substituído:
+            # segue com a tabela em memória, sem o cache
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return table
+
+    # Se o arquivo recém-gravado não puder ser lido (truncado, substituído no meio), usa a tabela em memória
+    mapped = _read_ipc(cache_path)
+    return mapped if mapped is not None else table
+
+
+def _slice_period(table, start, end):
+    """
+    Recorta da tabela os ticks em [start, end]; com os ticks em ordem, é só uma fatia (sem cópia).
+    """
+    if table.num_rows == 0:
+        return table
+
+    times = table.column('time').chunk(0).to_numpy()
+    # Compara como int64 na unidade da coluna (o searchsorted com datetime64 é bem mais lento)
+    unit = np.datetime_data(times.dtype)[0]
+    times = times.view(np.int64)
+    start = start.to_datetime64().astype(f'datetime64[{unit}]').view(np.int64)
+    end = end.to_datetime64().astype(f'datetime64[{unit}]').view(np.int64)
+    if (table.schema.metadata or {}).get(_IPC_SORTED_KEY) == b'1':
+        first = np.searchsorted(times, start, side='left')
+        last = np.searchsorted(times, end, side='right')
+        return table.slice(first, last - first)
+    return table.filter(pa.array((times >= start) & (times <= end)))
+
+
+def _ipc_table(asset, start_date, end_date, data_dir, columns):
+    """
+    Monta a tabela dos ticks do intervalo a partir dos caches Arrow IPC das
+    partições (ou do arquivo legado), criando os que faltarem.
+
+    Returns:
+        pa.Table | None: Os ticks (fatias dos arquivos mapeados), ou None se não houver dados.
+    """
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date)
+
+    paths = _partition_files(asset, start_date, end_date, data_dir)
+    if not paths:
+        return None
+
+    tables = []
+    for path in paths:
+        # O recorte usa a coluna 'time', então vem antes da seleção das colunas
+        table = _slice_period(open_ipc_cache(path), start, end)
+        if columns is not None:
+            table = table.select(columns)
+        tables.append(table)
+    return pa.concat_tables(tables)
+
+
+def load_ticks(asset, start_date, end_date, data_dir='data', columns=None, compact=None, price_digits=None,
+               ipc_cache=None, as_arrow=False):
+    """
+    Carrega os ticks de um ativo no intervalo [start_date, end_date] a partir do
+    armazenamento particionado, para qualquer intervalo de datas.
+
+    Só as colunas pedidas são lidas, e os row groups fora do intervalo são
+    descartados pelas estatísticas do Parquet, sem serem descomprimidos.
+    Partições no formato 'encoded' são decodificadas de forma transparente.
+
+    Se o ativo ainda não tiver partições, tenta o arquivo monolítico antigo
+    '{ASSET}-{START}-{END}.parquet' gerado pelas versões anteriores do download.
+
+    Args:
+        asset (str): O ativo.
+        start_date, end_date: Limites do intervalo (inclusivos).
+        columns (list | None): Colunas a carregar (todas por padrão; veja PRICE_COLUMNS).
+        compact (str | None): Representação compacta opcional dos preços: 'float32' ou 'int'.
+        price_digits (int | None): Casas decimais do ativo para compact='int'
+            (padrão: PRICE_DIGITS do .env, ou 5).
+        ipc_cache (bool | None): Lê pelo cache Arrow IPC mapeado em memória
+            (padrão: TICK_IPC_CACHE do .env; veja open_ipc_cache).
+        as_arrow (bool): Devolve a pa.Table em vez do DataFrame. Com o cache IPC
+            e sem compact, as colunas continuam no arquivo mapeado (sem cópia).
+
+    Returns:
+        pd.DataFrame | pa.Table | None: Os ticks ordenados por tempo, ou None se não houver dados.
+            Com compact='int', df.attrs['price_scale'] (ou PRICE_SCALE_KEY nos
+            metadados da tabela) guarda o fator de escala.
+    """
+    if ipc_cache is None:
+        ipc_cache = ipc_cache_enabled()
+
+    if ipc_cache:
+        with metrics.stage('ipc_read'):
+            table = _ipc_table(asset, start_date, end_date, data_dir, columns)
+    else:
+        sources = _open_sources(asset, start_date, end_date, data_dir, columns)
+        if sources is None:
+            return None
+        with metrics.stage('parquet_read'):
+            tables = []
+            for dataset, stored, row_filter, decode in sources:
+                table = dataset.to_table(columns=stored, filter=row_filter)
+                tables.append(table if decode is None else decode(table))
+            table = pa.concat_tables(tables)
+
+    if table is None or table.num_rows == 0:
+        return None
+    metrics.count('ticks_loaded', table.num_rows)
+
+    if compact:
+        if price_digits is None:
+            price_digits = int(os.getenv("PRICE_DIGITS", 5))
+        table = _compact_table(table, compact, price_digits)
+        if compact == 'int':
+            metadata = dict(table.schema.metadata or {})
+            metadata[PRICE_SCALE_KEY] = str(10 ** price_digits).encode()
+            table = table.replace_schema_metadata(metadata)
+
+    if as_arrow:
+        return table
+
+    df = table.to_pandas()
+    if compact == 'int':
+        df.attrs['price_scale'] = 10 ** price_digits
+    return df
+
+
+def scan_ticks(asset, start_date, end_date, data_dir='data', columns=None, batch_size=1_000_000):
+    """
+    Percorre os ticks do intervalo em lotes Arrow (RecordBatch), em ordem cronológica,
+    sem carregar o histórico inteiro na memória.
+
+    Args:
+        asset (str): O ativo.
+        start_date, end_date: Limites do intervalo (inclusivos).
+        columns (list | None): Colunas a ler (todas por padrão).
+        batch_size (int): Número máximo de ticks por lote.
+
+    Returns:
+        Iterator[pa.RecordBatch] | None: Os lotes, ou None se não houver dados para o ativo.
+    """
+    if ipc_cache_enabled():
+        table = _ipc_table(asset, start_date, end_date, data_dir, columns)
+        if table is None:
+            return None
+        return metrics.timed_iter(table.to_batches(max_chunksize=batch_size), 'ipc_read', counter='ticks_loaded')
+
+    sources = _open_sources(asset, start_date, end_date, data_dir, columns)
+    if sources is None:
+        return None
+
+    return metrics.timed_iter(_scan_sources(sources, batch_size), 'parquet_read', counter='ticks_loaded')
+
+
+def _scan_sources(sources, batch_size):
+    for dataset, stored, row_filter, decode in sources:
+        for batch in dataset.to_batches(columns=stored, filter=row_filter, batch_size=batch_size):
+            if decode is None:
+                yield batch
+            else:
+                yield from decode(pa.Table.from_batches([batch], schema=batch.schema)).to_batches()
@@ -1,4 +1,8 @@
-import mplfinance as mpf
+import numpy as np
+import pandas as pd
+
+_DAY_NS = 86_400 * 1_000_000_000
+
 
 def plot_ohlc(df, asset_name='Asset'):
     """
@@ -8,6 +12,8 @@ def plot_ohlc(df, asset_name='Asset'):
         df (pd.DataFrame): DataFrame com colunas 'open', 'high', 'low', 'close', 'volume'.
         asset_name (str): O nome do ativo para usar no título do gráfico.
     """
+    import mplfinance as mpf  # Só este gráfico usa o mplfinance
+
     print("Generating plot...")
     
     # Plota os últimos 100 candles para uma visualização mais limpa
@@ -21,4 +27,185 @@ def plot_ohlc(df, asset_name='Asset'):
              volume=True,
              panel_ratios=(3, 1))
              
-    print("Plot window opened. Close the window to continue.")
\ No newline at end of file
+    print("Plot window opened. Close the window to continue.")
+
+
+class CandlePyramid:
+    """
+    Pirâmide de resoluções das velas: o nível 0 são as velas originais e cada
+    nível seguinte agrupa as velas do anterior em períodos `factor` vezes mais
+    longos (abertura da primeira, fechamento da última, máxima das máximas,
+    mínima das mínimas e soma do volume). Máximas e mínimas são preservadas em
+    todos os níveis, então picos e quedas continuam visíveis em qualquer zoom.
+
+    Os períodos contam a partir da meia-noite do primeiro dia, como no resample
+    do pandas (origin='start_day'), e períodos sem velas (fins de semana) não
+    geram barras: cada nível é o mesmo que resample_to_ohlc com a duração dele.
+    """
+
+    def __init__(self, df, factor=4, min_candles=256):
+        self.factor = factor
+        time = df.index.values.astype('datetime64[ns]').view(np.int64)
+        volume = df['volume'].to_numpy(np.float64) if 'volume' in df.columns else np.zeros(len(df))
+        level = (time, df['open'].to_numpy(np.float64), df['high'].to_numpy(np.float64),
+                 df['low'].to_numpy(np.float64), df['close'].to_numpy(np.float64), volume)
+        self.levels = [level]
+
+        # Duração das velas originais: o menor intervalo entre duas delas
+        steps = np.diff(time)
+        width = int(steps[steps > 0].min()) if (steps > 0).any() else _DAY_NS
+        self.origin = int(time[0] - time[0] % _DAY_NS) if len(time) else 0
+        self.widths = [width]
+
+        while len(level[0]) > min_candles:
+            width *= factor
+            level = self._aggregate(level, width)
+            self.levels.append(level)
+            self.widths.append(width)
+
+    def _aggregate(self, level, width):
+        time, open_, high, low, close, volume = level
+        periods = (time - self.origin) // width
+        starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+        ends = np.r_[starts[1:], len(time)] - 1
+        return (self.origin + periods[starts] * width, open_[starts], np.maximum.reduceat(high, starts),
+                np.minimum.reduceat(low, starts), close[ends], np.add.reduceat(volume, starts))
+
+    def window(self, start_ns, end_ns, max_candles):
+        """
+        Velas do intervalo no nível mais detalhado que cabe em `max_candles`.
+
+        Returns:
+            tuple: (nível, time, open, high, low, close, volume), com os arrays já recortados.
+        """
+        for number, level in enumerate(self.levels):
+            time = level[0]
+            # Inclui a vela que começou antes do intervalo e ainda está aberta no início dele
+            first = max(np.searchsorted(time, start_ns, side='right') - 1, 0)
+            last = np.searchsorted(time, end_ns, side='right')
+            if last - first <= max_candles or number == len(self.levels) - 1:
+                return (number, *(values[first:last] for values in level))
+
+
+def _to_days(time_ns):
+    # Datas do matplotlib são dias desde 1970-01-01 (época padrão desde a versão 3.3)
+    return np.asarray(time_ns, dtype=np.int64) / _DAY_NS
+
+
+def _candle_width(time_ns):
+    if len(time_ns) < 2:
+        return 0.5 / 24 / 60
+    return float(np.median(np.diff(time_ns))) / _DAY_NS * 0.7
+
+
+def _trade_markers(ax, trades):
+    # Entradas: triângulo para cima (compra) ou para baixo (venda); saídas: 'x' verde (ganho) ou vermelho (perda)
+    trades = trades.dropna(subset=['exit_time', 'exit_price'])
+    entry_days = _to_days(pd.to_datetime(trades['entry_time']).values.astype('datetime64[ns]').view(np.int64))
+    exit_days = _to_days(pd.to_datetime(trades['exit_time']).values.astype('datetime64[ns]').view(np.int64))
+    buys = (trades['type'] == 'buy').to_numpy()
+    won = (trades['pnl_points'] > 0).to_numpy()
+
+    ax.scatter(entry_days[buys], trades['entry_price'][buys], marker='^', color='tab:blue', s=30, zorder=3,
+               label='Buy entry')
+    ax.scatter(entry_days[~buys], trades['entry_price'][~buys], marker='v', color='tab:orange', s=30, zorder=3,
+               label='Sell entry')
+    ax.scatter(exit_days[won], trades['exit_price'][won], marker='x', color='green', s=30, zorder=3,
+               label='Exit (win)')
+    ax.scatter(exit_days[~won], trades['exit_price'][~won], marker='x', color='red', s=30, zorder=3,
+               label='Exit (loss)')
+    ax.legend(loc='upper left', fontsize='small')
+
+
+def plot_ohlc_range(df, asset_name='Asset', trades=None, start=None, end=None, factor=4, pixels_per_candle=2,
+                    show=True):
+    """
+    Plota qualquer intervalo de velas, inclusive anos inteiros, reagrupando-as à
+    resolução da tela a partir de uma CandlePyramid. Ao dar zoom ou arrastar o
+    gráfico, as velas são recalculadas a partir do nível adequado da pirâmide.
+
+    Args:
+        df (pd.DataFrame): Velas OHLC indexadas pelo tempo (colunas 'open', 'high', 'low', 'close', 'volume').
+        asset_name (str): O nome do ativo para o título.
+        trades (pd.DataFrame | None): Operações de backtester.run_backtest, marcadas sobre o preço.
+        start, end: Intervalo mostrado inicialmente (todo o DataFrame por padrão).
+        factor (int): Quantas velas de um nível formam uma vela do nível seguinte.
+        pixels_per_candle (int): Largura mínima, em pixels, de cada vela desenhada.
+        show (bool): Abre a janela do gráfico (False para só montar a figura).
+
+    Returns:
+        matplotlib.figure.Figure | None: A figura montada, ou None se não houver velas.
+    """
+    if df.empty:
+        print("ERROR: No candles to plot.")
+        return None
+
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+
+    print("Generating plot...")
+    pyramid = CandlePyramid(df, factor=factor)
+
+    fig, (ax, ax_volume) = plt.subplots(2, 1, sharex=True, figsize=(14, 8), gridspec_kw={'height_ratios': (3, 1)})
+    ax.xaxis_date()
+    wicks = LineCollection([], linewidths=0.8, zorder=2)
+    bodies = LineCollection([], zorder=2)
+    ax.add_collection(wicks)
+    ax.add_collection(bodies)
+    volume_bars = LineCollection([], colors='tab:gray', zorder=2)
+    ax_volume.add_collection(volume_bars)
+    ax.set_ylabel('Price')
+    ax_volume.set_ylabel('Volume')
+
+    if trades is not None and not trades.empty:
+        _trade_markers(ax, trades)
+
+    def redraw(x_min, x_max):
+        max_candles = max(int(ax.bbox.width / pixels_per_candle), 16)
+        number, time, open_, high, low, close, volume = pyramid.window(
+            int(x_min * _DAY_NS), int(x_max * _DAY_NS), max_candles)
+        if len(time) == 0:
+            return
+
+        days = _to_days(time)
+        width = _candle_width(time)
+        # Largura do corpo em pontos: proporcional ao espaço de cada vela na tela
+        body_points = max(ax.bbox.width / max((x_max - x_min) / width, 1) * 72 / fig.dpi, 1)
+        colors = np.where(close >= open_, 'green', 'red')
+
+        wicks.set_segments(np.stack([np.column_stack([days, low]), np.column_stack([days, high])], axis=1))
+        wicks.set_color(colors)
+        bodies.set_segments(np.stack([np.column_stack([days, open_]), np.column_stack([days, close])], axis=1))
+        bodies.set_color(colors)
+        bodies.set_linewidth(body_points)
+        volume_bars.set_segments(np.stack([np.column_stack([days, np.zeros(len(days))]),
+                                           np.column_stack([days, volume])], axis=1))
+        volume_bars.set_linewidth(body_points)
+
+        visible = (days >= x_min - width) & (days <= x_max + width)
+        if visible.any():
+            low_visible, high_visible = low[visible].min(), high[visible].max()
+            margin = (high_visible - low_visible) * 0.05 or abs(high_visible) * 0.001 or 1
+            ax.set_ylim(low_visible - margin, high_visible + margin)
+            ax_volume.set_ylim(0, max(volume[visible].max(), 1) * 1.05)
+
+        level_label = 'original candles' if number == 0 else f'1 bar = {factor ** number} candles'
+        ax.set_title(f'{asset_name} - {len(time):,} bars ({level_label})')
+
+    def on_xlim_changed(axes):
+        redraw(*axes.get_xlim())
+        fig.canvas.draw_idle()
+
+    first_ns = pyramid.levels[0][0][0]
+    last_ns = pyramid.levels[0][0][-1]
+    x_min = _to_days(pd.Timestamp(start).value if start is not None else first_ns)
+    x_max = _to_days(pd.Timestamp(end).value if end is not None else last_ns)
+    redraw(x_min, x_max)
+    ax.set_xlim(x_min, x_max)
+    ax.callbacks.connect('xlim_changed', on_xlim_changed)
+    fig.autofmt_xdate()
+
+    if show:
+        print("Plot window opened. Zoom or pan to re-aggregate the candles; close the window to continue.")
+        plt.show()
+    return fig
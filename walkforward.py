@@ -0,0 +1,164 @@
+# walkforward.py
+
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+import backtester
+import optimizer
+import strategies
+
+# Estado de cada processo do pool, preenchido pelo initializer
+_worker = {}
+_SIGNALS_CACHE_SIZE = 32
+
+
+def plan_windows(candle_times, train_months=6, test_months=1, candle=None):
+    """
+    Planeja as janelas da análise walk-forward sobre todo o histórico.
+
+    Cada janela otimiza em [train_start, train_end) e testa em [test_start, test_end),
+    logo em seguida; a próxima janela anda `test_months` meses. A janela cujo
+    teste passa do fim do histórico (a última vela mais a duração `candle`, por
+    padrão o menor intervalo entre as velas) é marcada com 'partial'.
+
+    Returns:
+        list[dict]: As janelas, na ordem do tempo.
+    """
+    first = pd.Timestamp(candle_times[0]).normalize()
+    last = pd.Timestamp(candle_times[-1])
+    if candle is None:
+        gaps = np.diff(np.asarray(candle_times, dtype='datetime64[ns]'))
+        candle = pd.Timedelta(gaps.min()) if len(gaps) else pd.Timedelta(0)
+    windows = []
+
+    train_start = first
+    while True:
+        train_end = train_start + pd.DateOffset(months=train_months)
+        test_end = train_end + pd.DateOffset(months=test_months)
+        if train_end > last:
+            break
+        windows.append({
+            'window': len(windows) + 1,
+            'train_start': train_start, 'train_end': train_end,
+            'test_start': train_end, 'test_end': test_end,
+            'partial': test_end > last + candle,
+        })
+        train_start = train_start + pd.DateOffset(months=test_months)
+
+    return windows
+
+
+def _init_worker(spec):
+    blocks, arrays = optimizer.attach_arrays(spec)
+    _worker['blocks'] = blocks
+    _worker['ohlc'], _worker['ticks'] = optimizer.market_data_from_arrays(arrays)
+    _worker['signals'] = OrderedDict()
+
+
+def _signals_for(strategy_kwargs):
+    """
+    Sinais da estratégia sobre o histórico inteiro, calculados uma vez por processo
+    e reaproveitados por todas as janelas (junto com os offsets das velas nos ticks).
+    """
+    key = tuple(sorted(strategy_kwargs.items()))
+    cache = _worker['signals']
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+
+    signals = strategies.moving_average_crossover(_worker['ohlc'], verbose=False, **strategy_kwargs)
+    offsets = backtester.build_candle_offsets(_worker['ticks'], signals.index)
+    times = backtester._to_ns(signals.index)
+
+    cache[key] = (signals, offsets, times)
+    if len(cache) > _SIGNALS_CACHE_SIZE:
+        cache.popitem(last=False)
+    return cache[key]
+
+
+def _evaluate(task):
+    window, start_ns, end_ns, params, keep_trades = task
+    strategy_kwargs = {optimizer.STRATEGY_PARAMS[k]: v for k, v in params.items() if k in optimizer.STRATEGY_PARAMS}
+    backtest_kwargs = {optimizer.BACKTEST_PARAMS[k]: v for k, v in params.items() if k in optimizer.BACKTEST_PARAMS}
+
+    signals, offsets, times = _signals_for(strategy_kwargs)
+    # A janela é só um intervalo de posições sobre os arrays já prontos
+    first, last = np.searchsorted(times, [start_ns, end_ns], side='left')
+    results = backtester.simulate_signals(signals.iloc[first:last], _worker['ticks'], offsets=offsets[first:last],
+                                          verbose=False, **backtest_kwargs)
+
+    return window, params, backtester.summarize_results(results), results if keep_trades else None
+
+
+def _best(rows, rank_by):
+    ascending = rank_by == 'max_drawdown_usd'
+    return sorted(rows, key=lambda row: row[1][rank_by], reverse=not ascending)[0]
+
+
+def run_walkforward(df_ohlc, df_ticks, grid, train_months=6, test_months=1, max_workers=None, rank_by='pnl_usd'):
+    """
+    Análise walk-forward: otimiza a grade na janela N e testa os melhores
+    parâmetros na janela seguinte, rolando por todo o histórico.
+
+    Os dados vão uma única vez para a memória compartilhada; cada processo
+    calcula os sinais de uma combinação uma única vez sobre o histórico inteiro
+    (com os indicadores vindos do cache) e cada janela apenas recorta, por
+    posição, os sinais e os offsets já calculados. As janelas são independentes
+    e rodam em paralelo.
+
+    Returns:
+        tuple: (resultado por janela, operações fora da amostra costuradas ou None, resumo fora da amostra).
+    """
+    optimizer.check_metric(rank_by)
+    windows = plan_windows(df_ohlc.index, train_months, test_months)
+    combinations = optimizer.build_combinations(grid)
+    if not windows or not combinations:
+        return pd.DataFrame(), None, backtester.summarize_results(None)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    to_ns = backtester._to_ns
+
+    # Combinação por fora e janelas por dentro: cada pedaço enviado a um processo reaproveita os mesmos sinais
+    train_tasks = [(w['window'], to_ns(w['train_start']), to_ns(w['train_end']), params, False)
+                   for params in combinations for w in windows]
+
+    blocks, spec = optimizer.share_market_data(df_ohlc, df_ticks)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(spec,)) as executor:
+            train_rows = {}
+            for window, params, summary, _ in tqdm(executor.map(_evaluate, train_tasks, chunksize=len(windows)),
+                                                  total=len(train_tasks), desc="Walk-forward Optimization"):
+                train_rows.setdefault(window, []).append((params, summary))
+
+            best = {window: _best(rows, rank_by) for window, rows in train_rows.items()}
+            test_tasks = [(w['window'], to_ns(w['test_start']), to_ns(w['test_end']), best[w['window']][0], True)
+                          for w in windows]
+            test_rows = list(tqdm(executor.map(_evaluate, test_tasks), total=len(test_tasks),
+                                  desc="Walk-forward Testing"))
+    finally:
+        optimizer.release_arrays(blocks)
+
+    rows = []
+    oos_frames = []
+    for w, (window, params, test_summary, trades) in zip(windows, test_rows):
+        train_summary = best[window][1]
+        rows.append({
+            **w, **params,
+            **{f'train_{k}': v for k, v in train_summary.items()},
+            **{f'test_{k}': v for k, v in test_summary.items()},
+        })
+        if trades is not None:
+            oos_frames.append(trades.assign(window=window))
+
+    oos_trades = None
+    if oos_frames:
+        oos_trades = pd.concat(oos_frames, ignore_index=True).sort_values('exit_time', kind='stable')
+        oos_trades = oos_trades.reset_index(drop=True)
+        oos_trades['equity_usd'] = oos_trades['pnl_usd'].cumsum()
+
+    return pd.DataFrame(rows).set_index('window'), oos_trades, backtester.summarize_results(oos_trades)